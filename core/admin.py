@@ -1,5 +1,12 @@
 from django.contrib import admin
+from django.http import (Http404,
+                         HttpResponse)
+from django.shortcuts import render
+from django.views import View
 
+from .profiling import (ProfileStore,
+                        build_flame_graph,
+                        top_functions)
 from .models import (Category,
                      SubCategory,
                      Card,
@@ -9,4 +16,57 @@ from .models import (Category,
 admin.site.register(Category)
 admin.site.register(SubCategory)
 admin.site.register(Card)
-admin.site.register(Favourite)
\ No newline at end of file
+admin.site.register(Favourite)
+
+
+# Height of one frame of the flame graph in pixels
+FRAME_HEIGHT = 18
+
+
+class ProfileListView(View):
+    """ View of the admin panel with the list of the profiles of the requests(see core.profiling) """
+
+    def get(self, request):
+        store = ProfileStore()
+        profiles = [profile for profile in map(store.get, store.ids()) if profile is not None]
+
+        return render(request, 'admin/core/profile_list.html', context={
+            **admin.site.each_context(request),
+            'title': 'Profiles of the requests',
+            'profiles': profiles,
+            'max_files': store.max_files,
+        })
+
+
+class ProfileDetailView(View):
+    """
+        View of the admin panel with the flame graph of the profile.
+        With `format=collapsed` GET parameter the collapsed stacks are returned
+        as the text(for flamegraph.pl, speedscope and similar tools).
+    """
+
+    def get(self, request, profile_id):
+        profile = ProfileStore().get(profile_id)
+        if profile is None:
+            raise Http404('No such profile.')
+
+        stacks = profile['stacks']
+        if request.GET.get('format') == 'collapsed':
+            lines = (f'{stack} {count}' for stack, count in sorted(stacks.items()))
+            return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; charset=utf-8')
+
+        frames = build_flame_graph(stacks)
+        for frame in frames:
+            frame['top'] = frame['depth'] * FRAME_HEIGHT
+            frame['left'] = round(frame['left'] * 100, 3)
+            frame['width'] = round(frame['width'] * 100, 3)
+
+        return render(request, 'admin/core/profile_detail.html', context={
+            **admin.site.each_context(request),
+            'title': f'Profile of {profile["method"]} {profile["path"]}',
+            'profile': profile,
+            'frames': frames,
+            'frame_height': FRAME_HEIGHT,
+            'height': (max((frame['depth'] for frame in frames), default=-1) + 1) * FRAME_HEIGHT,
+            'top_functions': top_functions(stacks),
+        })
@@ -0,0 +1,256 @@
+from django.views import View
+from django.http import (JsonResponse,
+                         HttpResponse)
+from django.views.decorators.http import condition
+from django.core.exceptions import ImproperlyConfigured
+
+from .decorators import condition_on_catalogue
+from .pagination import (CursorPaginator,
+                         InvalidCursor)
+from .cache import get_request_favourite_ids
+from .bundle import (get_bundle,
+                     get_catalogue_version)
+from .search import search_by_name
+from .taxonomy import taxonomy
+from .views import (extract_and_trip_question,
+                    search_among_queryset,
+                    filter_cards_by_q,
+                    sort_cards_by_param,
+                    SORTING_CARD_OPTIONS)
+from .models import (Category,
+                     SubCategory,
+                     Card)
+
+
+"""
+    Read-only JSON API of the catalogue for the mobile and offline clients.
+    The lists are built on the same querysets as the pages(see core.views),
+    but only the needed columns are fetched(.values()) and no templates
+    are rendered. The client can select the fields with `fields` GET parameter,
+    e.g. ?fields=id,content. The lists are paginated by the cursor:
+    `next` and `previous` of the response are the values of `cursor` parameter.
+"""
+
+
+class ApiError(Exception):
+    """ Error in the parameters of the request, it is returned with status 400 """
+    pass
+
+
+class CatalogueApiView(View):
+    """
+        Base view for the lists of the API.
+        `fields` maps the names of the fields in the response to the fields
+        of the model(None for the fields which are computed in `extra_fields`).
+    """
+    model = None
+    fields = {}
+    # File fields, their urls are returned
+    file_fields = ()
+    default_limit = 20
+    max_limit = 100
+    with_favourites = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # get_queryset(self) returns the queryset of the list(None if the list doesn't exist),
+        # the list without it is broken for any request, so it is rejected once the class is defined
+        if cls.model is None or not callable(getattr(cls, 'get_queryset', None)):
+            raise ImproperlyConfigured(f'{cls.__name__} must define model and get_queryset().')
+
+    def get(self, request, **kwargs):
+        try:
+            fields = self.get_fields()
+            limit = self.get_limit()
+        except ApiError as e:
+            return self.error(str(e), status=400)
+
+        queryset = self.get_queryset()
+        if queryset is None:
+            return self.error('Not found.', status=404)
+
+        # The id is always fetched, the computed fields may need it
+        columns = ['id'] + [self.fields[name] for name in fields if self.fields[name] not in (None, 'id')]
+        paginator = CursorPaginator(queryset, limit, values=columns)
+
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor as e:
+            return self.error(str(e), status=400)
+
+        return self.response({
+            'results': self.serialize(page.object_list, fields),
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        })
+
+    def get_fields(self):
+        """ Method to get the names of the requested fields """
+        fields = self.request.GET.get('fields')
+        if not fields:
+            return list(self.fields)
+
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in self.fields]
+        if unknown or not fields:
+            raise ApiError('Unknown fields: ' + ', '.join(unknown) + '. '
+                           'Possible fields: ' + ', '.join(self.fields) + '.')
+
+        return fields
+
+    def get_limit(self):
+        """ Method to get the number of the objects on the page """
+        limit = self.request.GET.get('limit')
+        if not limit:
+            return self.default_limit
+
+        if not limit.isdigit() or not 0 < int(limit) <= self.max_limit:
+            raise ApiError(f'Limit must be a number from 1 to {self.max_limit}.')
+
+        return int(limit)
+
+    def serialize(self, rows, fields):
+        """ Method to convert the rows from .values() to the objects of the response """
+        storages = {name: self.model._meta.get_field(self.fields[name]).storage
+                    for name in fields if name in self.file_fields}
+        extra = self.extra_fields(rows, fields)
+        result = []
+
+        for row in rows:
+            item = {}
+            for name in fields:
+                column = self.fields[name]
+                if column is None:
+                    item[name] = extra[name](row)
+                elif name in storages:
+                    item[name] = storages[name].url(row[column]) if row[column] else None
+                else:
+                    item[name] = row[column]
+            result.append(item)
+
+        return result
+
+    def extra_fields(self, rows, fields):
+        """ Method to get the functions which compute the fields that are not columns """
+        return {}
+
+    @staticmethod
+    def response(data, status=200):
+        # Compact JSON: no spaces and no escaping of non-ASCII letters
+        return JsonResponse(data, status=status,
+                            json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+
+    def error(self, message, status):
+        return self.response({'error': message}, status=status)
+
+    def dispatch(self, request, *args, **kwargs):
+        # The validators depend on the favourites only if they are shown
+        view = condition_on_catalogue(with_favourites=self.with_favourites)(super().dispatch)
+        return view(request, *args, **kwargs)
+
+
+class CategoryApiView(CatalogueApiView):
+    """ List of all categories """
+    model = Category
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'picture': 'picture',
+    }
+    file_fields = ('picture',)
+
+    def get_queryset(self):
+        q = extract_and_trip_question(self.request.GET)
+        return search_among_queryset(Category.objects.all(), q, search=search_by_name)
+
+
+class SubCategoryApiView(CategoryApiView):
+    """ List of all subcategories for a given category """
+    model = SubCategory
+
+    def get_queryset(self):
+        cat_id = self.kwargs.get('cat_id')
+        if taxonomy.snapshot().get_category(cat_id) is None:
+            return None
+
+        q = extract_and_trip_question(self.request.GET)
+        return search_among_queryset(SubCategory.objects.filter(categoryId=cat_id), q,
+                                     search=search_by_name)
+
+
+class CardApiView(CatalogueApiView):
+    """
+        List of all cards for a given subcategory.
+        `q` and `sort` GET parameters are the same as on the page with the cards.
+    """
+    model = Card
+    fields = {
+        'id': 'id',
+        'content': 'content',
+        'type': 'type',
+        'pronunciation': 'pronunciation',
+        'translit': 'translit_of_pronunciation',
+        'favourite': None,
+    }
+    file_fields = ('pronunciation',)
+    with_favourites = True
+
+    def get_queryset(self):
+        subcat_id = self.kwargs.get('subcat_id')
+        if taxonomy.snapshot().get_subcategory(subcat_id) is None:
+            return None
+
+        queryset = Card.objects.filter(subCategoryId=subcat_id)
+
+        q = extract_and_trip_question(self.request.GET)
+        if q:
+            queryset = filter_cards_by_q(queryset, q)
+
+        sort_param = self.request.GET.get('sort', SORTING_CARD_OPTIONS[0][0])
+        queryset, sorted_by = sort_cards_by_param(queryset, sort_param)
+        return queryset
+
+    def extra_fields(self, rows, fields):
+        if 'favourite' not in fields:
+            return {}
+
+        request = self.request
+        favourite_ids = get_request_favourite_ids(request) if request.user.is_authenticated else ()
+        return {'favourite': lambda row: row['id'] in favourite_ids}
+
+
+class BundleView(View):
+    """
+        Bundle of the catalogue for the offline clients(see core.bundle).
+        Without parameters the full bundle is returned, with `since` GET parameter
+        only the changes after the given version are returned(or the full bundle
+        if these changes are not kept anymore).
+    """
+
+    def get(self, request):
+        since = self.get_since()
+        if since is False:
+            return CatalogueApiView.response({'error': 'Since must be the version of the catalogue.'},
+                                             status=400)
+
+        version, since, content = get_bundle(since)
+
+        response = HttpResponse(content, content_type='application/gzip')
+        name = f'catalogue-{version}' + (f'-since-{since}' if since is not None else '')
+        response['Content-Disposition'] = f'attachment; filename="{name}.jsonl.gz"'
+        return response
+
+    def get_since(self):
+        """ Method to get the version from `since` parameter(None if there is no one, False if it is wrong) """
+        since = self.request.GET.get('since')
+        if since is None:
+            return None
+
+        return int(since) if since.isdigit() else False
+
+    def dispatch(self, request, *args, **kwargs):
+        # The bundle is changed only with the version of the catalogue
+        def etag(request, *args, **kwargs):
+            return 'b{}-{}'.format(get_catalogue_version(), request.GET.get('since', ''))
+
+        return condition(etag_func=etag)(super().dispatch)(request, *args, **kwargs)
@@ -0,0 +1,84 @@
+from django.db import (connections,
+                       router,
+                       NotSupportedError)
+from django.db.transaction import TransactionManagementError
+from django.db.models import Max
+
+from .models import (Category,
+                     SubCategory,
+                     Card)
+from .cache import invalidate_catalogue
+from .search_index import invalidate_search_index
+from .suggest import invalidate_suggestions
+from .taxonomy import invalidate_taxonomy
+
+
+"""
+    Bulk insertion of the objects by the management commands(see
+    import_catalogue and generate_catalogue). bulk_create doesn't send
+    the signals, so the commands announce the changes themselves once.
+"""
+
+
+def bulk_insert(model, objects, batch_size=None):
+    """
+        Function to insert the objects at once, returns their ids.
+        PostgreSQL returns the ids of the inserted rows. Otherwise(e.g. SQLite)
+        the ids are assigned after the last one: the table is locked for
+        the writing until the end of the transaction, so no other writer
+        can take the same ids.
+    """
+    connection = connections[router.db_for_write(model)]
+
+    if not connection.features.can_return_rows_from_bulk_insert:
+        lock_table(model)
+        start = get_next_id(model)
+        for number, obj in enumerate(objects):
+            obj.pk = start + number
+
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    return [obj.pk for obj in objects]
+
+
+def lock_table(model):
+    """
+        Function to make the transaction the only writer of the table of the model.
+        The lock is held until the end of the transaction, so it must be called
+        inside of it.
+    """
+    connection = connections[router.db_for_write(model)]
+    if not connection.in_atomic_block:
+        raise TransactionManagementError('The table can be locked only inside a transaction.')
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # SQLite has one writer at a time: the first write of the transaction
+            # takes the lock of the database, so the empty write takes it at once
+            cursor.execute(f'DELETE FROM {table} WHERE 0')
+        elif connection.vendor == 'postgresql':
+            # Others can read the table, but can't change it
+            cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+        else:
+            raise NotSupportedError(f'Locking of the tables is not supported by {connection.vendor}.')
+
+
+def get_next_id(model):
+    """ Function to get the id after the last one of the model """
+    return (model.objects.aggregate(last_id=Max('pk'))['last_id'] or 0) + 1
+
+
+def announce_bulk_changes(models):
+    """
+        Function to invalidate everything that the signals of the objects of the models
+        would invalidate(see core.signals), e.g. after bulk_create
+    """
+    models = set(models)
+
+    if models & {Category, SubCategory, Card}:
+        invalidate_catalogue()
+        invalidate_suggestions()
+    if models & {Category, SubCategory}:
+        invalidate_taxonomy()
+    if Card in models:
+        invalidate_search_index()
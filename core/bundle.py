@@ -0,0 +1,202 @@
+import gzip
+import json
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import (Max,
+                              Min)
+from django.utils.timezone import now
+
+from .models import (Category,
+                     SubCategory,
+                     Card,
+                     CatalogueChange)
+from .bulk import lock_table
+
+
+"""
+    Bundles of the catalogue for the offline clients.
+    The bundle is gzipped JSON lines. The first line is the header with the
+    version of the catalogue, the next lines are the objects:
+        {"type": "category", "id": 1, "name": ..., "picture": ...}
+        {"type": "subcategory", "id": 1, "name": ..., "picture": ..., "categories": [1]}
+        {"type": "card", "id": 1, "content": ..., "card_type": ..., "pronunciation": ...,
+         "translit": ..., "subcategories": [1]}
+        {"type": "deleted", "model": "card", "id": 1}
+        {"type": "media", "url": ...}
+    The full bundle contains all objects. The delta bundle(since the version)
+    contains only the objects changed after the version, the deleted
+    objects are marked by "deleted" lines.
+    The media files are not included, "media" lines list their urls.
+    The log of the changes is kept for CORE_CATALOGUE_CHANGES_RETENTION_DAYS,
+    the client with the older version gets the full bundle(its header has
+    no "since"). The bundles are cached by the version of the catalogue.
+    The version is the id of the last change. The ids of the changes follow
+    the order of the commits(see record_changes), so the client never misses
+    a change with the smaller id which was committed after its version.
+"""
+
+BUNDLE_FORMAT = 1
+
+# Models of the bundle: name of the model -> model
+BUNDLE_MODELS = {
+    Category._meta.model_name: Category,
+    SubCategory._meta.model_name: SubCategory,
+    Card._meta.model_name: Card,
+}
+
+# The version is the part of the key, so the bundles are not invalidated
+BUNDLE_CACHE_KEY = 'core:bundle:{}:{}'
+BUNDLE_CACHE_TIMEOUT = 60 * 60
+# The old changes are removed by the first change of the day
+PRUNE_CACHE_KEY = 'core:bundle:pruned'
+PRUNE_INTERVAL = 24 * 60 * 60
+
+
+def get_catalogue_version():
+    """ Function to get the current version of the catalogue(the id of the last change) """
+    return CatalogueChange.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+def record_changes(model, ids):
+    """
+        Function to record that the objects of the model were changed(or deleted).
+        The table of the changes is locked until the commit, so the next
+        transaction gets the ids of its changes only after this one is committed.
+    """
+    if not ids:
+        return None
+
+    with transaction.atomic():
+        lock_table(CatalogueChange)
+        CatalogueChange.objects.bulk_create([CatalogueChange(model=model._meta.model_name, object_id=object_id)
+                                             for object_id in set(ids)])
+    # The new changes are kept, so the version of the catalogue remains
+    prune_changes()
+
+
+def prune_changes():
+    """ Function to remove the changes older than CORE_CATALOGUE_CHANGES_RETENTION_DAYS(once a day) """
+    if not cache.add(PRUNE_CACHE_KEY, True, PRUNE_INTERVAL):
+        return None
+
+    days = getattr(settings, 'CORE_CATALOGUE_CHANGES_RETENTION_DAYS', 90)
+    CatalogueChange.objects.filter(changed_at__lt=now() - timedelta(days=days)).delete()
+
+
+def get_bundle(since=None):
+    """
+        Function to get the gzipped bundle from the cache or to write it,
+        returns (version, since, content). `since` is None if the changes
+        after the given version are already removed from the log.
+    """
+    versions = CatalogueChange.objects.aggregate(first=Min('id'), last=Max('id'))
+    if since is not None and versions['first'] is not None and since < versions['first'] - 1:
+        since = None
+
+    version = versions['last'] or 0
+    key = BUNDLE_CACHE_KEY.format(version, since)
+    content = cache.get(key)
+    if content is None:
+        buffer = BytesIO()
+        write_bundle(buffer, since=since, version=version)
+        content = buffer.getvalue()
+        cache.set(key, content, BUNDLE_CACHE_TIMEOUT)
+
+    return version, since, content
+
+
+def iter_bundle(since=None, version=None):
+    """
+        Function to get the objects of the bundle one by one.
+        If `since` is given, only the objects changed after this version are included.
+    """
+    # The version is taken before the objects, so the objects changed
+    # during the export will be sent once more in the next delta
+    if version is None:
+        version = get_catalogue_version()
+    yield {'type': 'header', 'format': BUNDLE_FORMAT, 'version': version,
+           'since': since, 'created': now()}
+
+    changed = None
+    if since is not None:
+        changed = {name: set() for name in BUNDLE_MODELS}
+        changes = CatalogueChange.objects.filter(id__gt=since, id__lte=version).values_list('model', 'object_id')
+        for name, object_id in changes.iterator():
+            if name in changed:
+                changed[name].add(object_id)
+
+    media = []
+    for name, model in BUNDLE_MODELS.items():
+        queryset = model.objects.order_by('pk')
+        if changed is not None:
+            queryset = queryset.filter(pk__in=changed[name])
+
+        found = set()
+        for item in _serialize(name, queryset):
+            found.add(item['id'])
+            media.extend(item[field] for field in ('picture', 'pronunciation') if item.get(field))
+            yield item
+
+        if changed is not None:
+            for object_id in sorted(changed[name] - found):
+                yield {'type': 'deleted', 'model': name, 'id': object_id}
+
+    for url in media:
+        yield {'type': 'media', 'url': url}
+
+
+def write_bundle(fileobj, since=None, version=None):
+    """ Function to write the gzipped bundle to the binary file, returns the version of the bundle """
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as archive:
+        for item in iter_bundle(since, version):
+            if item['type'] == 'header':
+                version = item['version']
+            line = json.dumps(item, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+            archive.write(line.encode() + b'\n')
+
+    return version
+
+
+def _serialize(name, queryset):
+    """ Function to get the lines of the bundle for the objects of the queryset """
+    model = queryset.model
+
+    if model is Card:
+        links = _links(Card.subCategoryId.through, 'card_id', 'subcategory_id', queryset)
+        storage = model._meta.get_field('pronunciation').storage
+        rows = queryset.values_list('id', 'content', 'type', 'pronunciation', 'translit_of_pronunciation')
+
+        for pk, content, card_type, pronunciation, translit in rows.iterator():
+            yield {'type': name, 'id': pk, 'content': content, 'card_type': card_type,
+                   'pronunciation': storage.url(pronunciation) if pronunciation else None,
+                   'translit': translit, 'subcategories': links.get(pk, [])}
+        return None
+
+    links = {}
+    if model is SubCategory:
+        links = _links(SubCategory.categoryId.through, 'subcategory_id', 'category_id', queryset)
+
+    storage = model._meta.get_field('picture').storage
+    for pk, object_name, picture in queryset.values_list('id', 'name', 'picture').iterator():
+        item = {'type': name, 'id': pk, 'name': object_name,
+                'picture': storage.url(picture) if picture else None}
+        if model is SubCategory:
+            item['categories'] = links.get(pk, [])
+        yield item
+
+
+def _links(through, from_field, to_field, queryset):
+    """ Function to get the links of many to many relationship: id -> list of linked ids """
+    links = {}
+    rows = through.objects.filter(**{from_field + '__in': queryset.values('pk')}). \
+        order_by(from_field, to_field).values_list(from_field, to_field)
+
+    for from_id, to_id in rows.iterator():
+        links.setdefault(from_id, []).append(to_id)
+
+    return links
@@ -0,0 +1,232 @@
+from array import array
+import time
+from bisect import bisect_left
+import hashlib
+from django.conf import settings
+from django.core.cache import (cache,
+                               caches)
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import Favourite
+
+
+"""
+    Caches of core app.
+    Ids of user's favourite cards are read on every page with cards,
+    so they are kept in the cache(one entry per user) instead of
+    querying the table with favourites again and again. The cache must
+    be shared by all processes(see CACHES in the settings): the entry is
+    removed on each change of the favourites and loaded again on the next read.
+    Generations are counters in the cache which are incremented on each change
+    of some data, so that each process can see that its in-memory structures
+    built from the data(e.g. search indexes) are outdated.
+    Each process also has its own cache in memory(the `local` alias of CACHES).
+    It keeps the generations read from the shared cache for a few seconds
+    (CORE_GENERATION_CHECK_INTERVAL), so the steady state costs no round-trips
+    to the shared cache, and the data whose keys contain a generation(pages
+    and fragments of the catalogue): such data is never outdated in place.
+    The changes made by another process are seen after the interval at most.
+"""
+
+# Alias of the cache of the process in CACHES
+LOCAL_CACHE_ALIAS = 'local'
+
+FAVOURITES_CACHE_KEY = 'core:favourites:{}'
+# Generation of the catalogue(categories, subcategories and cards),
+# it is the part of the keys of the cached pages and fragments
+CATALOGUE_GENERATION_CACHE_KEY = 'core:catalogue:generation'
+# Claim of the value of the generation by one process(see increment_generation),
+# the claims are needed only while the processes increment the same value
+GENERATION_CLAIM_CACHE_KEY = '{}:claim:{}'
+GENERATION_CLAIM_TIMEOUT = 60 * 60
+# Time of the last change of the catalogue
+CATALOGUE_MODIFIED_CACHE_KEY = 'core:catalogue:modified'
+# The cached pages are invalidated by the generation, the timeout
+# only removes the pages which are not requested anymore
+PAGE_CACHE_TIMEOUT = 60 * 15
+# Favourites are invalidated by the views which change them, the timeout only limits
+# the lifetime of the entries which were changed in another way(e.g. admin panel)
+FAVOURITES_CACHE_TIMEOUT = 60 * 60
+
+
+class FavouriteIds:
+    """
+        Compact set of ids of user's favourite cards.
+        The ids are stored in the sorted array of ints, so that
+        the membership check is a binary search.
+    """
+
+    def __init__(self, ids=()):
+        self._ids = array('q', sorted(set(ids)))
+
+    def __contains__(self, card_id):
+        index = bisect_left(self._ids, card_id)
+        return index < len(self._ids) and self._ids[index] == card_id
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def version(self):
+        """
+            Version of the set, it depends only on the ids, so the client can
+            compare it with the version of its own copy of the favourites
+        """
+        data = ','.join(map(str, self._ids)).encode()
+        return hashlib.sha1(data).hexdigest()[:16]
+
+
+def get_favourite_ids(user):
+    """
+        Function to get ids of user's favourite cards.
+        If there is nothing in the cache, the ids are loaded with one query.
+    """
+    key = FAVOURITES_CACHE_KEY.format(user.pk)
+    favourite_ids = cache.get(key)
+
+    if favourite_ids is None:
+        favourite_ids = reload_favourite_ids(user)
+
+    return favourite_ids
+
+
+def get_request_favourite_ids(request):
+    """
+        Function to get ids of favourite cards of the user of the request.
+        They are read from the cache once per request(e.g. for ETag and for the page).
+    """
+    if not hasattr(request, '_favourite_ids'):
+        request._favourite_ids = get_favourite_ids(request.user)
+    return request._favourite_ids
+
+
+def load_favourite_ids(user):
+    """ Function to load ids of user's favourite cards from the database, the cache is not changed """
+    return FavouriteIds(Favourite.objects.filter(owner=user).values_list('card_id', flat=True))
+
+
+def reload_favourite_ids(user):
+    """ Function to load ids of user's favourite cards into the cache(e.g. after a bulk change) """
+    favourite_ids = load_favourite_ids(user)
+    cache.set(FAVOURITES_CACHE_KEY.format(user.pk), favourite_ids, FAVOURITES_CACHE_TIMEOUT)
+    return favourite_ids
+
+
+def invalidate_favourite_ids(user):
+    """
+        Function to remove the cached favourites after their change.
+        Inside a transaction the entry is removed once more after the commit,
+        so that the ids loaded by another process before the commit are not used
+        (without a transaction the change is already committed). The entry
+        is not patched in place: two processes could patch it at once
+        and one of the changes would be lost.
+    """
+    key = FAVOURITES_CACHE_KEY.format(user.pk)
+    cache.delete(key)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_local_cache():
+    """ Function to get the cache of the process """
+    return caches[LOCAL_CACHE_ALIAS]
+
+
+def get_generation(key):
+    """
+        Function to get the current value of the generation.
+        The value is taken from the shared cache only if the process
+        has not read it during the last CORE_GENERATION_CHECK_INTERVAL seconds.
+    """
+    local_cache = get_local_cache()
+    generation = local_cache.get(key)
+    if generation is not None:
+        return generation
+
+    generation = cache.get(key)
+
+    if generation is None:
+        # Start from the current time instead of 0, so that the generations
+        # are not repeated after the cache is cleared(e.g. restarted)
+        cache.add(key, _initial_generation(), None)
+        generation = cache.get(key, 0)
+
+    _remember_generation(key, generation)
+    return generation
+
+
+def increment_generation(key, *, unique=False):
+    """
+        Function to increment the generation, returns its new value.
+        The increment of some backends(e.g. the database cache) is not atomic,
+        so two processes can get the same value. With `unique` the value
+        is claimed in the cache and the generation is incremented again
+        until the claim succeeds, so no other process gets the same value.
+    """
+    while True:
+        try:
+            generation = cache.incr(key)
+        except ValueError:
+            # The key was evicted from the cache
+            cache.add(key, _initial_generation(), None)
+            generation = cache.incr(key)
+
+        if not unique or cache.add(GENERATION_CLAIM_CACHE_KEY.format(key, generation), True,
+                                   GENERATION_CLAIM_TIMEOUT):
+            break
+
+    _remember_generation(key, generation)
+    return generation
+
+
+def _remember_generation(key, generation):
+    get_local_cache().set(key, generation, getattr(settings, 'CORE_GENERATION_CHECK_INTERVAL', 5))
+
+
+def _initial_generation():
+    return int(time.time() * 1000)
+
+
+def invalidate_generation(key):
+    """
+        Function to mark the data built from the database as outdated.
+        The generation is incremented once more after the commit, so that
+        the data built by another process before the commit is not used.
+    """
+    increment_generation(key)
+    transaction.on_commit(lambda: increment_generation(key))
+
+
+def get_catalogue_generation():
+    """ Function to get the current generation of the catalogue """
+    return get_generation(CATALOGUE_GENERATION_CACHE_KEY)
+
+
+def get_catalogue_modified():
+    """
+        Function to get the time of the last change of the catalogue(None if it is unknown),
+        it is kept in the cache of the process as the generations are
+    """
+    # The time is wrapped into the tuple, so that the unknown time is kept too
+    cached = get_local_cache().get(CATALOGUE_MODIFIED_CACHE_KEY)
+
+    if cached is None:
+        cached = (cache.get(CATALOGUE_MODIFIED_CACHE_KEY),)
+        _remember_generation(CATALOGUE_MODIFIED_CACHE_KEY, cached)
+
+    return cached[0]
+
+
+def invalidate_catalogue():
+    """ Function to mark the cached pages and fragments of the catalogue as outdated """
+    def set_modified():
+        modified = now()
+        cache.set(CATALOGUE_MODIFIED_CACHE_KEY, modified, None)
+        _remember_generation(CATALOGUE_MODIFIED_CACHE_KEY, (modified,))
+
+    invalidate_generation(CATALOGUE_GENERATION_CACHE_KEY)
+    transaction.on_commit(set_modified)
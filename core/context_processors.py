@@ -1,4 +1,7 @@
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_catalogue_generation
 
 def project_name(request, *args, **kwargs):
     """
@@ -7,4 +10,15 @@ def project_name(request, *args, **kwargs):
     """
     return {
         'PROJECT_NAME': settings.PROJECT_NAME
-    }
\ No newline at end of file
+    }
+
+
+def catalogue_generation(request, *args, **kwargs):
+    """
+        Custom context processor to provide the generation of the catalogue
+        for the keys of the cached fragments. It is taken from the cache
+        only if the template uses it.
+    """
+    return {
+        'catalogue_generation': SimpleLazyObject(get_catalogue_generation)
+    }
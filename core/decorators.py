@@ -1,6 +1,21 @@
 from functools import wraps
+import hashlib
 from django.http import (HttpRequest,
                          HttpResponse)
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+
+from .cache import (get_catalogue_generation,
+                    get_catalogue_modified,
+                    get_request_favourite_ids,
+                    get_local_cache,
+                    PAGE_CACHE_TIMEOUT)
+
+# GET parameters which change the pages of the catalogue,
+# all others are ignored by the cache of the pages
+PAGE_CACHE_PARAMS = ('q', 'sort', 'page', 'cursor')
 
 def login_require_or_401(function):
     """
@@ -40,3 +55,91 @@ def for_all_methods(decorator, exclude=None):
                 setattr(cls, attr, decorator(getattr(cls, attr)))
         return cls
     return decorate
+
+
+
+def get_page_cache_key(request):
+    """
+        Function to get the key of the cached page: the path, the parameters
+        from PAGE_CACHE_PARAMS(stripped, in the fixed order) and the generation
+        of the catalogue, so the pages are outdated after each change of it.
+    """
+    params = []
+    for name in PAGE_CACHE_PARAMS:
+        value = request.GET.get(name, '').strip()
+        if value:
+            params.append((name, value))
+
+    url = request.path + '?' + urlencode(params)
+    return 'core:page:{}:{}'.format(get_catalogue_generation(),
+                                    hashlib.md5(url.encode()).hexdigest())
+
+
+def cache_page_for_anonymous(function):
+    """
+        Decorator which serves the page for anonymous users from the cache.
+        All anonymous users see the same page for the same url, so it is
+        rendered only once per generation of the catalogue. The key contains
+        the generation, so the page is kept in the cache of the process.
+    """
+    @wraps(function)
+    def wrapped(request, *args, **kwargs):
+        # The pages with the messages are personal even for anonymous users
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated \
+                or len(get_messages(request)):
+            return function(request, *args, **kwargs)
+
+        key = get_page_cache_key(request)
+        cache = get_local_cache()
+        cached = cache.get(key)
+
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = function(request, *args, **kwargs)
+
+            def store(response):
+                if response.status_code == 200 and not response.cookies:
+                    cache.set(key, (response.content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+
+            if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+                # TemplateResponse is rendered later, after the view
+                response.add_post_render_callback(store)
+            elif not response.streaming:
+                store(response)
+
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    return wrapped
+
+
+def condition_on_catalogue(*, with_favourites=False):
+    """
+        Decorator for the conditional GET of the pages of the catalogue.
+        ETag is built from the generation of the catalogue and, for authorized
+        users, from the id of the user and the version of user's favourites
+        (if the page shows them), so the repeated visits get 304 Not Modified
+        without the rendering. Last-Modified is sent only to anonymous users.
+    """
+    def etag(request, *args, **kwargs):
+        if len(get_messages(request)):
+            # The page with the messages must be rendered
+            return None
+
+        tag = 'c{}'.format(get_catalogue_generation())
+        if request.user.is_authenticated:
+            tag += '-u{}'.format(request.user.pk)
+            if with_favourites:
+                tag += '-f{}'.format(get_request_favourite_ids(request).version)
+
+        return tag
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated or len(get_messages(request)):
+            return None
+
+        return get_catalogue_modified()
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
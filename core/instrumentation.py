@@ -0,0 +1,245 @@
+from collections import Counter
+from contextlib import (contextmanager,
+                        ExitStack)
+import json
+import logging
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.urls import resolve, Resolver404
+
+
+"""
+    Instrumentation of the queries to the database.
+    `collect_queries` records the number of queries, their total time,
+    the number of rows(as it is reported by the driver: PostgreSQL reports
+    it for SELECT, SQLite only for the changes) and the fingerprints
+    of the queries to find the duplicates(e.g. N+1).
+    The middleware collects these statistics for each request, writes them
+    to the log as JSON and shows them in `Server-Timing` header(to the staff
+    or in DEBUG mode). The tests check them against the query budgets
+    declared in urls.py of the apps(see QueryBudgetTestMixin), the round-trips
+    to the shared cache are counted too(see collect_cache_calls).
+"""
+
+logger = logging.getLogger('core.instrumentation')
+
+# Lists of parameters `(%s, %s, ...)` of different lengths are the same query
+PARAMETERS_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+
+
+# Methods of the cache backends which are the round-trips to the cache
+CACHE_METHODS = ('get', 'get_many', 'set', 'set_many', 'add', 'delete',
+                 'delete_many', 'incr', 'decr', 'touch', 'clear')
+# Backends which are not counted: the database cache makes the queries
+# which are counted anyway, the others are in the memory of the process
+UNCOUNTED_CACHE_BACKENDS = (DatabaseCache, LocMemCache, DummyCache)
+
+
+# Keyword arguments of the urls which must not be written anywhere(e.g. the token to reset the password)
+SECRET_URL_KWARGS = ('uidb64', 'token')
+
+
+def masked_path(request):
+    """ Function to get the path of the request without the query string, the secret parts of the url are masked """
+    path = request.path
+    match = getattr(request, 'resolver_match', None)
+    if match is not None:
+        for name in SECRET_URL_KWARGS:
+            if match.kwargs.get(name):
+                path = path.replace(str(match.kwargs[name]), f'<{name}>')
+    return path
+
+
+def fingerprint(sql):
+    """ Function to get the form of the query which doesn't depend on the number of parameters """
+    return PARAMETERS_LIST_RE.sub('(...)', ' '.join(sql.split()))
+
+
+def percentile(values, percent):
+    """ Function to get the percentile of the values(nearest-rank method) """
+    values = sorted(values)
+    if not values:
+        return None
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class QueryStats:
+    """ Statistics of the queries, it is the wrapper of the execution of the queries """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.rows = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+            rowcount = context['cursor'].rowcount
+            if rowcount and rowcount > 0:
+                self.rows += rowcount
+
+    @property
+    def duplicates(self):
+        """ Fingerprints of the queries which were executed more than once """
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    def as_dict(self):
+        return {
+            'db_queries': self.count,
+            'db_ms': round(self.time * 1000, 2),
+            'db_rows': self.rows,
+            'db_duplicates': sum(count - 1 for count in self.duplicates.values()),
+        }
+
+
+@contextmanager
+def collect_queries(using=None):
+    """ Context manager to collect the statistics of the queries to all(or the given) databases """
+    stats = QueryStats()
+
+    with ExitStack() as stack:
+        for alias in using or connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+@contextmanager
+def collect_cache_calls():
+    """
+        Context manager to count the round-trips to the caches of the settings
+        which are neither in the database nor in the memory of the process
+        (e.g. memcached): alias -> number of the calls. The calls made
+        by other methods of the same cache(e.g. get_many of the base backend
+        calls get) are not counted again.
+    """
+    calls = Counter()
+    patched = []
+    inside = set()
+
+    def counted(alias, method):
+        def wrapped(*args, **kwargs):
+            if alias in inside:
+                return method(*args, **kwargs)
+
+            calls[alias] += 1
+            inside.add(alias)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                inside.discard(alias)
+        return wrapped
+
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if isinstance(cache, UNCOUNTED_CACHE_BACKENDS):
+            continue
+        for name in CACHE_METHODS:
+            setattr(cache, name, counted(alias, getattr(cache, name)))
+        patched.append(cache)
+
+    try:
+        yield calls
+    finally:
+        for cache in patched:
+            for name in CACHE_METHODS:
+                delattr(cache, name)
+
+
+class QueryInstrumentationMiddleware:
+    """
+        Middleware to collect the statistics of the queries of each request.
+        It is turned on by the setting `CORE_QUERY_INSTRUMENTATION`(by default in DEBUG mode).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'CORE_QUERY_INSTRUMENTATION', settings.DEBUG):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with collect_queries() as stats:
+            # The inner middlewares(e.g. the profiling) see the statistics too
+            request.query_stats = stats
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        self.log(request, response, stats, duration)
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = 'db;dur={:.2f};desc="{} queries",total;dur={:.2f}'.format(
+                stats.time * 1000, stats.count, duration * 1000)
+
+        return response
+
+    @staticmethod
+    def log(request, response, stats, duration):
+        """ Method to write the statistics of the request to the log as one JSON line """
+        slow = duration * 1000 > getattr(settings, 'CORE_SLOW_REQUEST_MS', 500)
+        level = logging.WARNING if slow else logging.INFO
+        # The record is not built for nothing, by default only the slow requests are written
+        if not logger.isEnabledFor(level):
+            return None
+
+        try:
+            url_name = resolve(request.path_info).view_name
+        except Resolver404:
+            url_name = None
+
+        record = {
+            'method': request.method,
+            'path': masked_path(request),
+            'url_name': url_name,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+        }
+        record.update(stats.as_dict())
+
+        logger.log(level, json.dumps(record))
+
+
+class QueryBudgetTestMixin:
+    """
+        Mixin for the tests to check the number of queries of the views
+        against the budgets: url name -> max number of queries.
+        The round-trips to the shared cache are the queries too, whatever
+        the backend of the settings is.
+    """
+    query_budgets = {}
+
+    @contextmanager
+    def assertQueryBudget(self, url_name):
+        """ Context manager which fails if the queries inside exceed the budget of the url """
+        self.assertIn(url_name, self.query_budgets, f'No query budget for {url_name}')
+
+        with collect_queries() as stats, collect_cache_calls() as cache_calls:
+            yield stats
+
+        budget = self.query_budgets[url_name]
+        count = stats.count + sum(cache_calls.values())
+        if count > budget:
+            queries = [f'{count} x {sql}' for sql, count in stats.fingerprints.items()]
+            queries += [f'{count} x cache {alias}' for alias, count in cache_calls.items()]
+            self.fail(f'{url_name}: {count} queries exceed the budget of {budget}\n' + '\n'.join(queries))
+
+    def assertBudgetsCoverUrls(self, urlpatterns, namespace):
+        """ Method to check that each url of the app has the budget """
+        names = {f'{namespace}:{pattern.name}' for pattern in urlpatterns}
+        self.assertEqual(names - set(self.query_budgets), set(), 'Urls without query budgets')
@@ -0,0 +1,350 @@
+from contextlib import nullcontext
+import json
+import platform
+import time
+import tracemalloc
+import uuid
+from itertools import count
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.utils.timezone import now
+
+from core.instrumentation import (collect_queries,
+                                  percentile)
+from core.models import (Category,
+                         SubCategory,
+                         Card,
+                         Favourite,
+                         TypesOfCard)
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+# Password of the user of the benchmark
+PASSWORD = 'Benchmark-password-1'
+
+# Prefix of the keys of the benchmark in the caches, the keys of the running app are not touched
+BENCHMARK_KEY_PREFIX = 'benchmark'
+
+
+def get_benchmark_caches(run):
+    """ Function to get the caches of the settings with the own keys of the run of the benchmark """
+    return {alias: dict(config, KEY_PREFIX=':'.join(filter(None, (config.get('KEY_PREFIX'),
+                                                                   BENCHMARK_KEY_PREFIX, run))))
+            for alias, config in settings.CACHES.items()}
+
+
+class Step:
+    """
+        One request of the benchmark.
+        `kwargs` and `data` may be functions, they are called before each request.
+        `prepare` is called before each request to bring the data to the needed
+        state(e.g. the card must be in the favourites to be removed from them).
+        `client` is the kind of the client which sends the request:
+            anonymous - the same client without login
+            user - the same client logged in as the user of the benchmark
+            new - new client without login(the request logs it in)
+            new-user - new client logged in as the user(the request logs it out)
+    """
+
+    def __init__(self, name, url_name, kwargs=None, method='get', data=None,
+                 client='user', content_type=None, prepare=None):
+        self.name = name
+        self.url_name = url_name
+        self.kwargs = kwargs
+        self.method = method
+        self.data = data
+        self.client = client
+        self.content_type = content_type
+        self.prepare = prepare
+
+    def send(self, client):
+        kwargs = self.kwargs() if callable(self.kwargs) else self.kwargs
+        data = self.data() if callable(self.data) else self.data
+
+        extra = {'content_type': self.content_type} if self.content_type else {}
+        if data is not None:
+            extra['data'] = data
+        return getattr(client, self.method)(reverse(self.url_name, kwargs=kwargs), **extra)
+
+
+class Command(BaseCommand):
+    """
+        Command to measure the views of the app: latency(p50, p95 and p99),
+        number of queries per request and memory allocated by the request.
+        The requests are sent through the test client, so only the app is
+        measured, not the web server. Fill the database first(see the command
+        `generate_catalogue`), the database of DATABASE_URL is used, so the same
+        benchmark can be run against SQLite and PostgreSQL.
+        Everything is done in one transaction which is rolled back at the end,
+        so the database is not changed, but the commits are not measured.
+        The benchmark uses the caches of the settings with its own prefix
+        of the keys(a new one for each request with `--cold`), so the keys
+        of the running app are neither read nor removed.
+        The results can be saved to JSON(`--output`) and compared with
+        the previous ones(`--baseline`).
+    """
+    help = 'Measure latency, queries and memory of the views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=30,
+                            help='Number of the measured requests of each step')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Number of the requests of each step before the measuring')
+        parser.add_argument('--cold', action='store_true',
+                            help='Send each request with the empty caches')
+        parser.add_argument('--only', default=None,
+                            help='Measure only the steps which names contain this text')
+        parser.add_argument('--output', default=None, help='Path of JSON file to save the results')
+        parser.add_argument('--baseline', default=None,
+                            help='Path of JSON file with the previous results to compare with')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('At least one request is required.')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        # The test client needs `testserver` host and the emails must not be sent
+        try:
+            setup_test_environment()
+        except RuntimeError:
+            # It is already set up(e.g. in the tests)
+            teardown = False
+        else:
+            teardown = True
+
+        self.run_id = uuid.uuid4().hex[:8]
+        self.cold_runs = count(1)
+        try:
+            with override_settings(CACHES=get_benchmark_caches(self.run_id)), transaction.atomic():
+                try:
+                    report = self.run(options)
+                finally:
+                    transaction.set_rollback(True)
+        finally:
+            if teardown:
+                teardown_test_environment()
+
+        self.print_report(report, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f'The results are saved to {options["output"]}')
+
+    def run(self, options):
+        """ Method to send the requests of all steps, returns the report """
+        objects = {
+            'categories': Category.objects.count(),
+            'subcategories': SubCategory.objects.count(),
+            'cards': Card.objects.count(),
+            'users': get_user_model().objects.count(),
+            'favourites': Favourite.objects.count(),
+        }
+        self.prepare()
+
+        steps = self.get_steps()
+        if options['only']:
+            steps = [step for step in steps if options['only'] in step.name]
+        if not steps:
+            raise CommandError('No steps to measure.')
+
+        results = {}
+        for step in steps:
+            for _ in range(options['warmup']):
+                self.send(step, options['cold'])
+
+            latencies, queries, errors = [], [], 0
+            for _ in range(options['requests']):
+                latency, number, status = self.send(step, options['cold'])
+                latencies.append(latency)
+                queries.append(number)
+                errors += status >= 400
+
+            results[step.name] = {
+                'requests': len(latencies),
+                'errors': errors,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'queries': round(sum(queries) / len(queries), 1),
+                'max_queries': max(queries),
+                'memory_kb': self.measure_memory(step, options['cold']),
+            }
+
+        return {
+            'created': now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'cold_cache': options['cold'],
+            'objects': objects,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+            'results': results,
+        }
+
+    def prepare(self):
+        """ Method to find the objects for the requests and to create the user of the benchmark """
+        self.category = Category.objects.filter(subcategory__isnull=False).first()
+        self.subcategory = SubCategory.objects.filter(card__isnull=False).first()
+        if not (self.category and self.subcategory):
+            raise CommandError('Not enough data: at least one subcategory in a category and one card '
+                               'in a subcategory are required(see the command `generate_catalogue`).')
+
+        cards = list(Card.objects.filter(subCategoryId=self.subcategory)[:20])
+        self.card = cards[0]
+        self.card_ids = [card.id for card in cards]
+        # The first word of the card, it is searched
+        self.word = self.card.content.lstrip('— ').split()[0]
+
+        self.user = get_user_model().objects.create_user(email='benchmark@benchmark.example', password=PASSWORD)
+        Favourite.objects.bulk_create([Favourite(owner=self.user, card=card) for card in cards[1:]])
+
+        self.anonymous_client = Client()
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+        self.emails = count()
+
+    def get_steps(self):
+        """ Method to get the requests of the benchmark """
+        card_kwargs = {'card_id': self.card.id}
+        batches = count()
+
+        def batch():
+            # The cards are removed and added back by turns
+            op = ('remove', 'add')[next(batches) % 2]
+            return {'operations': [{'op': op, 'card_id': card_id} for card_id in self.card_ids[1:]]}
+
+        def toggle(url_name):
+            # The opposite request, it is not measured
+            return lambda: self.user_client.generic('POST' if url_name.endswith('add') else 'DELETE',
+                                                    reverse(url_name, kwargs=card_kwargs))
+
+        return [
+            Step('main', 'core:main', client='anonymous'),
+            Step('category-list', 'core:category-list'),
+            Step('subcategory-list', 'core:subcategory-list', {'cat_id': self.category.id}),
+            Step('card-list', 'core:card-list', {'subcat_id': self.subcategory.id}),
+            Step('card-list(anonymous)', 'core:card-list', {'subcat_id': self.subcategory.id}, client='anonymous'),
+            Step('card-list(sorted)', 'core:card-list', {'subcat_id': self.subcategory.id},
+                 data={'sort': TypesOfCard.SENTENCE}),
+            Step('favourite', 'core:favourite'),
+            Step('favourite-add', 'core:favourite-add', card_kwargs, method='post',
+                 prepare=toggle('core:favourite-del')),
+            Step('favourite-del', 'core:favourite-del', card_kwargs, method='delete',
+                 prepare=toggle('core:favourite-add')),
+            Step('favourite-batch', 'core:favourite-batch', method='post', data=batch,
+                 content_type='application/json'),
+            Step('search', 'core:search', data={'q': self.word}),
+            Step('search-suggest', 'core:search-suggest', data={'q': self.word[:3]}),
+            Step('api-category-list', 'core:api-category-list', client='anonymous'),
+            Step('api-subcategory-list', 'core:api-subcategory-list', {'cat_id': self.category.id},
+                 client='anonymous'),
+            Step('api-card-list', 'core:api-card-list', {'subcat_id': self.subcategory.id}),
+            Step('api-bundle', 'core:api-bundle', client='anonymous'),
+            Step('sign-in', 'user:sign-in', client='anonymous'),
+            Step('sign-in(post)', 'user:sign-in', method='post', client='new',
+                 data={'email': self.user.email, 'password': PASSWORD}),
+            Step('logout', 'user:logout', client='new-user'),
+            Step('sign-up', 'user:sign-up', client='anonymous'),
+            Step('sign-up(post)', 'user:sign-up', method='post', client='new',
+                 data=lambda: {'email': f'new{next(self.emails)}@benchmark.example', 'password': PASSWORD}),
+            Step('password-reset', 'user:password-reset', client='anonymous'),
+            Step('password-reset(post)', 'user:password-reset', method='post', client='anonymous',
+                 data={'email': self.user.email}),
+            Step('password-reset-confirm', 'user:password-reset-confirm', self.reset_kwargs, client='anonymous'),
+            Step('password-reset-confirm(post)', 'user:password-reset-confirm', self.reset_kwargs,
+                 method='post', client='new', data={'password': PASSWORD}),
+        ]
+
+    def reset_kwargs(self):
+        """ Method to get the link to reset the password, the token depends on the current password """
+        self.user.refresh_from_db()
+        return {'uidb64': urlsafe_base64_encode(force_bytes(self.user.pk)),
+                'token': default_token_generator.make_token(self.user)}
+
+    def get_client(self, step):
+        if step.client == 'anonymous':
+            return self.anonymous_client
+        if step.client == 'user':
+            return self.user_client
+
+        client = Client()
+        if step.client == 'new-user':
+            client.force_login(self.user)
+        return client
+
+    def empty_caches(self, cold):
+        """ Method to switch to the keys which are not in the caches yet for the cold request """
+        if not cold:
+            return nullcontext()
+        return override_settings(CACHES=get_benchmark_caches(f'{self.run_id}-{next(self.cold_runs)}'))
+
+    def send(self, step, cold):
+        """ Method to send the request of the step, returns (latency, number of queries, status) """
+        client = self.get_client(step)
+        if step.prepare:
+            step.prepare()
+
+        with self.empty_caches(cold):
+            started = time.perf_counter()
+            with collect_queries() as stats:
+                response = step.send(client)
+            return time.perf_counter() - started, stats.count, response.status_code
+
+    def measure_memory(self, step, cold):
+        """ Method to get the peak of the memory allocated by the request(in KB) """
+        client = self.get_client(step)
+        if step.prepare:
+            step.prepare()
+
+        # It is measured separately, the tracing slows down the requests
+        with self.empty_caches(cold):
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                step.send(client)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        return round((peak - before) / 1024, 1)
+
+    def print_report(self, report, baseline):
+        objects = ', '.join(f'{number} {name}' for name, number in report['objects'].items())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{report["database"]}, {"cold" if report["cold_cache"] else "warm"} cache: {objects}'
+        ))
+
+        columns = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'memory_kb')
+        self.stdout.write(f'{"step":<30}{"errors":>8}' + ''.join(f'{column:>12}' for column in columns))
+
+        previous = baseline['results'] if baseline else {}
+        for name, result in report['results'].items():
+            line = f'{name:<30}{result["errors"]:>8}' + ''.join(f'{result[column]:>12}' for column in columns)
+            if name in previous:
+                line += '   p50 {:+.0%}, queries {:+g}'.format(
+                    result['p50_ms'] / previous[name]['p50_ms'] - 1 if previous[name]['p50_ms'] else 0,
+                    result['queries'] - previous[name]['queries'])
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+
+        if report['max_rss_kb']:
+            self.stdout.write(f'Max RSS of the process: {report["max_rss_kb"]} KB')
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from core.models import (Category,
+                         SubCategory,
+                         Card,
+                         Favourite)
+
+
+class Command(BaseCommand):
+    """
+        Command to show the query plans of the hot lookup paths of the app.
+        Run it before and after migration 0006 to see that the sequential scans
+        are replaced by the index scans(the tables must contain enough rows,
+        see the command `generate_catalogue`).
+    """
+    help = 'Show query plans of the hot lookup paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true',
+                            help='Execute the queries and show the real timings(PostgreSQL only)')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(favourite__isnull=False).first()
+        subcategory = SubCategory.objects.filter(card__isnull=False).first()
+        category = Category.objects.filter(subcategory__isnull=False).first()
+
+        if not (user and subcategory and category):
+            raise CommandError('Not enough data: at least one favourite card, one card in a subcategory '
+                               'and one subcategory in a category are required.')
+
+        card = Favourite.objects.filter(owner=user).first().card
+
+        queries = [
+            ('Toggle of the favourite card(FavouritesControlView)',
+             Favourite.objects.filter(card=card, owner=user)),
+            ('List of favourites(FavouriteView)',
+             Card.objects.filter(favourite__owner=user).order_by('-favourite__data_added')[:10]),
+            ('Cards of the subcategory(CardListView)',
+             Card.objects.filter(subCategoryId=subcategory.id)[:10]),
+            ('Subcategories of the category(SubCategoryListView)',
+             SubCategory.objects.filter(categoryId=category.id)[:6]),
+        ]
+
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+
+        for title, queryset in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.bundle import write_bundle
+
+
+class Command(BaseCommand):
+    """
+        Command to export the bundle of the catalogue for the offline clients
+        (gzipped JSON lines, see core.bundle). With `--since` only the changes
+        after the given version are exported.
+    """
+    help = 'Export the catalogue(or its changes) to the gzipped JSON lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the file to write, e.g. catalogue.jsonl.gz')
+        parser.add_argument('--since', type=int, default=None,
+                            help='Export only the changes after this version')
+
+    def handle(self, *args, **options):
+        with open(options['output'], 'wb') as output:
+            version = write_bundle(output, since=options['since'])
+
+        self.stdout.write(self.style.SUCCESS(f'The bundle of version {version} is written to {options["output"]}'))
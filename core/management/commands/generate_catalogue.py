@@ -0,0 +1,182 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import now
+
+from core.bulk import (bulk_insert,
+                       get_next_id,
+                       announce_bulk_changes)
+from core.bundle import record_changes
+from core.models import (Category,
+                         SubCategory,
+                         Card,
+                         Favourite,
+                         TypesOfCard)
+from core.normalization import build_search_text
+
+
+# Syllables of the synthetic words: (cyrillic, translit)
+SYLLABLES = [('ма', 'ma'), ('ло', 'lo'), ('ко', 'ko'), ('при', 'pri'), ('вет', 'vet'),
+             ('да', 'da'), ('ни', 'ni'), ('ра', 'ra'), ('со', 'so'), ('бу', 'bu'),
+             ('жи', 'zhi'), ('щу', 'shchu'), ('ры', 'ry'), ('хо', 'kho'), ('чай', 'chay')]
+
+# Share of the types of the cards, about the same as in the real catalogue
+CARD_TYPE_WEIGHTS = {
+    TypesOfCard.WORD: 6,
+    TypesOfCard.SENTENCE: 3,
+    TypesOfCard.DIALOGUE: 1,
+}
+
+PICTURE = b'<svg xmlns="http://www.w3.org/2000/svg" width="1" height="1"/>'
+
+# Domain of the emails and the password of the generated users
+USER_EMAIL_DOMAIN = 'synthetic.example'
+USER_PASSWORD = 'benchmark'
+
+
+class Command(BaseCommand):
+    """
+        Command to fill the database with the synthetic catalogue to measure
+        the app at the realistic scale(see the command `benchmark`).
+        The subcategories are linked to several categories and the cards to
+        several subcategories with the probability `--overlap`. The objects are
+        inserted by bulk_create, the signals are not sent, so the caches are
+        invalidated once at the end. All generated users have the password
+        `benchmark`. The command adds the objects to the existing ones.
+    """
+    help = 'Generate the synthetic catalogue, users and their favourites'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10, help='Number of the categories')
+        parser.add_argument('--subcategories', type=int, default=60, help='Number of the subcategories')
+        parser.add_argument('--cards', type=int, default=10000, help='Number of the cards')
+        parser.add_argument('--users', type=int, default=100, help='Number of the users')
+        parser.add_argument('--favourites', type=int, default=50,
+                            help='Max number of the favourite cards of each user')
+        parser.add_argument('--overlap', type=float, default=0.3,
+                            help='Probability of the object to be linked to one more parent')
+        parser.add_argument('--seed', type=int, default=None, help='Seed of the random generator')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of the objects inserted at once')
+
+    def handle(self, *args, **options):
+        if options['categories'] < 1 or options['subcategories'] < 1:
+            raise CommandError('At least one category and one subcategory are required.')
+        if not 0 <= options['overlap'] <= 1:
+            raise CommandError('Overlap must be from 0 to 1.')
+
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        with transaction.atomic():
+            cat_ids = self.generate_categories(Category, options['categories'], 'categories')
+            subcat_ids = self.generate_categories(SubCategory, options['subcategories'], 'subcategories')
+            self.link(SubCategory.categoryId.through, 'subcategory_id', 'category_id',
+                      subcat_ids, cat_ids, options['overlap'])
+
+            card_ids = self.generate_cards(options['cards'])
+            self.link(Card.subCategoryId.through, 'card_id', 'subcategory_id',
+                      card_ids, subcat_ids, options['overlap'])
+
+            user_ids = self.generate_users(options['users'])
+            favourites = self.generate_favourites(user_ids, card_ids, options['favourites'])
+
+            record_changes(Category, cat_ids)
+            record_changes(SubCategory, subcat_ids)
+            record_changes(Card, card_ids)
+            announce_bulk_changes([Category, SubCategory, Card])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(cat_ids)} categories, {len(subcat_ids)} subcategories, {len(card_ids)} cards, '
+            f'{len(user_ids)} users and {favourites} favourites are generated '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
+
+    def generate_categories(self, model, number, directory):
+        """ Method to create the categories(or subcategories), returns their ids """
+        # All objects share one picture, the templates need the file
+        storage = model._meta.get_field('picture').storage
+        name = f'{directory}/pictures/synthetic.svg'
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(PICTURE))
+
+        start = get_next_id(model)
+        title = model._meta.verbose_name.capitalize()
+        objects = [model(name=f'{title} {start + number}'[:55], picture=name) for number in range(number)]
+        return bulk_insert(model, objects, self.batch_size)
+
+    def generate_cards(self, number):
+        """ Method to create the cards of the mixed types, returns their ids """
+        types = list(CARD_TYPE_WEIGHTS)
+        weights = list(CARD_TYPE_WEIGHTS.values())
+        cards = []
+
+        for card_type in self.random.choices(types, weights, k=number):
+            words = {TypesOfCard.WORD: 1, TypesOfCard.SENTENCE: 5, TypesOfCard.DIALOGUE: 12}[card_type]
+            content, translit = self._text(words)
+            if card_type == TypesOfCard.DIALOGUE:
+                parts = content.split(' ')
+                middle = len(parts) // 2
+                content = '— ' + ' '.join(parts[:middle]) + '\n— ' + ' '.join(parts[middle:]).capitalize()
+
+            # Some cards have no translit
+            translit = translit if self.random.random() < 0.7 else None
+            cards.append(Card(content=content, type=card_type, translit_of_pronunciation=translit,
+                              search_text=build_search_text(content, translit)))
+
+        return bulk_insert(Card, cards, self.batch_size)
+
+    def generate_users(self, number):
+        """ Method to create the users, returns their ids """
+        User = get_user_model()
+        # Hashing is slow, all users have the same password
+        password = make_password(USER_PASSWORD)
+        start = get_next_id(User)
+        users = [User(email=f'user{start + number}@{USER_EMAIL_DOMAIN}', password=password)
+                 for number in range(number)]
+        return bulk_insert(User, users, self.batch_size)
+
+    def generate_favourites(self, user_ids, card_ids, max_number):
+        """ Method to add random cards to the favourites of the users, returns the number of favourites """
+        added = now()
+        favourites = []
+
+        for user_id in user_ids:
+            number = self.random.randint(0, min(max_number, len(card_ids)))
+            for card_id in self.random.sample(card_ids, number):
+                favourites.append(Favourite(owner_id=user_id, card_id=card_id,
+                                            data_added=added - timedelta(minutes=self.random.randint(0, 10 ** 5))))
+
+        Favourite.objects.bulk_create(favourites, batch_size=self.batch_size)
+        return len(favourites)
+
+    def link(self, through, from_field, to_field, from_ids, to_ids, overlap):
+        """ Method to link each object to one random parent and, with the probability `overlap`, to more """
+        links = []
+
+        for from_id in from_ids:
+            number = 1
+            while number < len(to_ids) and self.random.random() < overlap:
+                number += 1
+            links.extend(through(**{from_field: from_id, to_field: to_id})
+                         for to_id in self.random.sample(to_ids, number))
+
+        through.objects.bulk_create(links, batch_size=self.batch_size)
+
+    def _text(self, words):
+        """ Method to get the random text of the given number of words and its translit """
+        cyrillic, latin = [], []
+
+        for _ in range(words):
+            syllables = self.random.choices(SYLLABLES, k=self.random.randint(1, 4))
+            cyrillic.append(''.join(syllable[0] for syllable in syllables))
+            latin.append(''.join(syllable[1] for syllable in syllables))
+
+        return ' '.join(cyrillic).capitalize(), ' '.join(latin).capitalize()
@@ -0,0 +1,200 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.bulk import (bulk_insert,
+                       announce_bulk_changes)
+from core.bundle import record_changes
+from core.models import (SubCategory,
+                         Card,
+                         TypesOfCard)
+from core.normalization import build_search_text
+
+
+class Command(BaseCommand):
+    """
+        Command to import many cards at once from CSV or JSON lines file.
+        Each row(object) describes one card:
+            content - content of the card(required)
+            type - type of the card(W, D or S, `W` by default)
+            translit - translit of pronunciation
+            pronunciation - path of the mp3 file relative to `--media-dir`
+            subcategories - names of the subcategories(list in JSON, `|`-separated in CSV)
+        The subcategories must exist. The cards are inserted in chunks: one INSERT
+        for the cards, one for the links and one UPDATE for the names of the
+        media files per chunk. The signals are not sent, so the caches are
+        invalidated once at the end.
+    """
+    help = 'Import cards from CSV or JSON lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Path of .csv or .jsonl file')
+        parser.add_argument('--media-dir', default=None,
+                            help='Directory with the pronunciation files')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of the cards inserted at once')
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help='Skip invalid rows instead of stopping the import')
+
+    def handle(self, *args, **options):
+        self.media_dir = options['media_dir']
+        self.skip_invalid = options['skip_invalid']
+        self.subcategories = dict(SubCategory.objects.values_list('name', 'id'))
+        self.pronunciation_field = Card._meta.get_field('pronunciation')
+
+        imported = skipped = 0
+        started = time.monotonic()
+
+        rows = self.read_rows(options['input'])
+        try:
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+
+                cards, links, media = [], [], []
+                for line_number, row in chunk:
+                    try:
+                        card, subcat_ids, media_path = self.parse_row(row)
+                    except ValueError as e:
+                        if not self.skip_invalid:
+                            raise CommandError(f'Row {line_number}: {e}')
+                        self.stderr.write(f'Row {line_number} is skipped: {e}')
+                        skipped += 1
+                        continue
+
+                    cards.append(card)
+                    links.append(subcat_ids)
+                    media.append(media_path)
+
+                self.import_chunk(cards, links, media)
+                imported += len(cards)
+
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{imported} cards are imported, '
+                                      f'{imported / (time.monotonic() - started):.0f} cards/s')
+        finally:
+            # The committed chunks are announced even if the import is stopped by an error
+            if imported:
+                announce_bulk_changes([Card])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{imported} cards are imported({skipped} skipped) in {elapsed:.1f}s, '
+            f'{imported / elapsed if elapsed else imported:.0f} cards/s'
+        ))
+
+    def read_rows(self, path):
+        """ Method to read the rows one by one, yields (number of the line, row) """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in ('.csv', '.jsonl'):
+            raise CommandError('Only .csv and .jsonl files are supported')
+
+        with open(path, encoding='utf-8', newline='') as file:
+            if extension == '.csv':
+                for line_number, row in enumerate(csv.DictReader(file), start=2):
+                    row['subcategories'] = [name for name in (row.get('subcategories') or '').split('|') if name]
+                    yield line_number, row
+            else:
+                for line_number, line in enumerate(file, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError:
+                        yield line_number, None
+
+    def parse_row(self, row):
+        """ Method to make the card from the row, returns (card, ids of subcategories, path of media) """
+        if not isinstance(row, dict):
+            raise ValueError('The row is not a JSON object')
+
+        content = (row.get('content') or '').strip()
+        if not content:
+            raise ValueError('The content is empty')
+
+        card_type = row.get('type') or TypesOfCard.WORD
+        if card_type not in TypesOfCard.values:
+            raise ValueError(f'Unknown type {card_type}')
+
+        names = row.get('subcategories') or []
+        unknown = [name for name in names if name not in self.subcategories]
+        if not names or unknown:
+            raise ValueError('Unknown subcategories: ' + ', '.join(unknown) if unknown else 'No subcategories')
+
+        media_path = row.get('pronunciation') or None
+        if media_path:
+            if not self.media_dir:
+                raise ValueError('The pronunciation is given, but --media-dir is not')
+            media_path = os.path.join(self.media_dir, media_path)
+            if not os.path.isfile(media_path):
+                raise ValueError(f'No such file {media_path}')
+            if os.path.splitext(media_path)[1].lower() != '.mp3':
+                raise ValueError('The pronunciation must be .mp3 file')
+
+        translit = row.get('translit') or None
+        # The signals are not sent by bulk_create, so the text for the search is built here
+        card = Card(content=content, type=card_type, translit_of_pronunciation=translit,
+                    search_text=build_search_text(content, translit))
+
+        # The same subcategory can be listed twice
+        subcat_ids = list(dict.fromkeys(self.subcategories[name] for name in names))
+        return card, subcat_ids, media_path
+
+    def import_chunk(self, cards, links, media):
+        """
+            Method to insert the chunk of the cards in one transaction.
+            The files are not the part of the transaction, so the files
+            of the chunk are removed if it is rolled back.
+        """
+        if not cards:
+            return None
+
+        saved = []
+        try:
+            with transaction.atomic():
+                self._insert_chunk(cards, links, media, saved)
+        except BaseException:
+            for name in saved:
+                self.pronunciation_field.storage.delete(name)
+            raise
+
+    def _insert_chunk(self, cards, links, media, saved):
+        card_ids = bulk_insert(Card, cards)
+
+        Link = Card.subCategoryId.through
+        Link.objects.bulk_create([Link(card_id=card.id, subcategory_id=subcat_id)
+                                  for card, subcat_ids in zip(cards, links) for subcat_id in subcat_ids])
+
+        # The files are named by the ids of the cards at once
+        with_media = []
+        for card, media_path in zip(cards, media):
+            if media_path:
+                saved.append(self.save_media(card, media_path))
+                with_media.append(card)
+
+        if with_media:
+            Card.objects.bulk_update(with_media, ['pronunciation'])
+
+        record_changes(Card, card_ids)
+
+    def save_media(self, card, media_path):
+        """ Method to put the file of the pronunciation into the storage under the id of the card, returns its name """
+        storage = self.pronunciation_field.storage
+        # The id of the card is known, so the name is the final one
+        name = self.pronunciation_field.generate_filename(card, os.path.basename(media_path))
+
+        if storage.exists(name):
+            # The file of the deleted card with the same id
+            storage.delete(name)
+
+        with open(media_path, 'rb') as file:
+            card.pronunciation.name = storage.save(name, File(file))
+
+        return card.pronunciation.name
@@ -0,0 +1,427 @@
+import json
+import random
+import threading
+import time
+from http.cookiejar import CookieJar
+from urllib.error import (HTTPError,
+                          URLError)
+from urllib.parse import (urlencode,
+                          urljoin,
+                          urlsplit)
+from urllib.request import (build_opener,
+                            HTTPCookieProcessor,
+                            HTTPRedirectHandler,
+                            Request)
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import (resolve,
+                         reverse,
+                         Resolver404)
+
+from core.instrumentation import percentile
+from core.management.commands.generate_catalogue import (USER_EMAIL_DOMAIN,
+                                                         USER_PASSWORD)
+
+
+"""
+    Load generator which imitates the learners.
+    Each virtual learner is a thread with its own cookies(session), it
+    repeats the journeys chosen by their weights and waits `--think-time`
+    between the requests. The requests are sent by urllib to the running
+    server, e.g. `gunicorn djangoIR.wsgi --workers 2` as in Procfile.
+    The catalogue is found through the JSON API, the accounts are the users
+    of the command `generate_catalogue`(the command reads their emails from
+    the database, so it must use the same database as the server).
+    Python threads share one CPU, so for the high loads run several
+    generators at once.
+"""
+
+# Journeys and their default weights
+JOURNEYS = {
+    'browse': 4,
+    'listen': 2,
+    'favourites': 2,
+    'search': 2,
+    'sign_in': 1,
+}
+
+# Journeys which need the account
+ACCOUNT_JOURNEYS = ('favourites', 'sign_in')
+
+# Statuses which are not errors(the redirects are not followed)
+OK_STATUSES = (200, 301, 302, 304)
+
+
+class NoRedirectHandler(HTTPRedirectHandler):
+    """ The redirects are not followed, each request is measured separately """
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Recorder:
+    """ Thread-safe results of the requests: endpoint -> latencies, statuses and errors """
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, latency, status, error):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            statuses = self.statuses.setdefault(endpoint, {})
+            statuses[status] = statuses.get(status, 0) + 1
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + error
+
+    def report(self, elapsed):
+        """ Method to get the statistics of each endpoint and of all of them(`total`) """
+        with self._lock:
+            endpoints = sorted(self.latencies.items())
+            endpoints.append(('total', [latency for latencies in self.latencies.values() for latency in latencies]))
+            errors = dict(self.errors, total=sum(self.errors.values()))
+            statuses = {endpoint: dict(self.statuses[endpoint]) for endpoint in self.statuses}
+
+        total = {}
+        for endpoint_statuses in statuses.values():
+            for status, number in endpoint_statuses.items():
+                total[status] = total.get(status, 0) + number
+        statuses['total'] = total
+
+        report = {}
+        for endpoint, latencies in endpoints:
+            if not latencies:
+                continue
+            report[endpoint] = {
+                'requests': len(latencies),
+                'rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+                'error_rate': round(errors[endpoint] / len(latencies), 4),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'statuses': {str(status): number for status, number in
+                             sorted(statuses.get(endpoint, {}).items())},
+            }
+
+        return report
+
+
+class Catalogue:
+    """ Ids of the objects which the learners open, they are found through the API """
+
+    def __init__(self, categories, subcategories, cards, audio, words):
+        self.categories = categories
+        self.subcategories = subcategories
+        self.cards = cards
+        self.audio = audio
+        self.words = words
+
+    @classmethod
+    def discover(cls, client, max_categories=10, max_subcategories=20):
+        """ Method to find the objects through the JSON API """
+        def get(url_name, **kwargs):
+            status, body = client.send('GET', reverse(url_name, kwargs=kwargs) + '?limit=100', record=False)
+            if status != 200:
+                raise CommandError(f'The API returned {status} for {url_name}.')
+            return json.loads(body)['results']
+
+        categories = [item['id'] for item in get('core:api-category-list')]
+        subcategories, cards, audio, words = set(), [], [], set()
+
+        for cat_id in categories[:max_categories]:
+            subcategories.update(item['id'] for item in get('core:api-subcategory-list', cat_id=cat_id))
+
+        for subcat_id in sorted(subcategories)[:max_subcategories]:
+            for item in get('core:api-card-list', subcat_id=subcat_id):
+                cards.append(item['id'])
+                words.update(item['content'].lstrip('— ').split()[:1])
+                if item['pronunciation']:
+                    audio.append(item['pronunciation'])
+
+        if not (categories and subcategories and cards):
+            raise CommandError('The catalogue is empty(see the command `generate_catalogue`).')
+
+        return cls(categories, sorted(subcategories), cards, audio, sorted(words))
+
+
+class Learner:
+    """ Virtual learner: the client with its own session which sends the requests of the journeys """
+
+    def __init__(self, base_url, recorder, timeout, account=None, think_time=0, seed=None):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.account = account
+        self.think_time = think_time
+        self.random = random.Random(seed)
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirectHandler())
+        self.signed_in = False
+
+    def send(self, method, path, data=None, json_data=None, ok=OK_STATUSES, record=True):
+        """ Method to send the request, returns (status, body), status is 0 if there is no response """
+        headers = {}
+        body = None
+        if json_data is not None:
+            body = json.dumps(json_data).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if method not in ('GET', 'HEAD'):
+            headers['X-CSRFToken'] = self.csrf_token()
+
+        request = Request(urljoin(self.base_url, path), data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except HTTPError as e:
+            status, content = e.code, e.read()
+        except (URLError, OSError):
+            status, content = 0, b''
+        latency = time.perf_counter() - started
+
+        if record:
+            self.recorder.add(endpoint_of(method, path), latency, status, status not in ok)
+        return status, content
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def think(self):
+        if self.think_time:
+            time.sleep(self.random.uniform(0, 2 * self.think_time))
+
+    def run_journey(self, name, catalogue):
+        """ Method to go through the journey, the learner signs in first if it is needed """
+        if name in ACCOUNT_JOURNEYS and not self.signed_in and name != 'sign_in':
+            self.sign_in()
+        getattr(self, name)(catalogue)
+
+    def sign_in(self, catalogue=None, record=True):
+        if self.signed_in:
+            self.send('GET', reverse('user:logout'), record=record)
+            self.signed_in = False
+            self.think()
+
+        self.send('GET', reverse('user:sign-in'), record=record)
+        self.think()
+        status, _ = self.send('POST', reverse('user:sign-in'), record=record, data={
+            'email': self.account, 'password': USER_PASSWORD, 'csrfmiddlewaretoken': self.csrf_token(),
+        })
+        # The successful sign in redirects to the categories
+        self.signed_in = status == 302
+        self.think()
+
+    def browse(self, catalogue):
+        self.send('GET', reverse('core:category-list'))
+        self.think()
+        self.send('GET', reverse('core:subcategory-list', args=[self.random.choice(catalogue.categories)]))
+        self.think()
+        self.send('GET', reverse('core:card-list', args=[self.random.choice(catalogue.subcategories)]))
+        self.think()
+
+    def listen(self, catalogue):
+        self.send('GET', reverse('core:card-list', args=[self.random.choice(catalogue.subcategories)]))
+        self.think()
+        for url in self.random.sample(catalogue.audio, min(3, len(catalogue.audio))):
+            self.send('GET', url)
+            self.think()
+
+    def favourites(self, catalogue):
+        card_id = self.random.choice(catalogue.cards)
+        # The card can be in the favourites already(409) or removed by another journey(410)
+        self.send('POST', reverse('core:favourite-add', args=[card_id]), ok=(200, 409))
+        self.think()
+        self.send('GET', reverse('core:favourite'))
+        self.think()
+        self.send('DELETE', reverse('core:favourite-del', args=[card_id]), ok=(200, 410))
+        self.think()
+
+    def search(self, catalogue):
+        word = self.random.choice(catalogue.words)
+        # The suggestions are requested while the word is being typed
+        for length in range(2, min(len(word), 4) + 1):
+            self.send('GET', reverse('core:search-suggest') + '?' + urlencode({'q': word[:length]}))
+        self.think()
+        self.send('GET', reverse('core:search') + '?' + urlencode({'q': word}))
+        self.think()
+
+
+def endpoint_of(method, path):
+    """ Function to get the name of the endpoint of the request, e.g. `POST core:favourite-add` """
+    path = urlsplit(path).path
+    try:
+        name = resolve(path).view_name
+    except Resolver404:
+        name = 'media' if path.startswith('/media/') else 'unknown'
+    return f'{method} {name}'
+
+
+def read_log(path):
+    """
+        Function to read the requests from the log in JSON lines, returns (requests, number of skipped lines).
+        Each line must have `path` and may have `method`(GET by default) and `body`(JSON),
+        e.g. the lines of the log `core.instrumentation`.
+    """
+    requests, skipped = [], 0
+
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+
+            if not isinstance(row, dict) or not isinstance(row.get('path'), str) or not row['path'].startswith('/'):
+                skipped += 1
+                continue
+            requests.append((row.get('method') or 'GET', row['path'], row.get('body')))
+
+    return requests, skipped
+
+
+class Command(BaseCommand):
+    """
+        Command to load the running server by the virtual learners(see the docstring
+        of the module) or to replay the log of the requests(`--replay`).
+        It reports the throughput, the error rate and the latency of each endpoint.
+    """
+    help = 'Load the running server by the virtual learners or replay the log of the requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='?', default='http://127.0.0.1:8000',
+                            help='Base url of the server')
+        parser.add_argument('--learners', type=int, default=10, help='Number of the concurrent learners')
+        parser.add_argument('--duration', type=float, default=60, help='Duration of the load in seconds')
+        parser.add_argument('--ramp-up', type=float, default=0,
+                            help='The learners are started one by one during this time(seconds)')
+        parser.add_argument('--think-time', type=float, default=1,
+                            help='Mean pause of the learner between the requests(seconds)')
+        parser.add_argument('--mix', default=None,
+                            help='Weights of the journeys, e.g. browse=4,search=1 '
+                                 '(journeys: ' + ', '.join(JOURNEYS) + ')')
+        parser.add_argument('--replay', default=None,
+                            help='Path of the log in JSON lines to replay instead of the journeys')
+        parser.add_argument('--timeout', type=float, default=10, help='Timeout of the request in seconds')
+        parser.add_argument('--seed', type=int, default=None, help='Seed of the random generator')
+        parser.add_argument('--output', default=None, help='Path of JSON file to save the results')
+
+    def handle(self, *args, **options):
+        if options['learners'] < 1:
+            raise CommandError('At least one learner is required.')
+
+        self.options = options
+        self.base_url = options['url'].rstrip('/') + '/'
+        self.random = random.Random(options['seed'])
+        self.recorder = Recorder()
+        self.replay_lock = threading.Lock()
+        self.replay_position = 0
+        self.accounts = list(get_user_model().objects.filter(email__endswith='@' + USER_EMAIL_DOMAIN).
+                             order_by('pk').values_list('email', flat=True)[:options['learners']])
+
+        if options['replay']:
+            requests, skipped = read_log(options['replay'])
+            if skipped:
+                self.stderr.write(f'{skipped} lines of the log are skipped')
+            if not requests:
+                raise CommandError('No requests in the log.')
+            target, args = self.replay, (requests,)
+        else:
+            mix = self.get_mix(options['mix'])
+            catalogue = Catalogue.discover(self.new_learner(0))
+            target, args = self.journeys, (mix, catalogue)
+
+        self.deadline = time.monotonic() + options['ramp_up'] + options['duration']
+        started = time.monotonic()
+        threads = []
+        for number in range(options['learners']):
+            thread = threading.Thread(target=target, args=(self.new_learner(number),) + args, daemon=True)
+            threads.append(thread)
+            thread.start()
+            if options['ramp_up']:
+                time.sleep(options['ramp_up'] / options['learners'])
+
+        for thread in threads:
+            thread.join()
+
+        report = {
+            'url': self.base_url,
+            'learners': options['learners'],
+            'elapsed_s': round(time.monotonic() - started, 2),
+            'endpoints': self.recorder.report(time.monotonic() - started),
+        }
+        self.print_report(report)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f'The results are saved to {options["output"]}')
+
+    def get_mix(self, mix):
+        """ Method to get the weights of the journeys from `--mix` """
+        weights = dict(JOURNEYS)
+        if mix:
+            weights = {}
+            for item in mix.split(','):
+                name, _, weight = item.partition('=')
+                if name.strip() not in JOURNEYS or not weight.strip().isdigit():
+                    raise CommandError(f'Wrong weight of the journey: {item}')
+                weights[name.strip()] = int(weight)
+
+        if not self.accounts:
+            self.stderr.write('No accounts of the synthetic users, the journeys with the account are skipped')
+            weights = {name: weight for name, weight in weights.items() if name not in ACCOUNT_JOURNEYS}
+
+        weights = {name: weight for name, weight in weights.items() if weight > 0}
+        if not weights:
+            raise CommandError('No journeys to run.')
+        return weights
+
+    def new_learner(self, number):
+        account = self.accounts[number % len(self.accounts)] if self.accounts else None
+        return Learner(self.base_url, self.recorder, self.options['timeout'], account=account,
+                       think_time=self.options['think_time'], seed=self.random.random())
+
+    def journeys(self, learner, mix, catalogue):
+        """ Method to run the journeys of the learner until the end of the load """
+        names, weights = list(mix), list(mix.values())
+        while time.monotonic() < self.deadline:
+            learner.run_journey(learner.random.choices(names, weights)[0], catalogue)
+
+    def replay(self, learner, requests):
+        """ Method to send the requests of the log, the learners send them by turns """
+        if learner.account:
+            # The pages of the log may need the account, the sign in is not measured
+            learner.sign_in(record=False)
+
+        while time.monotonic() < self.deadline:
+            with self.replay_lock:
+                position = self.replay_position
+                if position >= len(requests):
+                    return None
+                self.replay_position += 1
+
+            method, path, body = requests[position]
+            learner.send(method, path, json_data=body)
+            learner.think()
+
+    def print_report(self, report):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{report["learners"]} learners, {report["elapsed_s"]}s, {report["url"]}'
+        ))
+
+        columns = ('requests', 'rps', 'error_rate', 'p50_ms', 'p95_ms', 'p99_ms')
+        self.stdout.write(f'{"endpoint":<40}' + ''.join(f'{column:>12}' for column in columns))
+        for endpoint, result in report['endpoints'].items():
+            line = f'{endpoint:<40}' + ''.join(f'{result[column]:>12}' for column in columns)
+            self.stdout.write(self.style.ERROR(line) if result['error_rate'] else line)
@@ -0,0 +1,89 @@
+from django.db import connections, models, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+
+class FavouriteManager(models.Manager):
+    """
+        Manager for user's favourite cards.
+        Adding and removing of a favourite card are done by one statement
+        each, the result is the number of affected rows, so no preliminary
+        checks(and no races between them) are needed.
+    """
+
+    def add_card(self, owner, card_id, data_added=None):
+        """
+            Method to add the card to user's favourites.
+            Returns True if the card was added and False if the card
+            doesn't exist or is already in user's favourites.
+        """
+        connection = connections[self.db]
+        ops = connection.ops
+        opts = self.model._meta
+        card_opts = opts.get_field('card').related_model._meta
+        qn = ops.quote_name
+
+        # INSERT ... SELECT ... WHERE EXISTS(card) with the same conflict
+        # handling as bulk_create(ignore_conflicts=True) uses, so the
+        # unique constraint on (owner, card) makes it idempotent.
+        # Unlike bulk_create, it reports the number of inserted rows
+        # and doesn't fail on the foreign key if the card doesn't exist.
+        sql = '{insert} {table} ({card}, {owner}, {data_added}) ' \
+              'SELECT %s, %s, %s WHERE EXISTS (SELECT 1 FROM {card_table} WHERE {card_pk} = %s) ' \
+              '{suffix}'.format(
+                  insert=ops.insert_statement(ignore_conflicts=True),
+                  table=qn(opts.db_table),
+                  card=qn(opts.get_field('card').column),
+                  owner=qn(opts.get_field('owner').column),
+                  data_added=qn(opts.get_field('data_added').column),
+                  card_table=qn(card_opts.db_table),
+                  card_pk=qn(card_opts.pk.column),
+                  suffix=ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+              )
+        data_added = ops.adapt_datetimefield_value(data_added or now())
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [card_id, owner.pk, data_added, card_id])
+            return cursor.rowcount > 0
+
+    def remove_card(self, owner, card_id):
+        """
+            Method to remove the card from user's favourites.
+            Returns True if the card was removed and False if it
+            was not in user's favourites.
+        """
+        # Nothing refers to favourites, so it is one DELETE without collecting the objects
+        return self.filter(owner=owner, card_id=card_id).delete()[0] > 0
+
+    def apply_batch(self, owner, additions, removals):
+        """
+            Method to add and remove many cards of user's favourites in one transaction.
+            `additions` maps ids of the cards to the dates of adding,
+            `removals` maps ids of the cards to the dates of removing(or None).
+            A favourite which was added after the date of its removing is kept.
+            Returns the ids of the added cards which don't exist.
+        """
+        card_model = self.model._meta.get_field('card').related_model
+        missing_ids = set()
+
+        with transaction.atomic(using=self.db):
+            if removals:
+                untimed_ids = [card_id for card_id, removed_at in removals.items() if removed_at is None]
+                condition = Q(card_id__in=untimed_ids) if untimed_ids else Q()
+                for card_id, removed_at in removals.items():
+                    if removed_at is not None:
+                        condition |= Q(card_id=card_id, data_added__lte=removed_at)
+
+                self.filter(owner=owner).filter(condition).delete()
+
+            if additions:
+                existing_ids = set(card_model.objects.using(self.db)
+                                   .filter(pk__in=list(additions)).values_list('pk', flat=True))
+                missing_ids = set(additions) - existing_ids
+
+                # The cards which are already in user's favourites keep their dates
+                self.bulk_create([self.model(owner=owner, card_id=card_id, data_added=additions[card_id])
+                                  for card_id in sorted(existing_ids)],
+                                 ignore_conflicts=True)
+
+        return missing_ids
@@ -0,0 +1,67 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+"""
+    Indexes for the search among cards, categories and subcategories.
+    All of them are PostgreSQL specific, so for other databases
+    only the column with the search vector is added.
+"""
+
+# Expressions match the SQL generated by Django for `icontains` lookups
+TRIGRAM_INDEXES = [
+    ('core_card_content_trgm', 'core_card', 'UPPER("content"::text)'),
+    ('core_card_translit_trgm', 'core_card', 'UPPER("translit_of_pronunciation"::text)'),
+    ('core_category_name_trgm', 'core_category', 'UPPER("name"::text)'),
+    ('core_subcategory_name_trgm', 'core_subcategory', 'UPPER("name"::text)'),
+]
+
+SEARCH_VECTOR_SQL = "to_tsvector('pg_catalog.simple', " \
+                    "coalesce(\"content\", '') || ' ' || coalesce(\"translit_of_pronunciation\", ''))"
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return None
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for name, table, expression in TRIGRAM_INDEXES:
+        schema_editor.execute(f'CREATE INDEX "{name}" ON "{table}" USING gin ({expression} gin_trgm_ops)')
+
+    # Keep the search vector up to date on every insert / update of a card
+    schema_editor.execute(
+        'CREATE TRIGGER "core_card_search_vector_update" BEFORE INSERT OR UPDATE '
+        'OF "content", "translit_of_pronunciation" ON "core_card" FOR EACH ROW EXECUTE PROCEDURE '
+        'tsvector_update_trigger("search_vector", \'pg_catalog.simple\', '
+        '"content", "translit_of_pronunciation")'
+    )
+    schema_editor.execute(f'UPDATE "core_card" SET "search_vector" = {SEARCH_VECTOR_SQL}')
+    schema_editor.execute('CREATE INDEX "core_card_search_vector_gin" ON "core_card" USING gin ("search_vector")')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return None
+
+    schema_editor.execute('DROP INDEX IF EXISTS "core_card_search_vector_gin"')
+    schema_editor.execute('DROP TRIGGER IF EXISTS "core_card_search_vector_update" ON "core_card"')
+
+    for name, table, expression in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auto_20210412_1803'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
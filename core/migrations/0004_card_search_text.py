@@ -0,0 +1,65 @@
+from django.db import migrations, models
+
+from core.normalization import build_search_text
+
+
+"""
+    Normalized searchable text of the cards.
+    On PostgreSQL the trigram indexes on the raw content and translit
+    are replaced by the trigram index on the normalized text.
+"""
+
+BATCH_SIZE = 1000
+
+
+def fill_search_text(apps, schema_editor):
+    Card = apps.get_model('core', 'Card')
+    cards = []
+
+    for card in Card.objects.only('id', 'content', 'translit_of_pronunciation').iterator():
+        card.search_text = build_search_text(card.content, card.translit_of_pronunciation)
+        cards.append(card)
+
+        if len(cards) == BATCH_SIZE:
+            Card.objects.bulk_update(cards, ['search_text'])
+            cards = []
+
+    Card.objects.bulk_update(cards, ['search_text'])
+
+
+def replace_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return None
+
+    schema_editor.execute('DROP INDEX IF EXISTS "core_card_content_trgm"')
+    schema_editor.execute('DROP INDEX IF EXISTS "core_card_translit_trgm"')
+    schema_editor.execute('CREATE INDEX "core_card_search_text_trgm" ON "core_card" '
+                          'USING gin ("search_text" gin_trgm_ops)')
+
+
+def restore_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return None
+
+    schema_editor.execute('DROP INDEX IF EXISTS "core_card_search_text_trgm"')
+    schema_editor.execute('CREATE INDEX "core_card_content_trgm" ON "core_card" '
+                          'USING gin (UPPER("content"::text) gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX "core_card_translit_trgm" ON "core_card" '
+                          'USING gin (UPPER("translit_of_pronunciation"::text) gin_trgm_ops)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='search_text',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(replace_trigram_indexes, restore_trigram_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_card_search_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favourite',
+            index=models.Index(fields=['owner', '-data_added'], name='core_favour_owner_added_idx'),
+        ),
+    ]
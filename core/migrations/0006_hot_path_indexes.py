@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+
+"""
+    Indexes for the hot lookup paths:
+    1) unique (owner, card) of favourites(duplicates are removed before)
+    2) (subcategory, card) of the cards of the subcategory
+    3) (category, subcategory) of the subcategories of the category
+    Tables for many to many relationships are created by Django,
+    so the indexes are added to them directly.
+"""
+
+# (model, many to many field, name of the index)
+M2M_INDEXES = [
+    ('Card', 'subCategoryId', 'core_card_subcat_card_idx'),
+    ('SubCategory', 'categoryId', 'core_subcat_cat_subcat_idx'),
+]
+
+
+def remove_duplicate_favourites(apps, schema_editor):
+    Favourite = apps.get_model('core', 'Favourite')
+
+    # Keep the earliest favourite of each (owner, card)
+    duplicates = Favourite.objects.values('owner', 'card'). \
+        annotate(first_id=models.Min('id'), count=models.Count('id')).filter(count__gt=1)
+
+    for duplicate in duplicates:
+        Favourite.objects.filter(owner=duplicate['owner'], card=duplicate['card']). \
+            exclude(id=duplicate['first_id']).delete()
+
+
+def create_m2m_indexes(apps, schema_editor):
+    quote = schema_editor.quote_name
+
+    for model_name, field_name, index_name in M2M_INDEXES:
+        field = apps.get_model('core', model_name)._meta.get_field(field_name)
+        # The column of the target model goes first, the filter is by it
+        schema_editor.execute(f'CREATE INDEX {quote(index_name)} ON {quote(field.m2m_db_table())} '
+                              f'({quote(field.m2m_reverse_name())}, {quote(field.m2m_column_name())})')
+
+
+def drop_m2m_indexes(apps, schema_editor):
+    for model_name, field_name, index_name in M2M_INDEXES:
+        schema_editor.execute(f'DROP INDEX {schema_editor.quote_name(index_name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_favourite_owner_data_added_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favourites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favourite',
+            constraint=models.UniqueConstraint(fields=('owner', 'card'), name='core_favourite_owner_card_uniq'),
+        ),
+        migrations.RunPython(create_m2m_indexes, drop_m2m_indexes),
+    ]
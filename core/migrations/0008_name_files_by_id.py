@@ -0,0 +1,31 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:26
+
+import core.shortcuts
+import django.core.validators
+from django.db import migrations, models
+import functools
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_catalogue_change'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='card',
+            name='pronunciation',
+            field=models.FileField(blank=True, null=True, upload_to=functools.partial(core.shortcuts.name_file_by_id, *(), **{'path': 'cards/sounds/'}), validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['mp3'])], verbose_name='Pronunciation'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='picture',
+            field=models.FileField(upload_to=functools.partial(core.shortcuts.name_file_by_id, *(), **{'path': 'categories/pictures/'}), validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['svg'])], verbose_name='Picture'),
+        ),
+        migrations.AlterField(
+            model_name='subcategory',
+            name='picture',
+            field=models.FileField(upload_to=functools.partial(core.shortcuts.name_file_by_id, *(), **{'path': 'subcategories/pictures/'}), validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['svg'])], verbose_name='Picture'),
+        ),
+    ]
@@ -2,10 +2,10 @@ from django.db import models
 from django.utils.timezone import now
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth import get_user_model
-from django.contrib.postgres.fields import ArrayField
-from django.db.models import (Func, Value, CharField, IntegerField)
+from django.contrib.postgres.search import SearchVectorField
 
 from .shortcuts import upload_to
+from .managers import FavouriteManager
 
 
 """
@@ -79,6 +79,11 @@ class Card(models.Model):
                                      null=True, blank=True)
     # Translit of pronunciation is optional
     translit_of_pronunciation = models.TextField('Translit of pronunciation', null=True, blank=True)
+    # Normalized content and translit(see core.normalization), it is updated on each save
+    search_text = models.TextField(default='', editable=False)
+    # Full-text search vector of the content and the translit.
+    # It is maintained by the database itself(PostgreSQL only), see core.search
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['-pk']
@@ -96,26 +101,39 @@ class Favourite(models.Model):
     # For sorting by `default`
     data_added = models.DateTimeField(default=now)
 
+    objects = FavouriteManager()
+
     class Meta:
         ordering = ['-data_added']
+        indexes = [
+            # For the list of user's favourites sorted by the date of adding
+            models.Index(fields=['owner', '-data_added'], name='core_favour_owner_added_idx'),
+        ]
+        constraints = [
+            # The card can be added to user's favourites only once,
+            # it is also the index for the lookups of (owner, card)
+            models.UniqueConstraint(fields=['owner', 'card'], name='core_favourite_owner_card_uniq'),
+        ]
 
     def __str__(self):
         return 'card ' + str(self.card.id) + ' -> user ' + str(self.owner.id) + \
                ' (' + str(self.id) + ') '
 
 
-class ArrayPosition(Func):
+class CatalogueChange(models.Model):
     """
-        Class to solve one of the Django's problems.
-        This class is used for filtering(user's sorting option) the cards.
+        Log of the changes of the catalogue(categories, subcategories and cards).
+        Each change of an object(or of its links) adds a row, the id of the last row
+        is the version of the catalogue. The clients get only the objects changed
+        since their version(see core.bundle).
     """
-    function = 'array_position'
-
-    def __init__(self, items, *expressions, **extra):
-        if isinstance(items[0], int):
-            base_field = IntegerField()
-        else:
-            base_field = CharField(max_length=max(len(i) for i in items))
-        first_arg = Value(list(items), output_field=ArrayField(base_field))
-        expressions = (first_arg,) + expressions
-        super().__init__(*expressions, **extra)
+    # Name of the model(`category`, `subcategory` or `card`)
+    model = models.CharField(max_length=20)
+    object_id = models.PositiveIntegerField()
+    changed_at = models.DateTimeField(default=now)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return self.model + ' ' + str(self.object_id) + ' (' + str(self.id) + ')'
@@ -0,0 +1,53 @@
+from html import unescape
+from django.utils.html import strip_tags
+
+
+"""
+    Normalization of the text for the search.
+    Learners type Russian words both in Cyrillic and in Latin letters,
+    with or without `ё`, so the text of the cards and the queries are
+    brought to the same form: no html, lower case, single spaces, `ё` -> `е`
+    and Cyrillic letters transliterated to Latin ones.
+"""
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n',
+    'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y',
+    'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Different spellings of the same sounds in Latin letters
+LATIN_VARIANTS = [
+    ('shch', 'sch'),
+    ('kh', 'h'),
+    ('ja', 'ya'),
+    ('ju', 'yu'),
+]
+
+TRANSLITERATION_TABLE = str.maketrans(CYRILLIC_TO_LATIN)
+
+
+def normalize_text(text):
+    """ Function to bring the text(or the query) to the normalized form """
+    if not text:
+        return ''
+
+    text = unescape(strip_tags(text)).lower().replace('ё', 'е')
+    text = text.translate(TRANSLITERATION_TABLE)
+
+    for variant, replacement in LATIN_VARIANTS:
+        text = text.replace(variant, replacement)
+
+    # Collapse all whitespaces
+    return ' '.join(text.split())
+
+
+def build_search_text(*texts):
+    """
+        Function to build the normalized searchable text of an object
+        from its texts. The texts are separated by a new line, so that
+        the query can't match on the border of two texts.
+    """
+    return '\n'.join(normalize_text(text) for text in texts)
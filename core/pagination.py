@@ -0,0 +1,201 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+
+"""
+    Keyset(cursor) pagination.
+    Instead of OFFSET, the next page is found by the values of the ordering
+    fields of the last object on the current page, so the deep pages are
+    as cheap as the first one and no COUNT(*) is needed.
+    The cursor is opaque for the user: it is encoded JSON with the values.
+"""
+
+DIRECTION_NEXT = 'n'
+DIRECTION_PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """ DjangoJSONEncoder truncates datetimes to milliseconds, here the exact values are needed """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, direction):
+    """ Function to encode the values of the ordering fields into the cursor """
+    data = json.dumps({'v': values, 'd': direction}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """ Function to get the values of the ordering fields and the direction from the cursor """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, direction = data['v'], data['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor('Invalid cursor')
+
+    if not isinstance(values, list) or direction not in (DIRECTION_NEXT, DIRECTION_PREVIOUS):
+        raise InvalidCursor('Invalid cursor')
+
+    return values, direction
+
+
+class CursorPage:
+    """ Page of the cursor pagination, it mimics the page of django's paginator """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, *, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+        Paginator which uses the ordering of the queryset as the key of the pagination.
+        The primary key is added to the ordering to make it unique.
+        If `values` are given, the page contains dicts with these fields(and
+        with the fields of the ordering) instead of the objects.
+    """
+
+    def __init__(self, queryset, per_page, *, values=None):
+        self.per_page = per_page
+        self.ordering = self._get_ordering(queryset)
+        self.queryset = queryset.order_by(*self._order_by(reverse=False))
+
+        if values is not None:
+            values = list(values)
+            values += [field for field, descending in self.ordering if field not in values]
+            self.queryset = self.queryset.values(*values)
+
+    def page(self, cursor=None):
+        """ Method to get the page which follows(or precedes) the cursor """
+        if not cursor:
+            objects = list(self.queryset[:self.per_page + 1])
+            return self._make_page(objects, has_next=len(objects) > self.per_page, has_previous=False)
+
+        values, direction = decode_cursor(cursor)
+        if len(values) != len(self.ordering):
+            raise InvalidCursor('Invalid cursor')
+
+        try:
+            queryset = self.queryset.filter(self._keyset_filter(values, reverse=direction != DIRECTION_NEXT))
+        except (ValidationError, ValueError, TypeError):
+            # The values in the cursor don't match the types of the fields
+            raise InvalidCursor('Invalid cursor')
+
+        if direction == DIRECTION_NEXT:
+            objects = list(queryset[:self.per_page + 1])
+            return self._make_page(objects, has_next=len(objects) > self.per_page, has_previous=True)
+
+        # The previous page is the next page in the reversed ordering
+        objects = list(queryset.order_by(*self._order_by(reverse=True))[:self.per_page + 1])
+        has_previous = len(objects) > self.per_page
+        objects = objects[:self.per_page][::-1]
+        return self._make_page(objects, has_next=True, has_previous=has_previous)
+
+    def _make_page(self, objects, *, has_next, has_previous):
+        objects = objects[:self.per_page]
+        next_cursor = previous_cursor = None
+
+        if objects and has_next:
+            next_cursor = encode_cursor(self._values(objects[-1]), DIRECTION_NEXT)
+        if objects and has_previous:
+            previous_cursor = encode_cursor(self._values(objects[0]), DIRECTION_PREVIOUS)
+
+        return CursorPage(objects, self, next_cursor=next_cursor, previous_cursor=previous_cursor)
+
+    def _values(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field] for field, descending in self.ordering]
+        return [getattr(obj, field) for field, descending in self.ordering]
+
+    def _keyset_filter(self, values, *, reverse):
+        """
+            Condition for the objects after the given values:
+            (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ...
+        """
+        condition = Q()
+        equal = Q()
+
+        for (field, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+
+        return condition
+
+    def _order_by(self, *, reverse):
+        return [('-' if descending != reverse else '') + field for field, descending in self.ordering]
+
+    @staticmethod
+    def _get_ordering(queryset):
+        """ Method to get the list of pairs (field, descending) from the ordering of the queryset """
+        ordering = []
+
+        for field in queryset.query.order_by or queryset.model._meta.ordering:
+            if not isinstance(field, str):
+                raise ValueError('Only the names of fields are supported by the cursor pagination')
+
+            ordering.append((field.lstrip('-'), field.startswith('-')))
+
+        pk_names = ('pk', queryset.model._meta.pk.name)
+        if not any(field in pk_names for field, descending in ordering):
+            ordering.append(('pk', False))
+
+        return ordering
+
+
+class CursorPaginationMixin:
+    """
+        Mixin for ListView to use the cursor pagination.
+        The old links with the number of the page(`page` GET parameter)
+        are still served by the OFFSET pagination.
+    """
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size)
+
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+
+        return paginator, page, page.object_list, page.has_other_pages()
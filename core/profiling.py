@@ -0,0 +1,259 @@
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.template.base import Template
+from django.urls import resolve, Resolver404
+from django.utils.timezone import now
+
+from .instrumentation import masked_path
+
+
+"""
+    Profiling of the requests in production.
+    The profiler is statistical: the thread of the request is sampled every
+    CORE_PROFILING_INTERVAL_MS milliseconds and the stacks are counted
+    in the collapsed form(`frame;frame;frame count`), so it slows down
+    the request only a little and the flame graph can be built from it.
+    The request is profiled if it has `X-Profile: 1` header and the user
+    is staff, or randomly with the probability CORE_PROFILING_SAMPLE_RATE.
+    Both are turned on by CORE_PROFILING_ENABLED. The profiles are stored
+    as JSON files in CORE_PROFILING_DIR, only the last CORE_PROFILING_MAX_FILES
+    are kept. They are shown in the admin panel at admin/profiles/.
+"""
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_RE = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+
+
+@lru_cache(maxsize=4096)
+def short_path(filename):
+    """ Function to get the path of the module relative to sys.path(e.g. django/db/models/query.py) """
+    for directory in sorted(sys.path, key=len, reverse=True):
+        if directory and filename.startswith(directory + os.sep):
+            return filename[len(directory) + 1:]
+    return filename
+
+
+def frame_label(frame):
+    """ Function to get the name of the frame in the stack, the rendered templates are named """
+    code = frame.f_code
+    label = f'{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})'
+
+    if code is Template.render.__code__:
+        label += f' [{frame.f_locals["self"].name}]'
+
+    # `;` separates the frames in the collapsed stacks
+    return label.replace(';', ':')
+
+
+class StackSampler:
+    """
+        Sampler of the stack of the current thread, it works in the separate thread.
+        Only the frames called from `root` frame are recorded.
+    """
+
+    def __init__(self, interval, root):
+        self.interval = interval
+        self.root = root
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.root:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+
+            # The root is not found, the request is already finished
+            if frame is None or not stack:
+                continue
+
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class ProfileStore:
+    """ Storage of the profiles on the disk, the oldest profiles are removed """
+
+    def __init__(self, directory=None, max_files=None):
+        self.directory = directory or getattr(settings, 'CORE_PROFILING_DIR',
+                                              os.path.join(tempfile.gettempdir(), 'djangoIR-profiles'))
+        self.max_files = max_files or getattr(settings, 'CORE_PROFILING_MAX_FILES', 200)
+
+    def save(self, profile):
+        """ Method to save the profile, returns its id """
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = '{}-{}'.format(int(time.time() * 1000), uuid.uuid4().hex[:8])
+        profile = dict(profile, id=profile_id)
+
+        # The file appears at once, the admin panel doesn't see the half-written one
+        path = self._path(profile_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(profile, file, default=str)
+        os.replace(path + '.tmp', path)
+
+        self.prune()
+        return profile_id
+
+    def get(self, profile_id):
+        """ Method to get the profile by id(None if there is no one) """
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+
+        try:
+            with open(self._path(profile_id), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def ids(self):
+        """ Method to get the ids of the profiles, the newest first """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+
+        ids = [name[:-len('.json')] for name in names if name.endswith('.json')]
+        # The ids start with the time in milliseconds
+        return sorted((profile_id for profile_id in ids if PROFILE_ID_RE.match(profile_id)),
+                      key=lambda profile_id: int(profile_id.split('-')[0]), reverse=True)
+
+    def prune(self):
+        """ Method to remove the oldest profiles above the limit """
+        for profile_id in self.ids()[self.max_files:]:
+            try:
+                os.remove(self._path(profile_id))
+            except FileNotFoundError:
+                # It is removed by another process
+                pass
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, profile_id + '.json')
+
+
+class ProfilingMiddleware:
+    """
+        Middleware to profile the requests(see the docstring of the module).
+        It must be after AuthenticationMiddleware: the header is ignored
+        unless the user is staff, so the others can't start the sampler.
+        The id of the profile is returned to the staff in `X-Profile-Id` header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'CORE_PROFILING_ENABLED', False):
+            return self.get_response(request)
+
+        requested = request.META.get(PROFILE_HEADER) == '1' and request.user.is_staff
+        sampled = random.random() < getattr(settings, 'CORE_PROFILING_SAMPLE_RATE', 0)
+        if not (requested or sampled):
+            return self.get_response(request)
+
+        sampler = StackSampler(getattr(settings, 'CORE_PROFILING_INTERVAL_MS', 5) / 1000, sys._getframe())
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration = time.perf_counter() - started
+
+        profile_id = ProfileStore().save(self.describe(request, response, sampler, duration))
+        if requested:
+            response['X-Profile-Id'] = profile_id
+
+        return response
+
+    @staticmethod
+    def describe(request, response, sampler, duration):
+        """ Method to get the profile of the request """
+        try:
+            url_name = resolve(request.path_info).view_name
+        except Resolver404:
+            url_name = None
+
+        # The statistics of the queries(see core.instrumentation)
+        query_stats = getattr(request, 'query_stats', None)
+
+        return {
+            'created': now(),
+            'method': request.method,
+            'path': masked_path(request),
+            'url_name': url_name,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'interval_ms': round(sampler.interval * 1000, 2),
+            'samples': sampler.samples,
+            'stacks': dict(sampler.stacks),
+            'queries': query_stats.as_dict() if query_stats is not None else None,
+        }
+
+
+def build_flame_graph(stacks, min_width=0.002):
+    """
+        Function to get the frames of the flame graph from the collapsed stacks.
+        Each frame has `name`, `samples`, `depth`, `left` and `width`(the share of
+        all samples, from 0 to 1). The frames narrower than `min_width` are skipped.
+    """
+    total = sum(stacks.values())
+    if not total:
+        return []
+
+    root = {'children': {}}
+    for stack, count in stacks.items():
+        node = root
+        for name in stack.split(';'):
+            node = node['children'].setdefault(name, {'samples': 0, 'children': {}})
+            node['samples'] += count
+
+    frames = []
+
+    def walk(node, depth, left):
+        for name, child in sorted(node['children'].items()):
+            width = child['samples'] / total
+            if width >= min_width:
+                frames.append({'name': name, 'samples': child['samples'], 'depth': depth,
+                               'left': left, 'width': width})
+                walk(child, depth + 1, left)
+            left += width
+
+    walk(root, 0, 0.0)
+    return frames
+
+
+def top_functions(stacks, limit=30):
+    """ Function to get the frames with the most own samples: [(name, own samples, total samples)] """
+    own, inclusive = Counter(), Counter()
+
+    for stack, count in stacks.items():
+        names = stack.split(';')
+        own[names[-1]] += count
+        # The recursive frame is counted once
+        for name in set(names):
+            inclusive[name] += count
+
+    return [(name, samples, inclusive[name]) for name, samples in own.most_common(limit)]
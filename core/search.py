@@ -0,0 +1,70 @@
+from django.db import connection
+from django.db.models import (Q, F)
+from django.contrib.postgres.search import (SearchQuery,
+                                            SearchRank)
+
+from .normalization import normalize_text
+from .search_index import (card_search_index,
+                           is_search_index_enabled)
+
+
+"""
+    Search backend of core app.
+    The cards are searched by the precomputed normalized text(see core.normalization),
+    the query is normalized in the same way. On PostgreSQL the normalized text has
+    the trigram index(substring search) and the cards also have the full-text search
+    vector(ranking), see migrations 0003 and 0004. Other databases(e.g. SQLite for
+    the tests and local runs) use the plain substring search without ranking.
+    If the in-memory search index is enabled(see core.search_index), the cards
+    are found by it, and the database only fetches the cards by their ids.
+"""
+
+# The content of the cards is both in Russian and English,
+# so the language-agnostic configuration is used
+SEARCH_CONFIG = 'simple'
+# If the in-memory index finds more cards than this number, the database is used
+# instead, so that the query doesn't contain a huge list of ids
+SEARCH_INDEX_MAX_IDS = 900
+
+
+def is_full_text_search_available():
+    """ Function to check that the database supports the full-text search """
+    return connection.vendor == 'postgresql'
+
+
+def search_cards(queryset, q, *, ranked=False):
+    """
+        Function to filter cards by q.
+        If `ranked` is True and the full-text search is available,
+        the most relevant cards go first.
+    """
+    if is_search_index_enabled():
+        card_ids = card_search_index.search(q)
+        if len(card_ids) <= SEARCH_INDEX_MAX_IDS:
+            return queryset.filter(pk__in=card_ids)
+
+    condition = Q(search_text__contains=normalize_text(q))
+
+    if not is_full_text_search_available():
+        return queryset.filter(condition)
+
+    query = SearchQuery(q, config=SEARCH_CONFIG)
+    result = queryset.filter(condition | Q(search_vector=query))
+
+    if ranked:
+        # Keep the default order of the cards for the cards with the same rank
+        result = result.annotate(rank=SearchRank(F('search_vector'), query)). \
+            order_by('-rank', *queryset.model._meta.ordering)
+
+    return result
+
+
+def search_by_name(queryset, q):
+    """ Function to filter categories or subcategories by q """
+    return queryset.filter(name__icontains=q)
+
+
+def search_items_by_name(items, q):
+    """ Function to filter the items of the taxonomy snapshot by q(as search_by_name does) """
+    q = q.casefold()
+    return [item for item in items if q in item.name.casefold()]
@@ -0,0 +1,150 @@
+from collections import defaultdict
+import threading
+
+from django.conf import settings
+
+from .models import Card
+from .cache import (get_generation,
+                    increment_generation)
+from .normalization import normalize_text
+
+
+"""
+    In-memory search engine for the cards.
+    The cards are changed rarely(only through the admin panel), but they are
+    searched on every request with `q`, so each process keeps an inverted
+    index of trigrams of the normalized content and translit of all cards
+    (the column `search_text`, see core.normalization).
+    The index is updated incrementally by the signals(see core.signals).
+    It is optional and is turned on by the setting `CORE_SEARCH_INDEX_ENABLED`.
+"""
+
+# Length of n-grams in the index
+GRAM_SIZE = 3
+# Key of the generation of the index in the cache. Each change of the cards
+# increments it, so the processes can see that the cards were changed
+# in another process and their indexes must be rebuilt
+GENERATION_CACHE_KEY = 'core:search_index:generation'
+
+
+def split_to_grams(text):
+    """ Function to get the set of all n-grams of the text """
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class CardSearchIndex:
+    """
+        Inverted index: n-gram -> ids of the cards which contain it.
+        The index answers substring queries, n-grams are used only to find
+        candidates which are checked against the normalized text of the card.
+    """
+
+    def __init__(self):
+        # Normalized searchable text of each card
+        self._texts = {}
+        self._postings = defaultdict(set)
+        self._generation = None
+        self._lock = threading.RLock()
+
+    def search(self, q):
+        """ Method to find ids of the cards which contain q(the newest first) """
+        q = normalize_text(q)
+
+        with self._lock:
+            self._ensure_is_actual()
+
+            if len(q) < GRAM_SIZE:
+                # The query is too short for the index, so just scan the texts
+                candidates = self._texts.keys()
+            else:
+                # Start the intersection from the rarest n-gram
+                postings = sorted((self._postings.get(gram, set()) for gram in split_to_grams(q)),
+                                  key=len)
+                candidates = set.intersection(*postings)
+
+            found = [card_id for card_id in candidates if q in self._texts[card_id]]
+
+        # The same order as the default one for the cards
+        found.sort(reverse=True)
+        return found
+
+    def update(self, card):
+        """ Method to add the card to the index or to update it """
+        def change():
+            self._remove(card.id)
+            self._add(card.id, card.search_text)
+
+        self._apply(change)
+
+    def remove(self, card_id):
+        """ Method to remove the card from the index """
+        self._apply(lambda: self._remove(card_id))
+
+    def build(self):
+        """ Method to build the index from scratch """
+        with self._lock:
+            self._texts = {}
+            self._postings = defaultdict(set)
+            # Remember the generation before loading, so that changes
+            # made during the build will cause one more rebuild
+            generation = get_generation(GENERATION_CACHE_KEY)
+
+            cards = Card.objects.values_list('id', 'search_text')
+            for card_id, search_text in cards.iterator():
+                self._add(card_id, search_text)
+
+            self._generation = generation
+
+    def _apply(self, change):
+        """
+            Method to apply the change of the cards to the index and to announce it.
+            The index is patched only if no other process has changed the cards
+            since the generation of the index: the new generation must follow it.
+        """
+        with self._lock:
+            generation = increment_generation(GENERATION_CACHE_KEY, unique=True)
+
+            if self._generation is not None and generation == self._generation + 1:
+                change()
+                self._generation = generation
+            else:
+                # The index is not built or the cards were changed elsewhere,
+                # so it will be rebuilt on the next search
+                self._generation = None
+
+    def _ensure_is_actual(self):
+        """ Method to (re)build the index if it is not built or cards were changed elsewhere """
+        if self._generation is None or self._generation != get_generation(GENERATION_CACHE_KEY):
+            self.build()
+
+    def _add(self, card_id, search_text):
+        self._texts[card_id] = search_text
+
+        for gram in split_to_grams(search_text):
+            self._postings[gram].add(card_id)
+
+    def _remove(self, card_id):
+        text = self._texts.pop(card_id, None)
+        if text is None:
+            return None
+
+        for gram in split_to_grams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(card_id)
+                if not posting:
+                    del self._postings[gram]
+
+
+# Index of the process
+card_search_index = CardSearchIndex()
+
+
+def invalidate_search_index():
+    """ Function to make the indexes of all processes be rebuilt(e.g. after the bulk changes of the cards) """
+    increment_generation(GENERATION_CACHE_KEY)
+
+
+def is_search_index_enabled():
+    """ Function to check that the in-memory search index must be used """
+    return getattr(settings, 'CORE_SEARCH_INDEX_ENABLED', False)
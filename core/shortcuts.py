@@ -5,7 +5,20 @@ import os
 
 def upload_to(path):
     """ Function which uploads files to specific directory """
-    return partial(change_filename_to_temporary, path=path)
+    return partial(name_file_by_id, path=path)
+
+
+def name_file_by_id(instance, filename, path):
+    """
+        Function names the file by the id of the object.
+        The id of a new object is not known before the saving, so its file
+        gets the temporary name and is renamed after the saving(see core.signals)
+    """
+    if instance.pk is None:
+        return change_filename_to_temporary(instance, filename, path)
+
+    extension = os.path.splitext(filename)
+    return os.path.join(path, str(instance.pk) + extension[1])
 
 
 def change_filename_to_temporary(instance, filename, path):
@@ -17,3 +30,29 @@ def change_filename_to_temporary(instance, filename, path):
     # Create a unique name of the file using timestamp
     filename = str(int(datetime.now().timestamp() * (10 ** 6))) + extension[1]
     return os.path.join(path, filename)
+
+
+def move_file(storage, old_name, new_name):
+    """
+        Function moves the file within the storage, the file with the new name
+        is replaced. Returns the name of the file in the storage.
+    """
+    if storage.exists(new_name):
+        storage.delete(new_name)
+
+    try:
+        old_path, new_path = storage.path(old_name), storage.path(new_name)
+    except NotImplementedError:
+        # Remote storages have no paths
+        old_path = new_path = None
+
+    if old_path:
+        # The local file is simply renamed
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        os.replace(old_path, new_path)
+    else:
+        with storage.open(old_name, 'rb') as file:
+            new_name = storage.save(new_name, file)
+        storage.delete(old_name)
+
+    return new_name
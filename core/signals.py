@@ -1,16 +1,31 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import (pre_save,
+                                      post_save,
+                                      post_delete,
+                                      m2m_changed)
+from copy import copy
 from functools import partial
-import os
 
 from .models import (Category,
                      SubCategory,
                      Card)
+from .normalization import build_search_text
+from .shortcuts import move_file
+from .search_index import (card_search_index,
+                           is_search_index_enabled)
+from .suggest import invalidate_suggestions
+from .taxonomy import invalidate_taxonomy
+from .cache import invalidate_catalogue
+from .bundle import record_changes
 
 
 def renameFileToIDofObject(sender, instance, created, **kwargs):
     """
         Function changes the name of the file to the id of the object
         for which this belongs to.
+        The file of an existing object is named by its id during the uploading
+        (see core.shortcuts.name_file_by_id), so only the file of a new object
+        is renamed here, all other saves don't touch the storage.
     """
     # Get the name of the file field of the instance(we will work with it)
     nameOfTheFileField = kwargs.get('name_of_filefield_to_use', None)
@@ -19,34 +34,40 @@ def renameFileToIDofObject(sender, instance, created, **kwargs):
     if not nameOfTheFileField:
         raise ValueError("Argument 'name_of_filefield_to_use' must be provided.")
 
+    file = getattr(instance, nameOfTheFileField)
+
     # If blankField is empty, so then nothing to rename
-    if not getattr(instance, nameOfTheFileField):
+    if not file:
         return None
 
-    # Get current path of the file
-    path = str(getattr(instance, nameOfTheFileField).path).split('\\')
+    # The final name of the file, the id of the object is known now
+    newName = file.field.generate_filename(instance, file.name)
+    if file.name == newName:
+        # The file is already named by the id
+        return None
 
-    # Change the path of the file, new name is the id of the object
-    extension = os.path.splitext(path[-1])
-    newFileName = str(instance.id) + extension[1]
+    # Move the file and change the previous name of the file to a new one
+    file.name = move_file(file.storage, file.name, newName)
 
-    # New name of the file will be id of the instance model
-    newPath = '\\'.join(path[0:len(path) - 1]) + '\\' + newFileName
+    sender.objects.filter(pk=instance.pk).update(**{nameOfTheFileField: file.name})
 
-    if os.path.isfile(newPath) and newPath != '\\'.join(path):
-        # If such a file already exists, it means that
-        # a new file was added, so then remove the old one
-        os.remove(newPath)
 
-    # Set new path to the file
-    os.rename(getattr(instance, nameOfTheFileField).path, newPath)
+def freeFileNameOfObject(sender, instance, **kwargs):
+    """
+        Function removes the file of the object before the uploading of a new one,
+        so that the new file gets the name by the id at once(otherwise the storage
+        would add a suffix to the name).
+    """
+    nameOfTheFileField = kwargs.get('name_of_filefield_to_use', None)
+    file = getattr(instance, nameOfTheFileField)
 
-    # Change the previous name of the file to a new one
-    namePath = getattr(instance, nameOfTheFileField).name.split('/')
-    setattr(getattr(instance, nameOfTheFileField), 'name',
-            '/'.join(namePath[0:len(namePath) - 1]) + '/' + newFileName)
+    # Only the new files of the existing objects
+    if instance.pk is None or not file or file._committed:
+        return None
 
-    sender.objects.filter(pk=instance.id).update(**{nameOfTheFileField: getattr(instance, nameOfTheFileField)})
+    newName = file.field.generate_filename(instance, file.name)
+    if file.storage.exists(newName):
+        file.storage.delete(newName)
 
 
 # Connect model Category to renameFileToIDofObject, so that we will be able to change the name
@@ -81,3 +102,188 @@ post_save.connect(
     dispatch_uid='update_file_name_card',
     weak=False
 )
+
+
+# Free the name by the id before the uploading of a new file of an existing object
+for model, nameOfTheFileField in ((Category, 'picture'),
+                                  (SubCategory, 'picture'),
+                                  (Card, 'pronunciation')):
+    pre_save.connect(
+        receiver=partial(freeFileNameOfObject,
+                         name_of_filefield_to_use=nameOfTheFileField),
+        sender=model,
+        dispatch_uid=f'free_file_name_{model.__name__.lower()}',
+        weak=False
+    )
+
+
+def updateSearchTextOfCard(sender, instance, **kwargs):
+    """ Function precomputes the normalized searchable text of the card before saving """
+    instance.search_text = build_search_text(instance.content,
+                                             instance.translit_of_pronunciation)
+
+
+# Keep the normalized text of the card up to date with its content
+pre_save.connect(
+    receiver=updateSearchTextOfCard,
+    sender=Card,
+    dispatch_uid='update_search_text_of_card'
+)
+
+
+def updateCardInSearchIndex(sender, instance, **kwargs):
+    """ Function updates the card in the in-memory search index(if it is enabled) after the commit """
+    if is_search_index_enabled():
+        # The instance can be changed again before the commit
+        card = copy(instance)
+        transaction.on_commit(lambda: card_search_index.update(card))
+
+
+def removeCardFromSearchIndex(sender, instance, **kwargs):
+    """ Function removes the card from the in-memory search index(if it is enabled) after the commit """
+    if is_search_index_enabled():
+        card_id = instance.id
+        transaction.on_commit(lambda: card_search_index.remove(card_id))
+
+
+# Keep the in-memory search index up to date with the cards,
+# the changes which are rolled back don't reach it
+post_save.connect(
+    receiver=updateCardInSearchIndex,
+    sender=Card,
+    dispatch_uid='update_card_in_search_index'
+)
+
+post_delete.connect(
+    receiver=removeCardFromSearchIndex,
+    sender=Card,
+    dispatch_uid='remove_card_from_search_index'
+)
+
+
+def invalidateSuggestions(sender, **kwargs):
+    """ Function marks the suggestions for the search as outdated """
+    invalidate_suggestions()
+
+
+# Suggestions are built from the names of categories, subcategories
+# and from the content of cards, so rebuild them after each change
+for model in (Category, SubCategory, Card):
+    post_save.connect(
+        receiver=invalidateSuggestions,
+        sender=model,
+        dispatch_uid=f'invalidate_suggestions_save_{model.__name__.lower()}'
+    )
+    post_delete.connect(
+        receiver=invalidateSuggestions,
+        sender=model,
+        dispatch_uid=f'invalidate_suggestions_delete_{model.__name__.lower()}'
+    )
+
+
+def invalidateTaxonomy(sender, **kwargs):
+    """ Function marks the snapshots of the taxonomy as outdated """
+    invalidate_taxonomy()
+
+
+# The snapshot of the taxonomy contains categories, subcategories
+# and the links between them, so rebuild it after each change
+for model in (Category, SubCategory):
+    post_save.connect(
+        receiver=invalidateTaxonomy,
+        sender=model,
+        dispatch_uid=f'invalidate_taxonomy_save_{model.__name__.lower()}'
+    )
+    post_delete.connect(
+        receiver=invalidateTaxonomy,
+        sender=model,
+        dispatch_uid=f'invalidate_taxonomy_delete_{model.__name__.lower()}'
+    )
+
+m2m_changed.connect(
+    receiver=invalidateTaxonomy,
+    sender=SubCategory.categoryId.through,
+    dispatch_uid='invalidate_taxonomy_m2m_subcategory'
+)
+
+
+def invalidateCatalogue(sender, **kwargs):
+    """ Function marks the cached pages and fragments of the catalogue as outdated """
+    invalidate_catalogue()
+
+
+# The cached pages show categories, subcategories and cards,
+# so they are outdated after each change of them or of the links between them
+for model in (Category, SubCategory, Card):
+    post_save.connect(
+        receiver=invalidateCatalogue,
+        sender=model,
+        dispatch_uid=f'invalidate_catalogue_save_{model.__name__.lower()}'
+    )
+    post_delete.connect(
+        receiver=invalidateCatalogue,
+        sender=model,
+        dispatch_uid=f'invalidate_catalogue_delete_{model.__name__.lower()}'
+    )
+
+m2m_changed.connect(
+    receiver=invalidateCatalogue,
+    sender=SubCategory.categoryId.through,
+    dispatch_uid='invalidate_catalogue_m2m_subcategory'
+)
+
+m2m_changed.connect(
+    receiver=invalidateCatalogue,
+    sender=Card.subCategoryId.through,
+    dispatch_uid='invalidate_catalogue_m2m_card'
+)
+
+
+def recordChangeOfObject(sender, instance, **kwargs):
+    """ Function records the change(or the deletion) of the object for the delta bundles """
+    record_changes(sender, [instance.pk])
+
+
+def recordChangeOfLinks(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+        Function records the change of the links between the objects.
+        The links are the part of the object which owns the many to many
+        field(subcategory or card), so this object is recorded as changed.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return None
+
+    if not reverse:
+        record_changes(type(instance), [instance.pk])
+    elif action == 'pre_clear':
+        # The linked objects are not known after the clearing
+        linked = sender.objects.filter(**{type(instance)._meta.model_name: instance.pk})
+        record_changes(model, linked.values_list(model._meta.model_name + '_id', flat=True))
+    else:
+        record_changes(model, pk_set)
+
+
+# The log of the changes is the source of the delta bundles(see core.bundle)
+for model in (Category, SubCategory, Card):
+    post_save.connect(
+        receiver=recordChangeOfObject,
+        sender=model,
+        dispatch_uid=f'record_change_save_{model.__name__.lower()}'
+    )
+    post_delete.connect(
+        receiver=recordChangeOfObject,
+        sender=model,
+        dispatch_uid=f'record_change_delete_{model.__name__.lower()}'
+    )
+
+m2m_changed.connect(
+    receiver=recordChangeOfLinks,
+    sender=SubCategory.categoryId.through,
+    dispatch_uid='record_change_m2m_subcategory'
+)
+
+m2m_changed.connect(
+    receiver=recordChangeOfLinks,
+    sender=Card.subCategoryId.through,
+    dispatch_uid='record_change_m2m_card'
+)
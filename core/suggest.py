@@ -0,0 +1,128 @@
+from bisect import bisect_left
+import threading
+
+from django.urls import reverse
+from django.utils.html import strip_tags
+from django.utils.http import urlencode
+from django.utils.text import Truncator
+
+from .models import (Category,
+                     SubCategory,
+                     Card)
+from .normalization import normalize_text
+from .cache import (get_generation,
+                    increment_generation)
+
+
+"""
+    Suggestions(autocomplete) for the search forms.
+    Each process keeps in memory a sorted list of normalized prefixes
+    of the names of categories, subcategories and of the content of cards.
+    A prefix starts at the beginning of each word, so the list answers
+    "word starts with q" queries with a binary search.
+    The models remain the source of truth, the list is rebuilt
+    after their changes(see core.signals).
+"""
+
+GENERATION_CACHE_KEY = 'core:suggest:generation'
+# Keys longer than this number of characters are truncated
+MAX_KEY_LENGTH = 50
+# Suggestions for the cards show only the beginning of their content
+MAX_LABEL_LENGTH = 60
+
+TYPE_CATEGORY = 'category'
+TYPE_SUBCATEGORY = 'subcategory'
+TYPE_CARD = 'card'
+
+
+def split_to_keys(text):
+    """ Function to get the normalized keys of the text(one per each word) """
+    text = normalize_text(text)
+    keys = []
+    position = 0
+
+    while position != -1:
+        keys.append(text[position:position + MAX_KEY_LENGTH])
+        position = text.find(' ', position)
+        if position != -1:
+            position += 1
+
+    return keys
+
+
+class SuggestionIndex:
+    """
+        Sorted list of the keys and the list with the suggestions
+        which correspond to them(the same positions in the lists).
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._suggestions = []
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def suggest(self, q, limit):
+        """ Method to find at most `limit` suggestions which have a word starting with q """
+        q = normalize_text(q)[:MAX_KEY_LENGTH]
+        if not q:
+            return []
+
+        with self._lock:
+            if self._generation != get_generation(GENERATION_CACHE_KEY):
+                self._build()
+            # Take the references, so the lists can be replaced during the lookup
+            keys, suggestions = self._keys, self._suggestions
+
+        result = []
+        seen = set()
+        position = bisect_left(keys, q)
+
+        while position < len(keys) and keys[position].startswith(q) and len(result) < limit:
+            suggestion = suggestions[position]
+            # One suggestion can have several matching words
+            if (suggestion['type'], suggestion['id']) not in seen:
+                seen.add((suggestion['type'], suggestion['id']))
+                result.append(suggestion)
+            position += 1
+
+        return result
+
+    def _build(self):
+        """ Method to build the lists from the models """
+        generation = get_generation(GENERATION_CACHE_KEY)
+        entries = []
+
+        for cat_id, name in Category.objects.values_list('id', 'name').iterator():
+            suggestion = {'type': TYPE_CATEGORY, 'id': cat_id, 'label': name,
+                          'url': reverse('core:subcategory-list', args=[cat_id])}
+            entries.extend((key, suggestion) for key in split_to_keys(name))
+
+        for subcat_id, name in SubCategory.objects.values_list('id', 'name').iterator():
+            suggestion = {'type': TYPE_SUBCATEGORY, 'id': subcat_id, 'label': name,
+                          'url': reverse('core:card-list', args=[subcat_id])}
+            entries.extend((key, suggestion) for key in split_to_keys(name))
+
+        search_url = reverse('core:search')
+        for card_id, content in Card.objects.values_list('id', 'content').iterator():
+            text = strip_tags(content).strip()
+            # The label may be truncated, so the card is searched by the whole text
+            suggestion = {'type': TYPE_CARD, 'id': card_id, 'label': Truncator(text).chars(MAX_LABEL_LENGTH),
+                          'url': search_url + '?' + urlencode({'q': text})}
+            entries.extend((key, suggestion) for key in split_to_keys(content))
+
+        entries.sort(key=lambda entry: entry[0])
+
+        # Replace the lists at once
+        self._keys = [key for key, suggestion in entries]
+        self._suggestions = [suggestion for key, suggestion in entries]
+        self._generation = generation
+
+
+# Index of the process
+suggestion_index = SuggestionIndex()
+
+
+def invalidate_suggestions():
+    """ Function to mark the suggestions of all processes as outdated """
+    increment_generation(GENERATION_CACHE_KEY)
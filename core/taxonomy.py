@@ -0,0 +1,118 @@
+import threading
+
+from django.core.cache import cache
+
+from .models import (Category,
+                     SubCategory)
+from .cache import (get_generation,
+                    invalidate_generation)
+
+
+"""
+    Taxonomy(categories and their subcategories) for browsing.
+    The taxonomy is changed only through the admin panel, but it is read
+    on each page of the catalogue, so each process keeps a snapshot of it
+    in memory: names, urls of the pictures and category -> subcategories.
+    The snapshot is also put into the cache, so that with a shared cache
+    backend only one process loads it from the database after a change.
+    The snapshot is replaced as a whole, it is never changed in place.
+"""
+
+GENERATION_CACHE_KEY = 'core:taxonomy:generation'
+SNAPSHOT_CACHE_KEY = 'core:taxonomy:snapshot'
+
+
+class TaxonomyItem:
+    """ Category or subcategory in the snapshot """
+    __slots__ = ('id', 'name', 'picture_url')
+
+    def __init__(self, id, name, picture_url):
+        self.id = id
+        self.name = name
+        self.picture_url = picture_url
+
+    def __repr__(self):
+        return f'<TaxonomyItem {self.name}({self.id})>'
+
+
+class TaxonomySnapshot:
+    """
+        Snapshot of the taxonomy, the items are ordered by id
+        as the models are.
+    """
+
+    def __init__(self, categories, subcategories, links):
+        self._categories = {item.id: item for item in categories}
+        self._subcategories = {item.id: item for item in subcategories}
+        self._subcategories_of = {}
+
+        for subcat_id, cat_id in sorted(links):
+            self._subcategories_of.setdefault(cat_id, []).append(self._subcategories[subcat_id])
+
+    @classmethod
+    def load(cls):
+        """ Method to load the snapshot from the database """
+        def items(model):
+            storage = model._meta.get_field('picture').storage
+            return [TaxonomyItem(pk, name, storage.url(picture) if picture else '')
+                    for pk, name, picture in model.objects.order_by('pk').values_list('pk', 'name', 'picture')]
+
+        links = SubCategory.categoryId.through.objects.values_list('subcategory_id', 'category_id')
+        return cls(items(Category), items(SubCategory), list(links))
+
+    def categories(self):
+        return list(self._categories.values())
+
+    def get_category(self, cat_id):
+        return self._categories.get(cat_id)
+
+    def get_subcategory(self, subcat_id):
+        return self._subcategories.get(subcat_id)
+
+    def subcategories_of(self, cat_id):
+        return list(self._subcategories_of.get(cat_id, ()))
+
+
+class Taxonomy:
+    """ Holder of the actual snapshot of the process """
+
+    def __init__(self):
+        self._snapshot = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """ Method to get the actual snapshot """
+        generation = get_generation(GENERATION_CACHE_KEY)
+        if self._generation == generation:
+            return self._snapshot
+
+        with self._lock:
+            if self._generation != generation:
+                self._snapshot = self._get_snapshot(generation)
+                self._generation = generation
+
+        return self._snapshot
+
+    @staticmethod
+    def _get_snapshot(generation):
+        """ Method to take the snapshot from the cache or to load it """
+        cached = cache.get(SNAPSHOT_CACHE_KEY)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+        snapshot = TaxonomySnapshot.load()
+        # Don't overwrite the snapshot of the newer generation
+        if get_generation(GENERATION_CACHE_KEY) == generation:
+            cache.set(SNAPSHOT_CACHE_KEY, (generation, snapshot), None)
+
+        return snapshot
+
+
+# Taxonomy of the process
+taxonomy = Taxonomy()
+
+
+def invalidate_taxonomy():
+    """ Function to mark the snapshots of all processes as outdated """
+    invalidate_generation(GENERATION_CACHE_KEY)
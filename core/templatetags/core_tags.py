@@ -2,10 +2,19 @@ from django import template
 
 register = template.Library()
 
+# GET parameters of the pagination, they are valid only for the same
+# other parameters(search, sorting), and only one of them is used at once
+PAGINATION_PARAMS = ('page', 'cursor')
+
 @register.simple_tag(takes_context=True)
 def url_replace(context, **kwargs):
     params = context['request'].GET.copy()
 
+    # Changing of the pagination or other parameters
+    # makes the current pagination parameters invalid
+    for param in PAGINATION_PARAMS:
+        params.pop(param, None)
+
     for key, val in kwargs.items():
         params[key] = val
 
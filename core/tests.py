@@ -1,17 +1,80 @@
+import gzip
+import json
+import os
 import tempfile
-from io import BytesIO
-from django.db import transaction
+from datetime import timedelta
+from unittest import mock
+from io import (BytesIO,
+                StringIO)
+from django.conf import settings
+from django.db import (transaction,
+                       connection,
+                       DatabaseError)
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from django.test import TestCase, override_settings
+from django.test import (TestCase,
+                         TransactionTestCase,
+                         LiveServerTestCase,
+                         override_settings)
+from django.test.testcases import (LiveServerThread,
+                                   QuietWSGIRequestHandler)
+from django.core.servers.basehttp import WSGIServer
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.utils import IntegrityError
+from django.urls import reverse
+from django.core.cache import (cache,
+                               caches)
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import (call_command,
+                                    CommandError)
+from django.utils.timezone import now
+from django.core.exceptions import ImproperlyConfigured
+from django.views.generic.list import ListView
 
 from .decorators import for_all_methods
+from .views import ParentObjectMixin
+from .api import CatalogueApiView
+from .cache import (get_favourite_ids,
+                    reload_favourite_ids,
+                    get_generation,
+                    increment_generation,
+                    get_catalogue_generation,
+                    get_catalogue_modified,
+                    FAVOURITES_CACHE_KEY,
+                    GENERATION_CLAIM_CACHE_KEY,
+                    LOCAL_CACHE_ALIAS)
+from .search import (search_cards,
+                     search_by_name)
+from .search_index import (CardSearchIndex,
+                           card_search_index,
+                           GENERATION_CACHE_KEY as SEARCH_INDEX_GENERATION_CACHE_KEY)
+from .suggest import MAX_LABEL_LENGTH
+from .bundle import (PRUNE_CACHE_KEY,
+                     record_changes)
+from .bulk import bulk_insert
+from .taxonomy import (taxonomy,
+                       Taxonomy,
+                       GENERATION_CACHE_KEY as TAXONOMY_GENERATION_CACHE_KEY)
+from .profiling import (ProfileStore,
+                        build_flame_graph)
+from .instrumentation import (QueryBudgetTestMixin,
+                              collect_queries,
+                              collect_cache_calls)
+from .urls import (urlpatterns,
+                   QUERY_BUDGETS)
+from .normalization import normalize_text
 from .models import (Category,
                      SubCategory,
                      Card,
                      TypesOfCard,
-                     Favourite)
+                     Favourite,
+                     CatalogueChange)
+
+
+def clear_caches():
+    """ Function to clear the shared cache and the cache of the process """
+    cache.clear()
+    caches[LOCAL_CACHE_ALIAS].clear()
 
 
 @for_all_methods(override_settings(MEDIA_ROOT=tempfile.TemporaryDirectory(prefix='mediatest').name))
@@ -83,6 +146,28 @@ class CoreTests(TestCase):
         self.assertEqual(card2.pronunciation, f'cards/sounds/{card2.id}.mp3')
         self.assertEqual(card2.translit_of_pronunciation, 'Test translit')
 
+    def test_file_is_renamed_only_once(self):
+        image_file = SimpleUploadedFile('icon.svg', b'<svg></svg>')
+        cat = Category.objects.create(name='Test category', picture=image_file)
+        self.assertEqual(cat.picture.name, f'categories/pictures/{cat.id}.svg')
+        self.assertTrue(cat.picture.storage.exists(cat.picture.name))
+
+        # The file is not changed, so the object is updated only once
+        cat.name = 'Renamed category'
+        with CaptureQueriesContext(connection) as queries:
+            cat.save()
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "core_category"') for query in queries), 1)
+        self.assertEqual(Category.objects.get(pk=cat.id).picture.name, f'categories/pictures/{cat.id}.svg')
+
+        # The new file of the existing object gets the name by the id at once
+        cat.picture = SimpleUploadedFile('new.svg', b'<svg>new</svg>')
+        with CaptureQueriesContext(connection) as queries:
+            cat.save()
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "core_category"') for query in queries), 1)
+        self.assertEqual(cat.picture.name, f'categories/pictures/{cat.id}.svg')
+        with cat.picture.open('rb') as file:
+            self.assertEqual(file.read(), b'<svg>new</svg>')
+
     def test_favourite_cards(self):
         # Create a temp user
         User = get_user_model()
@@ -99,3 +184,1198 @@ class CoreTests(TestCase):
         self.assertEqual(favourite.card, card)
         self.assertNotEqual(favourite.data_added, None)
 
+
+class FavouritesMixin:
+    """
+        Mixin for the tests with the subcategory of 25 cards,
+        every second card is user's favourite.
+    """
+
+    def setUp(self):
+        clear_caches()
+        User = get_user_model()
+        self.user = User.objects.create_user(email='normal@user.com', password='foo')
+        self.subcat = SubCategory.objects.create(name='Test subcategory')
+        self.cards = []
+        for i in range(25):
+            card = Card.objects.create(content=f'Card {i}', type=TypesOfCard.WORD)
+            card.subCategoryId.add(self.subcat)
+            self.cards.append(card)
+        # Every second card is user's favourite
+        for card in self.cards[::2]:
+            Favourite.objects.create(card=card, owner=self.user)
+
+
+class FavouritesMarkingTests(FavouritesMixin, TestCase):
+    """
+        Tests for marking the cards of the page as user's favourites.
+    """
+
+    def test_only_page_is_marked(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('core:card-list', args=[self.subcat.id]))
+        self.assertEqual(response.status_code, 200)
+        page_cards = response.context['cards']
+        self.assertEqual(len(page_cards), 10)
+
+        favourite_ids = {card.id for card in self.cards[::2]}
+        for card in page_cards:
+            self.assertEqual(card.favourite, card.id in favourite_ids)
+
+    def test_anonymous_user(self):
+        response = self.client.get(reverse('core:card-list', args=[self.subcat.id]), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cards']), 10)
+        self.assertFalse(any(getattr(card, 'favourite', False) for card in response.context['cards']))
+
+    def test_search_marks_favourites(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('core:search'), {'q': 'Card 1'})
+        self.assertEqual(response.status_code, 200)
+        favourite_ids = {card.id for card in self.cards[::2]}
+        for card in response.context['found_blocks'][0].object_list:
+            self.assertEqual(card.favourite, card.id in favourite_ids)
+
+
+class PaginationTests(FavouritesMixin, TestCase):
+    """
+        Tests for the cursor pagination of the cards and the pages of the search blocks.
+    """
+
+    def _walk_cursor_pages(self, url, params=None):
+        """ Function to go through all pages of the cursor pagination """
+        params = dict(params or {})
+        pages = []
+
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page_obj']
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            params['cursor'] = page.next_cursor
+
+    def test_cursor_pagination(self):
+        url = reverse('core:card-list', args=[self.subcat.id])
+        pages = self._walk_cursor_pages(url)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([card.id for page in pages for card in page],
+                         sorted((card.id for card in self.cards), reverse=True))
+
+        # Back to the previous page
+        response = self.client.get(url, {'cursor': pages[2].previous_cursor})
+        self.assertEqual(list(response.context['cards']), list(pages[1]))
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+        # Cursor pagination with sorting by the type of the cards
+        self.cards[3].type = TypesOfCard.DIALOGUE
+        self.cards[3].save()
+        pages = self._walk_cursor_pages(url, {'sort': TypesOfCard.DIALOGUE})
+        self.assertEqual(pages[0][0], self.cards[3])
+        self.assertEqual(len({card.id for page in pages for card in page}), 25)
+
+        self.assertEqual(self.client.get(url, {'cursor': 'invalid'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'cursor': 'WyJhIl0'}).status_code, 404)
+
+    def test_favourites_cursor_pagination(self):
+        self.client.force_login(self.user)
+        pages = self._walk_cursor_pages(reverse('core:favourite'))
+        # The last added favourites go first
+        self.assertEqual([card.id for page in pages for card in page],
+                         [card.id for card in self.cards[::2]][::-1])
+
+    def test_favourites_sorted_by_type(self):
+        self.client.force_login(self.user)
+        dialogue = self.cards[4]
+        dialogue.type = TypesOfCard.DIALOGUE
+        dialogue.save()
+
+        response = self.client.get(reverse('core:favourite'), {'sort': TypesOfCard.DIALOGUE})
+        cards = list(response.context['cards'])
+        self.assertEqual(cards[0], dialogue)
+        # Remaining cards are sorted by the date of adding
+        self.assertEqual(cards[1:], [card for card in self.cards[::2][::-1] if card != dialogue][:9])
+
+    def test_search_blocks_are_paginated(self):
+        response = self.client.get(reverse('core:search'), {'q': 'Card'})
+        self.assertEqual(response.status_code, 200)
+        block = response.context['found_blocks'][0]
+        self.assertEqual(len(block.object_list), 10)
+        self.assertTrue(block.has_next)
+        self.assertEqual(block.count_display, '25')
+
+        # The last page of the block only
+        response = self.client.get(reverse('core:search'), {'q': 'Card', 'block': 'CR', 'page_cr': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'core/_search_block.html')
+        self.assertEqual(len(response.context['block'].object_list), 5)
+        self.assertFalse(response.context['block'].has_next)
+
+        # The page after the last one is empty, the block is still found
+        response = self.client.get(reverse('core:search'), {'q': 'Card', 'block': 'CR', 'page_cr': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['block'].object_list, [])
+        self.assertFalse(response.context['block'].has_next)
+        response = self.client.get(reverse('core:search'), {'q': 'Card', 'page_cr': 4})
+        self.assertEqual([block.code for block in response.context['found_blocks']], ['CR'])
+        self.assertEqual(response.context['found_blocks'][0].object_list, [])
+        self.assertTemplateUsed(response, 'core/_search_block.html')
+
+        # The page which offset doesn't fit into the database can't exist
+        for params in ({'block': 'CR'}, {}):
+            response = self.client.get(reverse('core:search'),
+                                       dict(params, q='Card', page_cr=100000000000000000000))
+            self.assertEqual(response.status_code, 404)
+
+    def test_search_queries(self):
+        # One query per block, the blocks are not evaluated twice
+        # (the time of the last change of the catalogue is kept by the process)
+        get_catalogue_modified()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('core:search'), {'q': 'Card 2'})
+        self.assertEqual([block.code for block in response.context['found_blocks']], ['CR'])
+        self.assertEqual([option[0] for option in response.context['q_notfound']], ['CT', 'SB'])
+
+        # The block with more results than one page needs the bounded count
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('core:search'), {'q': 'Card'})
+        self.assertEqual(len(queries), 4)
+        # Only one page(plus one row) of each block is fetched
+        self.assertIn('LIMIT 11', queries[2]['sql'])
+        self.assertIn('LIMIT 101', queries[3]['sql'])
+
+        # Session, user, three blocks and favourites of the user from the shared cache
+        self.client.force_login(self.user)
+        self.client.get(reverse('core:search'), {'q': 'Card 2'})
+        with self.assertNumQueries(6):
+            self.client.get(reverse('core:search'), {'q': 'Card 2'})
+
+
+class FavouritesCacheTests(FavouritesMixin, TestCase):
+    """
+        Tests for the cache of the ids of user's favourite cards.
+    """
+
+    def test_favourite_ids_are_cached(self):
+        favourite_ids = {card.id for card in self.cards[::2]}
+        self.assertEqual(set(get_favourite_ids(self.user)), favourite_ids)
+        # Only the entry of the shared cache is read
+        with self.assertNumQueries(1):
+            self.assertEqual(set(get_favourite_ids(self.user)), favourite_ids)
+
+    def test_cache_is_invalidated_by_control_view(self):
+        self.client.force_login(self.user)
+        version = get_favourite_ids(self.user).version
+
+        card = self.cards[1]
+        response = self.client.post(reverse('core:favourite-add', args=[card.id]))
+        self.assertEqual(response.status_code, 200)
+        # The entry is removed, not patched, so the ids are loaded from the database
+        self.assertIsNone(cache.get(FAVOURITES_CACHE_KEY.format(self.user.pk)))
+        self.assertIn(card.id, get_favourite_ids(self.user))
+        self.assertNotEqual(get_favourite_ids(self.user).version, version)
+
+        response = self.client.delete(reverse('core:favourite-del', args=[card.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(card.id, get_favourite_ids(self.user))
+        self.assertEqual(set(get_favourite_ids(self.user)),
+                         set(Favourite.objects.filter(owner=self.user).values_list('card_id', flat=True)))
+
+
+class FavouritesControlTests(FavouritesMixin, TestCase):
+    """
+        Tests for adding and removing of the favourite cards one by one.
+    """
+
+    def test_add_and_remove_favourite_by_one_query(self):
+        card = self.cards[1]
+        with self.assertNumQueries(1):
+            self.assertTrue(Favourite.objects.add_card(self.user, card.id))
+        # The repeated adding and the adding of the unknown card change nothing
+        with self.assertNumQueries(1):
+            self.assertFalse(Favourite.objects.add_card(self.user, card.id))
+        self.assertFalse(Favourite.objects.add_card(self.user, self.cards[-1].id + 1))
+        self.assertEqual(Favourite.objects.filter(owner=self.user, card=card).count(), 1)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(Favourite.objects.remove_card(self.user, card.id))
+        with self.assertNumQueries(1):
+            self.assertFalse(Favourite.objects.remove_card(self.user, card.id))
+        self.assertFalse(Favourite.objects.filter(owner=self.user, card=card).exists())
+
+    def test_control_view_statuses(self):
+        self.client.force_login(self.user)
+        card = self.cards[1]
+        self.assertEqual(self.client.post(reverse('core:favourite-add', args=[card.id])).status_code, 200)
+        self.assertEqual(self.client.post(reverse('core:favourite-add', args=[card.id])).status_code, 409)
+        self.assertEqual(self.client.post(reverse('core:favourite-add', args=[9999])).status_code, 409)
+        self.assertEqual(self.client.delete(reverse('core:favourite-del', args=[card.id])).status_code, 200)
+        self.assertEqual(self.client.delete(reverse('core:favourite-del', args=[card.id])).status_code, 410)
+
+
+class FavouritesBatchTests(FavouritesMixin, TestCase):
+    """
+        Tests for the batch of the changes of the favourites from the offline clients.
+    """
+
+    def _post_batch(self, operations):
+        return self.client.post(reverse('core:favourite-batch'),
+                                json.dumps({'operations': operations}),
+                                content_type='application/json')
+
+    def test_favourites_batch(self):
+        self.client.force_login(self.user)
+        get_favourite_ids(self.user)
+        added, removed = self.cards[1], self.cards[0]
+
+        response = self._post_batch([
+            {'op': 'add', 'card_id': added.id},
+            {'op': 'add', 'card_id': removed.id},
+            {'op': 'remove', 'card_id': removed.id},
+            {'op': 'add', 'card_id': 9999},
+        ])
+        self.assertEqual(response.status_code, 200)
+
+        favourite_ids = set(Favourite.objects.filter(owner=self.user).values_list('card_id', flat=True))
+        self.assertIn(added.id, favourite_ids)
+        self.assertNotIn(removed.id, favourite_ids)
+        self.assertEqual(response.json()['missing'], [9999])
+        self.assertEqual(response.json()['count'], len(favourite_ids))
+        self.assertEqual(set(get_favourite_ids(self.user)), favourite_ids)
+
+        response = self.client.get(reverse('core:favourite-batch'))
+        self.assertEqual(set(response.json()['ids']), favourite_ids)
+        self.assertEqual(response.json()['version'], self._post_batch([]).json()['version'])
+
+    def test_favourites_batch_offline_replay(self):
+        self.client.force_login(self.user)
+        card = self.cards[0]
+        Favourite.objects.filter(owner=self.user, card=card).update(data_added=now())
+
+        # The removal made offline before the card was added again is ignored
+        earlier = (now() - timedelta(hours=1)).isoformat()
+        self.assertEqual(self._post_batch([{'op': 'remove', 'card_id': card.id, 'ts': earlier}]).status_code, 200)
+        self.assertTrue(Favourite.objects.filter(owner=self.user, card=card).exists())
+
+        # The later operation wins regardless of the order in the list
+        later = (now() + timedelta(hours=1)).isoformat()
+        self._post_batch([{'op': 'remove', 'card_id': card.id, 'ts': later},
+                          {'op': 'add', 'card_id': card.id, 'ts': earlier}])
+        self.assertFalse(Favourite.objects.filter(owner=self.user, card=card).exists())
+
+    def test_favourites_batch_errors(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self._post_batch([{'op': 'toggle', 'card_id': 1}]).status_code, 400)
+        self.assertEqual(self._post_batch([{'op': 'add', 'card_id': 1, 'ts': 'yesterday'}]).status_code, 400)
+        self.assertEqual(self._post_batch([{'op': 'add', 'card_id': 1}] * 201).status_code, 400)
+        # The id beyond the range of the column
+        self.assertEqual(self._post_batch([{'op': 'add', 'card_id': 99999999999999999999999}]).status_code, 400)
+        url = reverse('core:favourite-add', args=[99999999999999999999999])
+        self.assertEqual(self.client.post(url).status_code, 409)
+
+        self.client.logout()
+        self.assertEqual(self._post_batch([]).status_code, 401)
+
+
+class SearchTests(TestCase):
+    """
+        Tests for the search among cards, categories and subcategories.
+    """
+
+    def setUp(self):
+        self.word = Card.objects.create(content='<b>Привет</b>', type=TypesOfCard.WORD,
+                                        translit_of_pronunciation='Privet')
+        self.sentence = Card.objects.create(content='Как дела?', type=TypesOfCard.SENTENCE,
+                                            translit_of_pronunciation='Kak dela')
+        self.category = Category.objects.create(name='Greetings')
+
+    def test_search_cards(self):
+        self.assertEqual(list(search_cards(Card.objects.all(), 'Привет')), [self.word])
+        self.assertEqual(list(search_cards(Card.objects.all(), 'dela')), [self.sentence])
+        self.assertEqual(list(search_cards(Card.objects.all(), 'nothing')), [])
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('<b>Привет</b>,\n  мир!'), 'privet, mir!')
+        self.assertEqual(normalize_text('Ёлка'), normalize_text('елка'))
+        self.assertEqual(normalize_text('Хорошо'), normalize_text('kharasho'.replace('a', 'o')))
+        self.assertEqual(normalize_text('&amp;'), '&')
+
+    def test_search_is_normalized(self):
+        self.assertEqual(self.word.search_text, 'privet\nprivet')
+        self.assertEqual(list(search_cards(Card.objects.all(), 'привет')), [self.word])
+        self.assertEqual(list(search_cards(Card.objects.all(), 'PRIV')), [self.word])
+        self.assertEqual(list(search_cards(Card.objects.all(), 'как   дела')), [self.sentence])
+        # The query can't match on the border of the content and the translit
+        self.assertEqual(list(search_cards(Card.objects.all(), 'dela kak')), [])
+
+    def test_search_by_name(self):
+        self.assertEqual(list(search_by_name(Category.objects.all(), 'greet')), [self.category])
+
+    def test_search_index(self):
+        clear_caches()
+        index = CardSearchIndex()
+        self.assertEqual(index.search('привет'), [self.word.id])
+        self.assertEqual(index.search('b>'), [])  # html is stripped
+        self.assertEqual(index.search('e'), [self.sentence.id, self.word.id])
+
+        # Incremental update of the index
+        self.word.content = 'Здравствуйте'
+        self.word.translit_of_pronunciation = 'Zdravstvuyte'
+        self.word.save()
+        index.update(self.word)
+        self.assertEqual(index.search('привет'), [])
+        self.assertEqual(index.search('здрав'), [self.word.id])
+        index.remove(self.sentence.id)
+        self.assertEqual(index.search('dela'), [])
+
+        # Another process changes the cards at the same time, so the index is rebuilt instead of the patching
+        cache.incr(SEARCH_INDEX_GENERATION_CACHE_KEY)
+        index.update(self.word)
+        with self.assertNumQueries(1):
+            self.assertEqual(index.search('dela'), [self.sentence.id])
+
+    def test_generation_is_unique(self):
+        clear_caches()
+        generation = get_generation(SEARCH_INDEX_GENERATION_CACHE_KEY)
+        # Another process got the next value by the increment which is not atomic
+        cache.add(GENERATION_CLAIM_CACHE_KEY.format(SEARCH_INDEX_GENERATION_CACHE_KEY, generation + 1), True)
+        self.assertEqual(increment_generation(SEARCH_INDEX_GENERATION_CACHE_KEY, unique=True), generation + 2)
+
+    @override_settings(CORE_SEARCH_INDEX_ENABLED=True)
+    def test_search_cards_by_index(self):
+        clear_caches()
+        card = Card.objects.create(content='Пока', translit_of_pronunciation='Poka')
+        self.assertEqual(list(search_cards(Card.objects.all(), 'пока')), [card])
+        card.delete()
+        self.assertEqual(list(search_cards(Card.objects.all(), 'пока')), [])
+
+    def test_suggestions(self):
+        clear_caches()
+        SubCategory.objects.create(name='Greetings at the university')
+
+        response = self.client.get(reverse('core:search-suggest'), {'q': 'gre'})
+        self.assertEqual(response.status_code, 200)
+        labels = [suggestion['label'] for suggestion in response.json()['suggestions']]
+        self.assertEqual(labels, ['Greetings', 'Greetings at the university'])
+
+        # Prefix of the word in the middle, in another script
+        suggestions = self.client.get(reverse('core:search-suggest'), {'q': 'дел'}).json()['suggestions']
+        self.assertEqual([(s['type'], s['id']) for s in suggestions], [('card', self.sentence.id)])
+
+        # Suggestions are rebuilt after the changes of the models
+        self.category.delete()
+        suggestions = self.client.get(reverse('core:search-suggest'), {'q': 'gre', 'limit': 1}).json()['suggestions']
+        self.assertEqual([s['label'] for s in suggestions], ['Greetings at the university'])
+
+    def test_suggestion_of_long_card_finds_it(self):
+        clear_caches()
+        card = Card.objects.create(content='Здравствуйте, меня зовут Иван, я учусь на первом курсе университета')
+        self.assertGreater(len(card.content), MAX_LABEL_LENGTH)
+
+        suggestion, = self.client.get(reverse('core:search-suggest'), {'q': 'иван'}).json()['suggestions']
+        self.assertTrue(suggestion['label'].endswith('…'))
+        response = self.client.get(suggestion['url'])
+        block, = [block for block in response.context['found_blocks'] if block.code == 'CR']
+        self.assertIn(card, block.object_list)
+
+
+@override_settings(CORE_SEARCH_INDEX_ENABLED=True)
+class SearchIndexCommitTests(TransactionTestCase):
+    """
+        Tests for the changes of the in-memory search index on the commits of the cards.
+    """
+
+    def setUp(self):
+        clear_caches()
+
+    def test_index_follows_commits(self):
+        self.assertEqual(card_search_index.search('poka'), [])
+        card = Card.objects.create(content='Poka')
+        card_id = card.id
+        self.assertEqual(card_search_index.search('poka'), [card_id])
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                Card.objects.create(content='Spasibo')
+                card.delete()
+                # The changes reach the index only after the commit
+                self.assertEqual(card_search_index.search('spasibo'), [])
+                raise DatabaseError
+        # No ghosts of the rolled back changes
+        self.assertEqual(card_search_index.search('spasibo'), [])
+        self.assertEqual(card_search_index.search('poka'), [card_id])
+
+
+class TaxonomyTests(TestCase):
+    """
+        Tests for the snapshot of categories and subcategories.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.category = Category.objects.create(name='Food')
+        self.subcats = [SubCategory.objects.create(name=f'Subcategory {i}') for i in range(3)]
+        self.category.subcategory_set.add(*self.subcats[:2])
+
+    def test_snapshot(self):
+        snapshot = taxonomy.snapshot()
+        self.assertEqual(snapshot.get_category(self.category.id).name, 'Food')
+        self.assertEqual([item.id for item in snapshot.subcategories_of(self.category.id)],
+                         [subcat.id for subcat in self.subcats[:2]])
+        self.assertIsNone(snapshot.get_category(self.category.id + 1))
+
+    def test_browsing_without_queries(self):
+        # The snapshot and the time of the last change are kept by the process
+        taxonomy.snapshot()
+        get_catalogue_modified()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('core:category-list'))
+            self.assertEqual([item.id for item in response.context['categories']], [self.category.id])
+
+            response = self.client.get(reverse('core:subcategory-list', args=[self.category.id]),
+                                       {'q': 'subcategory 1'})
+            self.assertEqual([item.id for item in response.context['subcategories']], [self.subcats[1].id])
+            self.assertEqual(response.context['categoryName'], 'Food')
+
+            response = self.client.get(reverse('core:subcategory-list', args=[self.category.id + 1]))
+            self.assertEqual(response.status_code, 404)
+
+    def test_snapshot_is_invalidated(self):
+        taxonomy.snapshot()
+        self.subcats[2].categoryId.add(self.category)
+        self.assertEqual(len(taxonomy.snapshot().subcategories_of(self.category.id)), 3)
+
+        self.subcats[0].name = 'Renamed'
+        self.subcats[0].save()
+        self.assertEqual(taxonomy.snapshot().get_subcategory(self.subcats[0].id).name, 'Renamed')
+
+        cat_id = self.category.id
+        self.category.delete()
+        self.assertIsNone(taxonomy.snapshot().get_category(cat_id))
+
+    def test_snapshot_is_shared_by_processes(self):
+        # Another worker has its own snapshot and its own connection to the cache
+        worker, worker_cache = Taxonomy(), DatabaseCache('core_cache', {})
+        self.assertEqual(worker.snapshot().get_subcategory(self.subcats[0].id).name, 'Subcategory 0')
+
+        self.subcats[0].name = 'Renamed'
+        self.subcats[0].save()
+
+        self.assertEqual(worker_cache.get(TAXONOMY_GENERATION_CACHE_KEY), get_generation(TAXONOMY_GENERATION_CACHE_KEY))
+        # The worker reads the generation again after CORE_GENERATION_CHECK_INTERVAL
+        caches[LOCAL_CACHE_ALIAS].clear()
+        self.assertEqual(worker.snapshot().get_subcategory(self.subcats[0].id).name, 'Renamed')
+
+    def test_generation_is_kept_by_process(self):
+        generation = get_generation(TAXONOMY_GENERATION_CACHE_KEY)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_generation(TAXONOMY_GENERATION_CACHE_KEY), generation)
+
+        # The change made by another process is seen after the interval
+        cache.incr(TAXONOMY_GENERATION_CACHE_KEY)
+        self.assertEqual(get_generation(TAXONOMY_GENERATION_CACHE_KEY), generation)
+        caches[LOCAL_CACHE_ALIAS].clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_generation(TAXONOMY_GENERATION_CACHE_KEY), generation + 1)
+
+
+class PageCacheTests(TestCase):
+    """
+        Tests for the cached pages and fragments of the catalogue.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.subcat = SubCategory.objects.create(name='Greetings')
+        self.card = Card.objects.create(content='Privet', type=TypesOfCard.WORD)
+        self.card.subCategoryId.add(self.subcat)
+        self.url = reverse('core:card-list', args=[self.subcat.id])
+
+    def test_anonymous_page_is_cached(self):
+        response = self.client.get(self.url, {'q': 'priv'})
+        self.assertContains(response, 'Privet')
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url, {'q': ' priv ', 'utm_source': 'mail'})
+        self.assertEqual(cached.content, response.content)
+
+        # The other parameters are the other page
+        self.assertNotContains(self.client.get(self.url, {'q': 'nothing'}), 'Privet')
+
+    def test_cached_page_is_outdated_by_changes(self):
+        self.client.get(self.url)
+        self.card.content = 'Zdravstvuyte'
+        self.card.save()
+        self.assertContains(self.client.get(self.url), 'Zdravstvuyte')
+
+        new_card = Card.objects.create(content='Poka', type=TypesOfCard.WORD)
+        new_card.subCategoryId.add(self.subcat)
+        self.assertContains(self.client.get(self.url), 'Poka')
+
+    def test_card_fragments_for_user(self):
+        User = get_user_model()
+        user = User.objects.create_user(email='normal@user.com', password='foo')
+        self.client.force_login(user)
+
+        self.assertContains(self.client.get(self.url), reverse('core:favourite-add', args=[self.card.id]))
+        Favourite.objects.add_card(user, self.card.id)
+        reload_favourite_ids(user)
+        # The favourite state is not taken from the cached fragment
+        self.assertContains(self.client.get(self.url), reverse('core:favourite-del', args=[self.card.id]))
+
+        self.card.content = 'Zdravstvuyte'
+        self.card.save()
+        self.assertContains(self.client.get(self.url), 'Zdravstvuyte')
+
+
+class ListQueriesTests(TestCase):
+    """
+        Tests for the number of queries of the pages with the lists.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.category = Category.objects.create(name='Food')
+        self.subcat = SubCategory.objects.create(name='Fruits')
+        self.subcat.categoryId.add(self.category)
+        self.empty_subcat = SubCategory.objects.create(name='Vegetables')
+        for i in range(15):
+            card = Card.objects.create(content=f'Card {i}', type=TypesOfCard.WORD)
+            card.subCategoryId.add(self.subcat)
+        User = get_user_model()
+        self.user = User.objects.create_user(email='normal@user.com', password='foo')
+
+    def test_empty_subcategory(self):
+        response = self.client.get(reverse('core:card-list', args=[self.empty_subcat.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['subCategoryName'], 'Vegetables')
+
+        response = self.client.get(reverse('core:card-list', args=[self.empty_subcat.id + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_card_list_queries(self):
+        self.client.force_login(self.user)
+        url = reverse('core:card-list', args=[self.subcat.id])
+        self.client.get(url)
+
+        # The session, the user, the favourites from the shared cache
+        # and the page of the cards, the subcategory is taken from the taxonomy
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'sort': TypesOfCard.WORD, 'q': 'card'})
+        self.assertEqual(len(response.context['cards']), 10)
+        self.assertEqual(response.context['subCategoryName'], 'Fruits')
+
+    def test_parent_lookup_is_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            class BrokenListView(ParentObjectMixin, ListView):
+                parent_url_kwarg = 'cat_id'
+        with self.assertRaises(ImproperlyConfigured):
+            class MisspelledListView(ParentObjectMixin, ListView):
+                parent_url_kwarg = 'cat_id'
+                parent_lookup = 'get_categories'
+
+
+class ConditionalGetTests(TestCase):
+    """
+        Tests for ETag / Last-Modified of the pages of the catalogue.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.subcat = SubCategory.objects.create(name='Greetings')
+        self.card = Card.objects.create(content='Privet', type=TypesOfCard.WORD)
+        self.card.subCategoryId.add(self.subcat)
+        self.url = reverse('core:card-list', args=[self.subcat.id])
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.card.content = 'Zdravstvuyte'
+        self.card.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_favourites_change_etag(self):
+        User = get_user_model()
+        user = User.objects.create_user(email='normal@user.com', password='foo')
+        self.client.force_login(user)
+        search_url = reverse('core:search')
+
+        etag = self.client.get(search_url, {'q': 'privet'})['ETag']
+        self.assertEqual(self.client.get(search_url, {'q': 'privet'},
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(reverse('core:favourite-add', args=[self.card.id]))
+        self.assertEqual(self.client.get(search_url, {'q': 'privet'},
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ApiTests(TestCase):
+    """
+        Tests for JSON API of the catalogue.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.category = Category.objects.create(name='Food')
+        self.subcat = SubCategory.objects.create(name='Fruits')
+        self.subcat.categoryId.add(self.category)
+        self.cards = []
+        for i in range(5):
+            card = Card.objects.create(content=f'Card {i}', translit_of_pronunciation=f'Translit {i}',
+                                       type=TypesOfCard.WORD if i % 2 else TypesOfCard.SENTENCE)
+            card.subCategoryId.add(self.subcat)
+            self.cards.append(card)
+        self.url = reverse('core:api-card-list', args=[self.subcat.id])
+
+    def test_taxonomy(self):
+        response = self.client.get(reverse('core:api-category-list'))
+        self.assertEqual(response.json()['results'], [{'id': self.category.id, 'name': 'Food', 'picture': None}])
+
+        response = self.client.get(reverse('core:api-subcategory-list', args=[self.category.id]),
+                                   {'fields': 'name'})
+        self.assertEqual(response.json()['results'], [{'name': 'Fruits'}])
+
+        response = self.client.get(reverse('core:api-subcategory-list', args=[self.category.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cards_pagination(self):
+        ids = []
+        cursor = None
+        while True:
+            params = {'limit': 2, 'fields': 'id'}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(self.url, params).json()
+            ids.extend(item['id'] for item in data['results'])
+            cursor = data['next']
+            if not cursor:
+                break
+
+        self.assertEqual(ids, [card.id for card in reversed(self.cards)])
+
+    def test_cards_fields_and_sorting(self):
+        User = get_user_model()
+        user = User.objects.create_user(email='normal@user.com', password='foo')
+        Favourite.objects.add_card(user, self.cards[0].id)
+        self.client.force_login(user)
+
+        data = self.client.get(self.url, {'sort': TypesOfCard.SENTENCE, 'fields': 'content,favourite,translit'}).json()
+        self.assertEqual(data['results'][0], {'content': 'Card 4', 'favourite': False, 'translit': 'Translit 4'})
+        self.assertEqual([item['content'] for item in data['results']],
+                         ['Card 4', 'Card 2', 'Card 0', 'Card 3', 'Card 1'])
+        self.assertTrue(data['results'][2]['favourite'])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(self.url, {'fields': 'secret'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'limit': '1000'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'broken'}).status_code, 400)
+
+    def test_queryset_is_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            class BrokenApiView(CatalogueApiView):
+                model = Card
+
+
+class BundleTests(TestCase):
+    """
+        Tests for the bundles of the catalogue for the offline clients.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.category = Category.objects.create(name='Food')
+        self.subcat = SubCategory.objects.create(name='Fruits')
+        self.subcat.categoryId.add(self.category)
+        self.card = Card.objects.create(content='Yabloko', type=TypesOfCard.WORD)
+        self.card.subCategoryId.add(self.subcat)
+
+    def _get_bundle(self, **params):
+        response = self.client.get(reverse('core:api-bundle'), params)
+        self.assertEqual(response.status_code, 200)
+        lines = gzip.decompress(response.content).decode().splitlines()
+        return [json.loads(line) for line in lines]
+
+    def test_full_bundle(self):
+        header, *items = self._get_bundle()
+        self.assertEqual(header['type'], 'header')
+        self.assertEqual([(item['type'], item['id']) for item in items],
+                         [('category', self.category.id), ('subcategory', self.subcat.id), ('card', self.card.id)])
+        self.assertEqual(items[1]['categories'], [self.category.id])
+        self.assertEqual(items[2]['subcategories'], [self.subcat.id])
+
+    def test_delta_bundle(self):
+        version = self._get_bundle()[0]['version']
+        header, *items = self._get_bundle(since=version)
+        self.assertEqual(header['version'], version)
+        self.assertEqual(items, [])
+
+        new_card = Card.objects.create(content='Grusha', type=TypesOfCard.WORD)
+        new_card.subCategoryId.add(self.subcat)
+        card_id = self.card.id
+        self.card.delete()
+        # The links are the part of the subcategory
+        self.category.subcategory_set.clear()
+
+        header, *items = self._get_bundle(since=version)
+        self.assertGreater(header['version'], version)
+        self.assertEqual([(item['type'], item.get('model'), item['id']) for item in items],
+                         [('subcategory', None, self.subcat.id),
+                          ('card', None, new_card.id),
+                          ('deleted', 'card', card_id)])
+        self.assertEqual(items[0]['categories'], [])
+
+    def test_wrong_since(self):
+        self.assertEqual(self.client.get(reverse('core:api-bundle'), {'since': 'yesterday'}).status_code, 400)
+
+    def test_bundle_is_cached(self):
+        content = self.client.get(reverse('core:api-bundle')).content
+        # The version for ETag, the version of the cached bundle and the bundle from the cache
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(reverse('core:api-bundle')).content, content)
+
+        Card.objects.create(content='Grusha', type=TypesOfCard.WORD)
+        self.assertNotEqual(self.client.get(reverse('core:api-bundle')).content, content)
+
+    def test_changes_table_is_locked(self):
+        # The ids of the changes are taken under the lock of the table till the commit
+        with mock.patch('core.bundle.lock_table') as lock_table:
+            record_changes(Card, [self.card.id])
+        lock_table.assert_called_once_with(CatalogueChange)
+        self.assertTrue(CatalogueChange.objects.filter(model='card', object_id=self.card.id).exists())
+
+    def test_pruned_changes(self):
+        version = self._get_bundle()[0]['version']
+        CatalogueChange.objects.update(changed_at=now() - timedelta(days=100))
+        # The log is pruned by the first change of the next day
+        cache.delete(PRUNE_CACHE_KEY)
+
+        new_card = Card.objects.create(content='Grusha', type=TypesOfCard.WORD)
+        self.assertEqual(CatalogueChange.objects.filter(id__lte=version).count(), 0)
+
+        # The changes after the version are lost, so the full bundle is returned
+        header, *items = self._get_bundle(since=version - 1)
+        self.assertIsNone(header['since'])
+        self.assertEqual(len(items), 4)
+
+        header, *items = self._get_bundle(since=version)
+        self.assertEqual(header['since'], version)
+        self.assertEqual([(item['type'], item['id']) for item in items], [('card', new_card.id)])
+
+
+@override_settings(MEDIA_ROOT=tempfile.TemporaryDirectory(prefix='mediatest').name)
+class ImportCatalogueTests(TestCase):
+    """
+        Tests for the bulk import of the cards.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.subcats = [SubCategory.objects.create(name=name) for name in ('Fruits', 'Food')]
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, 'apple.mp3'), 'wb') as file:
+            file.write(b'mp3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_bulk_insert(self):
+        last = Card.objects.create(content='Last')
+        cards = [Card(content='First'), Card(content='Second')]
+        self.assertEqual(bulk_insert(Card, cards), [last.id + 1, last.id + 2])
+        self.assertEqual(Card.objects.get(pk=cards[1].pk).content, 'Second')
+
+    def _write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def test_import_jsonl(self):
+        rows = [{'content': f'Card {i}', 'subcategories': ['Fruits']} for i in range(5)]
+        rows.append({'content': 'Яблоко', 'type': 'S', 'translit': 'Yabloko',
+                     'pronunciation': 'apple.mp3', 'subcategories': ['Fruits', 'Food']})
+        path = self._write('cards.jsonl', '\n'.join(json.dumps(row) for row in rows))
+
+        call_command('import_catalogue', path, media_dir=self.directory.name, chunk_size=4, stdout=StringIO())
+
+        self.assertEqual(Card.objects.filter(subCategoryId=self.subcats[0]).count(), 6)
+        card = Card.objects.get(content='Яблоко')
+        self.assertEqual(card.type, TypesOfCard.SENTENCE)
+        self.assertEqual(card.search_text, normalize_text('Яблоко') + '\n' + 'yabloko')
+        self.assertEqual(set(card.subCategoryId.values_list('id', flat=True)), {self.subcats[0].id, self.subcats[1].id})
+        self.assertEqual(card.pronunciation.name, f'cards/sounds/{card.id}.mp3')
+        self.assertTrue(card.pronunciation.storage.exists(card.pronunciation.name))
+        self.assertEqual(list(search_cards(Card.objects.all(), 'yablok')), [card])
+
+    def test_import_csv_with_invalid_rows(self):
+        path = self._write('cards.csv', 'content,type,subcategories\n'
+                                        'Privet,W,Fruits|Food\n'
+                                        'Poka,X,Fruits\n'
+                                        'Spasibo,W,Unknown\n')
+        with self.assertRaises(CommandError):
+            call_command('import_catalogue', path, stdout=StringIO())
+        self.assertFalse(Card.objects.exists())
+
+        call_command('import_catalogue', path, skip_invalid=True,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(list(Card.objects.values_list('content', flat=True)), ['Privet'])
+
+    def test_imported_chunks_are_announced_on_error(self):
+        path = self._write('cards.csv', 'content,type,subcategories\n'
+                                        'Privet,W,Fruits\n'
+                                        'Poka,X,Fruits\n')
+        generation = get_catalogue_generation()
+        with self.assertRaises(CommandError):
+            call_command('import_catalogue', path, chunk_size=1, stdout=StringIO())
+
+        # The first chunk is committed, so the caches must not show the old catalogue
+        self.assertEqual(list(Card.objects.values_list('content', flat=True)), ['Privet'])
+        self.assertNotEqual(get_catalogue_generation(), generation)
+
+    def test_media_is_removed_on_rollback(self):
+        path = self._write('cards.jsonl', json.dumps({'content': 'Яблоко', 'pronunciation': 'apple.mp3',
+                                                      'subcategories': ['Fruits']}))
+        storage = Card._meta.get_field('pronunciation').storage
+        with mock.patch('core.management.commands.import_catalogue.record_changes', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                call_command('import_catalogue', path, media_dir=self.directory.name, stdout=StringIO())
+
+        self.assertFalse(Card.objects.exists())
+        self.assertFalse(storage.exists('cards/sounds/1.mp3'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.TemporaryDirectory(prefix='mediatest').name)
+class BenchmarkTests(TestCase):
+    """
+        Tests for the generator of the synthetic catalogue and the benchmark.
+    """
+
+    def setUp(self):
+        clear_caches()
+
+    def test_generate_catalogue(self):
+        call_command('generate_catalogue', categories=3, subcategories=6, cards=50, users=4,
+                     favourites=5, overlap=0.5, seed=1, stdout=StringIO())
+
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(SubCategory.objects.count(), 6)
+        self.assertEqual(Card.objects.count(), 50)
+        self.assertEqual(get_user_model().objects.count(), 4)
+        self.assertLessEqual(Favourite.objects.count(), 20)
+
+        # Each object has at least one parent, some of them have more
+        Link = Card.subCategoryId.through
+        self.assertEqual(Link.objects.values('card_id').distinct().count(), 50)
+        self.assertGreater(Link.objects.count(), 50)
+        self.assertEqual(SubCategory.categoryId.through.objects.values('subcategory_id').distinct().count(), 6)
+
+        card = Card.objects.exclude(translit_of_pronunciation=None).first()
+        self.assertEqual(list(search_cards(Card.objects.all(), card.translit_of_pronunciation)[:1]), [card])
+        self.assertTrue(get_user_model().objects.first().check_password('benchmark'))
+        self.assertEqual(len(taxonomy.snapshot().categories()), 3)
+
+    def test_benchmark(self):
+        call_command('generate_catalogue', categories=2, subcategories=3, cards=30, users=2, seed=1,
+                     stdout=StringIO())
+        users = get_user_model().objects.count()
+        output = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+
+        cache.set('core:app-key', 1)
+        call_command('benchmark', requests=2, warmup=0, cold=True, output=output, stdout=StringIO())
+        # The benchmark has its own keys in the cache, the keys of the app are not removed
+        self.assertEqual(cache.get('core:app-key'), 1)
+
+        with open(output) as file:
+            report = json.load(file)
+        self.assertEqual(report['objects']['cards'], 30)
+        self.assertTrue({'card-list', 'favourite-batch', 'sign-up(post)'} <= set(report['results']))
+        for name, result in report['results'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+        # The changes of the benchmark are rolled back
+        self.assertEqual(get_user_model().objects.count(), users)
+
+        out = StringIO()
+        call_command('benchmark', requests=1, warmup=0, only='api', baseline=output, stdout=out)
+        self.assertIn('api-card-list', out.getvalue())
+        self.assertNotIn('sign-in', out.getvalue())
+
+
+class SingleThreadedLiveServerThread(LiveServerThread):
+    """ Live server which handles the requests one by one """
+
+    def _create_server(self):
+        return WSGIServer((self.host, self.port), QuietWSGIRequestHandler, allow_reuse_address=False)
+
+
+@override_settings(MEDIA_ROOT=tempfile.TemporaryDirectory(prefix='mediatest').name)
+class LoadTestTests(LiveServerTestCase):
+    """
+        Tests for the load generator against the live server.
+    """
+    # The threads of the server share one connection to the in-memory SQLite database
+    server_thread_class = SingleThreadedLiveServerThread
+
+    def setUp(self):
+        clear_caches()
+        call_command('generate_catalogue', categories=2, subcategories=3, cards=20, users=2, seed=1,
+                     stdout=StringIO())
+
+    def test_journeys(self):
+        output = os.path.join(tempfile.mkdtemp(), 'load.json')
+        call_command('load_test', self.live_server_url, learners=2, duration=1, think_time=0, seed=1,
+                     output=output, stdout=StringIO())
+
+        with open(output) as file:
+            endpoints = json.load(file)['endpoints']
+        self.assertGreater(endpoints['total']['requests'], 0)
+        self.assertEqual(endpoints['total']['error_rate'], 0, endpoints)
+        self.assertIn('GET core:card-list', endpoints)
+
+    def test_replay(self):
+        card = Card.objects.create(content='Privet')
+        lines = [
+            {'method': 'GET', 'path': reverse('core:category-list'), 'status': 200},
+            {'path': reverse('core:search') + '?q=ma'},
+            {'method': 'POST', 'path': reverse('core:favourite-add', args=[card.id])},
+            {'request_id': 'user-001', 'title': 'Not a request'},
+        ]
+        path = os.path.join(tempfile.mkdtemp(), 'log.jsonl')
+        with open(path, 'w') as file:
+            file.write('\n'.join(json.dumps(line) for line in lines) + '\nbroken line\n')
+
+        output = os.path.join(tempfile.mkdtemp(), 'load.json')
+        err = StringIO()
+        call_command('load_test', self.live_server_url, learners=2, think_time=0, replay=path,
+                     output=output, stdout=StringIO(), stderr=err)
+
+        with open(output) as file:
+            endpoints = json.load(file)['endpoints']
+        self.assertIn('2 lines of the log are skipped', err.getvalue())
+        self.assertEqual(endpoints['total']['requests'], 3)
+        self.assertEqual(endpoints['total']['error_rate'], 0, endpoints)
+        # The learners are signed in before the replay
+        self.assertTrue(Favourite.objects.filter(card=card).exists())
+
+
+class ProfilingTests(TestCase):
+    """
+        Tests for the profiling of the requests and its pages in the admin panel.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(CORE_QUERY_INSTRUMENTATION=True,
+                                          CORE_PROFILING_ENABLED=True, CORE_PROFILING_SAMPLE_RATE=0,
+                                          CORE_PROFILING_INTERVAL_MS=0.1, CORE_PROFILING_DIR=self.directory.name,
+                                          CORE_PROFILING_MAX_FILES=3)
+        self.settings.enable()
+        self.store = ProfileStore()
+
+        User = get_user_model()
+        self.staff = User.objects.create_user(email='staff@user.com', password='foo', is_staff=True)
+        self.user = User.objects.create_user(email='normal@user.com', password='foo')
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def test_profile_by_header(self):
+        # The sampler is not started for the others than the staff
+        with mock.patch('core.profiling.StackSampler') as sampler:
+            self.client.get(reverse('core:category-list'), HTTP_X_PROFILE='1')
+            self.client.force_login(self.user)
+            response = self.client.get(reverse('core:category-list'), HTTP_X_PROFILE='1')
+        sampler.assert_not_called()
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.store.ids(), [])
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('core:category-list'), HTTP_X_PROFILE='1')
+        profile = self.store.get(response['X-Profile-Id'])
+        self.assertEqual(profile['url_name'], 'core:category-list')
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(profile['samples'], sum(profile['stacks'].values()))
+        self.assertIsNotNone(profile['queries'])
+
+        with override_settings(CORE_PROFILING_ENABLED=False):
+            response = self.client.get(reverse('core:category-list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_secrets_are_not_stored(self):
+        self.client.force_login(self.staff)
+        path = reverse('user:password-reset-confirm', kwargs={'uidb64': 'MQ', 'token': 'secret-token'})
+        response = self.client.get(path + '?next=secret', HTTP_X_PROFILE='1')
+
+        profile = self.store.get(response['X-Profile-Id'])
+        self.assertEqual(profile['path'], '/users/reset/<uidb64>/<token>/')
+
+    def test_sampling_and_retention(self):
+        with override_settings(CORE_PROFILING_SAMPLE_RATE=1):
+            for _ in range(5):
+                response = self.client.get(reverse('core:main'))
+
+        # The id is not shown to the anonymous user, only the last profiles are kept
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(len(self.store.ids()), 3)
+        self.assertIsNone(self.store.get('../secret'))
+
+    def test_admin_pages(self):
+        profile_id = self.store.save({
+            'created': now(), 'method': 'GET', 'path': '/dashboard/category/', 'url_name': 'core:category-list',
+            'status': 200, 'duration_ms': 12.5, 'interval_ms': 5, 'samples': 4, 'queries': None,
+            'stacks': {'view;render [core/card_list.html];url_replace': 3, 'view;query': 1},
+        })
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('profile-list'))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('profile-list'))
+        self.assertContains(response, reverse('profile-detail', args=[profile_id]))
+
+        response = self.client.get(reverse('profile-detail', args=[profile_id]))
+        self.assertContains(response, 'render [core/card_list.html]')
+        self.assertEqual(response.context['top_functions'][0], ('url_replace', 3, 3))
+
+        response = self.client.get(reverse('profile-detail', args=[profile_id]), {'format': 'collapsed'})
+        self.assertEqual(response.content.decode(), 'view;query 1\nview;render [core/card_list.html];url_replace 3\n')
+        self.assertEqual(self.client.get(reverse('profile-detail', args=['1-deadbeef'])).status_code, 404)
+
+    def test_flame_graph(self):
+        frames = build_flame_graph({'a;b': 3, 'a;c': 1, 'd': 4})
+        self.assertEqual([(frame['name'], frame['depth'], frame['left'], frame['width']) for frame in frames],
+                         [('a', 0, 0.0, 0.5), ('b', 1, 0.0, 0.375), ('c', 1, 0.375, 0.125), ('d', 0, 0.5, 0.5)])
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """
+        Tests for the number of queries of each url of the app(see QUERY_BUDGETS in core.urls).
+        The budgets are for the steady state: the same GET request is sent before
+        the measured one to load the caches. The caches of the settings are used,
+        the round-trips to the shared cache are counted as the queries.
+    """
+    query_budgets = QUERY_BUDGETS
+
+    def setUp(self):
+        clear_caches()
+        self.category = Category.objects.create(name='Food')
+        self.subcat = SubCategory.objects.create(name='Fruits')
+        self.subcat.categoryId.add(self.category)
+        self.cards = []
+        for i in range(15):
+            card = Card.objects.create(content=f'Card {i}', type=TypesOfCard.WORD)
+            card.subCategoryId.add(self.subcat)
+            self.cards.append(card)
+        User = get_user_model()
+        self.user = User.objects.create_user(email='normal@user.com', password='foo')
+        for card in self.cards[::3]:
+            Favourite.objects.create(card=card, owner=self.user)
+
+    def _request(self, url_name, method='get', args=(), login=True, **kwargs):
+        if login:
+            self.client.force_login(self.user)
+        if method == 'get':
+            # The caches are loaded by the first request
+            self.client.get(reverse(url_name, args=args), **kwargs)
+
+        with self.assertQueryBudget(url_name):
+            response = getattr(self.client, method)(reverse(url_name, args=args), **kwargs)
+        self.assertLess(response.status_code, 400)
+
+        self.client.logout()
+        return response
+
+    def test_all_urls_have_budgets(self):
+        self.assertBudgetsCoverUrls(urlpatterns, 'core')
+
+    def test_pages(self):
+        self._request('core:main')
+        self._request('core:favicon', login=False)
+        self._request('core:category-list')
+        self._request('core:subcategory-list', args=[self.category.id])
+        self._request('core:card-list', args=[self.subcat.id], data={'sort': TypesOfCard.WORD})
+        self._request('core:card-list', args=[self.subcat.id], login=False)
+        self._request('core:favourite', data={'q': 'card'})
+        self._request('core:search', data={'q': 'card'})
+        self._request('core:search', data={'q': 'card', 'block': 'CR'})
+
+    def test_favourites(self):
+        self._request('core:favourite-add', 'post', args=[self.cards[1].id])
+        self._request('core:favourite-del', 'delete', args=[self.cards[1].id])
+        self._request('core:favourite-batch', 'post', content_type='application/json',
+                      data={'operations': [{'op': 'add', 'card_id': card.id} for card in self.cards]})
+        self._request('core:favourite-batch')
+
+    def test_api(self):
+        self._request('core:search-suggest', data={'q': 'fr'})
+        self._request('core:api-category-list', login=False)
+        self._request('core:api-subcategory-list', args=[self.category.id], login=False)
+        self._request('core:api-card-list', args=[self.subcat.id])
+        self._request('core:api-bundle', login=False)
+        self._request('core:api-bundle', login=False, data={'since': 1})
+
+    def test_cache_calls_are_counted(self):
+        # The database cache makes the queries, the cache of the process is free
+        with self.assertQueryBudget('core:favicon'):
+            caches[LOCAL_CACHE_ALIAS].get('core:test')
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget('core:favicon'):
+                cache.get('core:test')
+
+        # Another shared backend(e.g. memcached) is counted by the calls
+        with tempfile.TemporaryDirectory(prefix='cachetest') as location:
+            shared_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                            'LOCATION': location}
+            with override_settings(CACHES=dict(settings.CACHES, default=shared_cache)):
+                with collect_cache_calls() as calls:
+                    cache.set('core:test', 1)
+                    cache.get_many(['core:test', 'core:other'])
+                    caches[LOCAL_CACHE_ALIAS].get('core:test')
+                self.assertEqual(calls, {'default': 2})
+
+                with self.assertRaises(AssertionError):
+                    with self.assertQueryBudget('core:favicon'):
+                        cache.get('core:test')
+
+    def test_instrumentation_is_off_by_default(self):
+        response = self.client.get(reverse('core:category-list'))
+        self.assertFalse(hasattr(response.wsgi_request, 'query_stats'))
+
+    @override_settings(CORE_QUERY_INSTRUMENTATION=True)
+    def test_server_timing_and_log(self):
+        response = self.client.get(reverse('core:category-list'))
+        self.assertNotIn('Server-Timing', response)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        with self.assertLogs('core.instrumentation', level='INFO') as logs:
+            response = self.client.get(reverse('core:category-list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries",total;dur=[\d.]+$')
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['url_name'], 'core:category-list')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['db_queries'], response.wsgi_request.query_stats.count)
+
+        # The token to reset the password is not written to the log
+        path = reverse('user:password-reset-confirm', kwargs={'uidb64': 'MQ', 'token': 'secret-token'})
+        with self.assertLogs('core.instrumentation', level='INFO') as logs:
+            self.client.get(path + '?next=secret')
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['path'], '/users/reset/<uidb64>/<token>/')
+
+    def test_duplicate_queries_are_found(self):
+        with collect_queries() as stats:
+            for card in self.cards[:3]:
+                Card.objects.filter(subCategoryId__in=[self.subcat.id] * (card.id % 3 + 1)).count()
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(list(stats.duplicates.values()), [3])
@@ -2,19 +2,26 @@ from django.urls import path
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.views.generic.base import RedirectView
 
+from .api import (CategoryApiView,
+                  SubCategoryApiView,
+                  CardApiView,
+                  BundleView)
 from .views import (IndexPageView,
                     CategoryListView,
                     SubCategoryListView,
                     FavouriteView,
                     FavouritesControlView,
+                    FavouritesBatchView,
                     SearchResultView,
+                    SearchSuggestView,
                     CardListView)
 
 app_name = 'core'
 
 urlpatterns = [
     path('', IndexPageView.as_view(), name='main'),
-    path('favicon.ico', RedirectView.as_view(url=staticfiles_storage.url('images/favicon.ico'))),
+    path('favicon.ico', RedirectView.as_view(url=staticfiles_storage.url('images/favicon.ico')),
+         name='favicon'),
     path('dashboard/category/', CategoryListView.as_view(),
          name='category-list'),
     path('dashboard/category/<int:cat_id>/', SubCategoryListView.as_view(),
@@ -26,5 +33,35 @@ urlpatterns = [
          name='favourite-add'),
     path('dashboard/favourite/del/<int:card_id>/', FavouritesControlView.as_view(),
          name='favourite-del'),
+    path('dashboard/favourite/batch/', FavouritesBatchView.as_view(),
+         name='favourite-batch'),
     path('dashboard/search/', SearchResultView.as_view(), name='search'),
-]
\ No newline at end of file
+    path('dashboard/search/suggest/', SearchSuggestView.as_view(), name='search-suggest'),
+    path('api/category/', CategoryApiView.as_view(), name='api-category-list'),
+    path('api/category/<int:cat_id>/', SubCategoryApiView.as_view(),
+         name='api-subcategory-list'),
+    path('api/category/<int:subcat_id>/card/', CardApiView.as_view(),
+         name='api-card-list'),
+    path('api/bundle/', BundleView.as_view(), name='api-bundle'),
+]
+
+# Max number of queries of each url in the steady state(with the loaded caches,
+# the reads of the database cache are queries too), they are checked
+# by the tests(see core.instrumentation.QueryBudgetTestMixin)
+QUERY_BUDGETS = {
+    'core:main': 2,
+    'core:favicon': 0,
+    'core:category-list': 2,
+    'core:subcategory-list': 2,
+    'core:card-list': 4,
+    'core:favourite': 3,
+    'core:favourite-add': 4,
+    'core:favourite-del': 4,
+    'core:favourite-batch': 8,
+    'core:search': 7,
+    'core:search-suggest': 0,
+    'core:api-category-list': 1,
+    'core:api-subcategory-list': 1,
+    'core:api-card-list': 4,
+    'core:api-bundle': 3,
+}
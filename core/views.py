@@ -1,22 +1,49 @@
+import json
+
 from django.shortcuts import render
 from django.views import View
 from django.views.generic.list import ListView
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import (now, is_naive, make_aware, utc)
 from django.db.models import (Q, F, Case, When, PositiveIntegerField)
 from django.http import Http404
-from django.db import models
+from django.core.exceptions import ImproperlyConfigured
+from django.db import (connection,
+                       models)
 from ordered_set import OrderedSet
 
-from .models import ArrayPosition
-from .decorators import login_require_or_401
+from .decorators import (login_require_or_401,
+                         cache_page_for_anonymous,
+                         condition_on_catalogue)
+from .search import (search_cards,
+                     search_by_name,
+                     search_items_by_name)
+from .taxonomy import (taxonomy,
+                       TaxonomySnapshot)
+from .suggest import suggestion_index
+from .pagination import CursorPaginationMixin
+from .cache import (get_favourite_ids,
+                    get_request_favourite_ids,
+                    load_favourite_ids,
+                    invalidate_favourite_ids)
 from .models import (Category,
                      SubCategory,
                      Favourite,
                      Card,
                      TypesOfCard)
 
+# The largest integer of the databases, the greater numbers overflow the queries
+MAX_DB_INTEGER = 2 ** 63 - 1
+
+
+def get_max_card_id():
+    """ Function to get the greatest id of the card which fits into the column """
+    return connection.ops.integer_field_range(Card._meta.pk.get_internal_type())[1] or MAX_DB_INTEGER
+
 
 class IndexPageView(View):
     """ Main page of the webapp """
@@ -25,95 +52,122 @@ class IndexPageView(View):
         return render(request, 'core/index.html')
 
 
-class CategoryListView(ListView):
+class ListPageMixin:
+    """
+        Mixin for the pages with the lists. The parameters of the request are
+        parsed once(the view is created for each request) and are available
+        both in get_queryset and in get_context_data.
+    """
+
+    @cached_property
+    def q(self):
+        # GET parameter for the local search on the page
+        return extract_and_trip_question(self.request.GET)
+
+    @cached_property
+    def sorted_by(self):
+        # Sorting GET parameter for the order of the cards
+        return find_sorting_method(self.request.GET.get('sort', SORTING_CARD_OPTIONS[0][0]),
+                                   options=SORTING_CARD_OPTIONS)
+
+
+class ParentObjectMixin(ListPageMixin):
+    """
+        Mixin for the lists which belong to the parent object(subcategories of the category,
+        cards of the subcategory). The parent is resolved once per request from the snapshot
+        of the taxonomy, so it costs no queries, and the list exists even if it is empty.
+    """
+    parent_url_kwarg = None
+    # Method of the snapshot of the taxonomy which finds the parent by its id
+    parent_lookup = None
+    parent_not_found_message = "Such object doesn't exist"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # The view without the parent is broken for any request,
+        # so it is rejected once the class is defined
+        if cls.parent_url_kwarg is None or not callable(getattr(TaxonomySnapshot, cls.parent_lookup or '', None)):
+            raise ImproperlyConfigured(f'{cls.__name__} must define parent_url_kwarg and parent_lookup '
+                                       f'(the method of TaxonomySnapshot).')
+
+    @cached_property
+    def parent(self):
+        find_parent = getattr(taxonomy.snapshot(), self.parent_lookup)
+        parent = find_parent(self.kwargs.get(self.parent_url_kwarg))
+
+        if parent is None:
+            # If there is no such parent object,
+            # we cannot find the objects which belong to it
+            raise Http404(self.parent_not_found_message)
+
+        return parent
+
+
+class CategoryListView(ListPageMixin, ListView):
     """
-        List of all categories
+        List of all categories.
+        The categories are taken from the snapshot of the taxonomy,
+        so no queries are needed.
     """
-    model = Category
     paginate_by = 6
 
     template_name = 'core/category_list.html'
     context_object_name = 'categories'
 
     def get_queryset(self):
-        # GET parameter for the local search on the page
-        q = extract_and_trip_question(self.request.GET)
-
         # If the local search is needed, just do it
-        queryset = super().get_queryset()
-        result = search_among_queryset(queryset, q,
-                                       filter_dict={'name__icontains': q})
-
-        # Generate temporary context to pass the following parameters to
-        # the function 'get_context_data'
-        self.request.tmpcontext = {
-            'q': q
-        }
-
-        return result
+        categories = taxonomy.snapshot().categories()
+        return search_among_queryset(categories, self.q, search=search_items_by_name)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         # Generate the context for the template
         context = super().get_context_data(**kwargs)
-
-        context.update(self.request.tmpcontext)
-        context.update(generate_tmpcontext_for_search(self.request.tmpcontext['q'],
-                                                      'Among categories...'))
+        context.update(generate_tmpcontext_for_search(self.q, 'Among categories...'))
         return context
 
+    @method_decorator(condition_on_catalogue())
+    @method_decorator(cache_page_for_anonymous)
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
 
-class SubCategoryListView(ListView):
+class SubCategoryListView(ParentObjectMixin, ListView):
     """
-        List of all subcategories for a given category
+        List of all subcategories for a given category.
+        The subcategories are taken from the snapshot of the taxonomy,
+        so no queries are needed.
     """
-    model = SubCategory
     paginate_by = 6
 
     template_name = 'core/subcategory_list.html'
     context_object_name = 'subcategories'
+    parent_url_kwarg = 'cat_id'
+    parent_lookup = 'get_category'
+    parent_not_found_message = "Such category doesn't exist"
 
     def get_queryset(self):
-        # We need to be sure that category with `cat_id` exists
-        # before extracting subcategories for a given category
-        cat_id = self.kwargs.get('cat_id', None)
-
-        if not Category.objects.filter(pk=cat_id).exists():
-            # If there is no such category,
-            # we cannot find corresponding subcategories
-            raise Http404("Such category doesn't exist")
-
-        # GET parameter for the local search on the page
-        q = extract_and_trip_question(self.request.GET)
-
-        # Get cards which belong to the specified category
-        queryset = SubCategory.objects.filter(categoryId=cat_id)
+        # Get subcategories which belong to the specified category
+        subcategories = taxonomy.snapshot().subcategories_of(self.parent.id)
         # If the local search is needed, just do it
-        result = search_among_queryset(queryset, q,
-                                       filter_dict={'name__icontains': q})
-
-        # Generate temporary context to pass the following parameters to
-        # the function 'get_context_data'
-        self.request.tmpcontext = {
-            'q': q,
-            'cat_id': cat_id,
-        }
-
-        return result
+        return search_among_queryset(subcategories, self.q, search=search_items_by_name)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         # Generate the context for the template
         context = super().get_context_data(**kwargs)
-        context.update(self.request.tmpcontext)
 
-        categoryName = Category.objects.filter(pk=self.request.tmpcontext['cat_id']).first().name
-        placeholder = 'Among ' + categoryName.lower() + '...'
+        placeholder = 'Among ' + self.parent.name.lower() + '...'
 
-        context.update({'placeholder': placeholder,
-                        'categoryName': categoryName})
-        context.update(generate_tmpcontext_for_search(self.request.tmpcontext['q'],
-                                                      placeholder))
+        context.update({'cat_id': self.parent.id,
+                        'categoryName': self.parent.name,
+                        'placeholder': placeholder})
+        context.update(generate_tmpcontext_for_search(self.q, placeholder))
         return context
 
+    @method_decorator(condition_on_catalogue())
+    @method_decorator(cache_page_for_anonymous)
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
 
 """ 
     Options for user to sort the cards on the page with cards, possible options:
@@ -125,7 +179,27 @@ class SubCategoryListView(ListView):
 SORTING_CARD_OPTIONS = [('DD', 'Default')] + TypesOfCard.choices
 
 
-class CardListView(ListView):
+class FavouritesMarkerMixin:
+    """
+        Mixin for the list views with cards which marks only the cards
+        of the current page as user's favourites(or not).
+    """
+    # If all cards of the list are known to be user's favourites,
+    # there is no need to look them up
+    only_favourites = False
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+
+        # Mark the cards after the pagination, so that we work only
+        # with a bounded number of cards
+        page.object_list = mark_favourites(self.request, object_list,
+                                           only_favourites=self.only_favourites)
+
+        return paginator, page, page.object_list, is_paginated
+
+
+class CardListView(ParentObjectMixin, FavouritesMarkerMixin, CursorPaginationMixin, ListView):
     """
         List of all cards for a given subcategory
     """
@@ -134,69 +208,46 @@ class CardListView(ListView):
 
     template_name = 'core/card_list.html'
     context_object_name = 'cards'
+    parent_url_kwarg = 'subcat_id'
+    parent_lookup = 'get_subcategory'
+    parent_not_found_message = "Such subcategory doesn't exist"
 
     def get_queryset(self):
-        # We need to be sure that subcategory with the given ID exists
-        # before extracting cards
-        subcat_id = self.kwargs.get('subcat_id', None)
-        # Extract sorting GET parameter for the order of the cards
-        sort_param = self.request.GET.get('sort', SORTING_CARD_OPTIONS[0][0])
-
-        if not Card.objects.filter(subCategoryId=subcat_id).exists():
-            # If there is no such subcategory,
-            # we cannot find corresponding cards
-            raise Http404("Such subcategory doesn't exist")
-
         # Get cards which belong to the specified subcategory
-        result = Card.objects.filter(subCategoryId=subcat_id)
-
-        # GET parameter for the local search on the page
-        q = extract_and_trip_question(self.request.GET)
+        result = Card.objects.filter(subCategoryId=self.parent.id)
 
         # If the local search is needed, just do it among content of the cards
-        if q:
-            result = filter_cards_by_q(result, q)
+        if self.q:
+            result = filter_cards_by_q(result, self.q)
         # If we need to change the order of the cards, simply do it
-        result, sorted_by = sort_cards_by_param(result, sort_param)
-
-        # Generate temporary context to pass the following parameters to
-        # the function 'get_context_data'
-        self.request.tmpcontext = {
-            'q': q,
-            'subcat_id': subcat_id,
-            'sorted_by': sorted_by,
-        }
-
-        if self.request.user.is_authenticated:
-            # If the user is authenticated, we need to unite the cards
-            # which belong to the given subcategory with cards which are
-            # in the user's collection(their favourites)
-            favourites = Favourite.objects.filter(owner=self.request.user)
-            cards = union_favourites_and_cards(favourites, result)
-            return cards
+        result, sorted_by = sort_cards_by_param(result, self.sorted_by[0])
 
-        # If the user is not authenticated, just return all cards
+        # The cards of the page are marked as favourites during the pagination
         return result
 
     def get_context_data(self, *, object_list=None, **kwargs):
         # Generate the context for the template
         context = super().get_context_data()
-        context.update(self.request.tmpcontext)
 
-        subcat_id = self.request.tmpcontext['subcat_id']
-        subCategoryName = SubCategory.objects.get(pk=subcat_id).name
+        subcat_id = self.parent.id
+        subCategoryName = self.parent.name
         placeholder = 'Among ' + subCategoryName.lower() + '...'
 
-        context.update({'subCategoryName': subCategoryName})
-        context.update(generate_tmpcontext_for_search(self.request.tmpcontext['q'],
-                                                      placeholder))
-        context.update(generate_tmpcontext_sorting(self.request.tmpcontext['sorted_by'],
+        context.update({'subcat_id': subcat_id,
+                        'subCategoryName': subCategoryName})
+        context.update(generate_tmpcontext_for_search(self.q, placeholder))
+        context.update(generate_tmpcontext_sorting(self.sorted_by,
                                                    SORTING_CARD_OPTIONS,
                                                    subCategoryName=subCategoryName,
                                                    subcat_id=subcat_id))
 
         return context
 
+    @method_decorator(condition_on_catalogue(with_favourites=True))
+    @method_decorator(cache_page_for_anonymous)
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
 
 def find_sorting_method(sort_param, *, options) -> (str, str):
     """ Function to determine the sorting method on the page """
@@ -213,9 +264,10 @@ def find_sorting_method(sort_param, *, options) -> (str, str):
     return sorted_by
 
 
-def sort_cards_by_param(queryset, sort_param) -> (list, (str, str)):
+def sort_cards_by_param(queryset, sort_param, then_by=('-id',)) -> (list, (str, str)):
     """
-        Function to sort cards by a given sorting parameter
+        Function to sort cards by a given sorting parameter,
+        cards of the same relevancy are sorted by `then_by`
     """
     # Initially, determine the sorting parameter
     sorted_by = find_sorting_method(sort_param, options=SORTING_CARD_OPTIONS)
@@ -226,7 +278,7 @@ def sort_cards_by_param(queryset, sort_param) -> (list, (str, str)):
         result = queryset.annotate(
             relevancy=(Case(When(Q(type=sort_param), then=1), When(~Q(type=sort_param), then=2),
                             output_field=PositiveIntegerField())
-                       )).order_by('relevancy', '-id')
+                       )).order_by('relevancy', *then_by)
     else:
         # The queryset is already sorted according to the sorting parameter,
         # so, just return it
@@ -237,8 +289,7 @@ def sort_cards_by_param(queryset, sort_param) -> (list, (str, str)):
 
 def filter_cards_by_q(queryset, q):
     """ Function to sort cards according to the value of q """
-    res = queryset.filter(Q(content__icontains=q) |
-                          Q(translit_of_pronunciation__icontains=q))
+    res = search_cards(queryset, q)
 
     return res
 
@@ -256,30 +307,30 @@ def generate_tmpcontext_sorting(sorted_by, sort_options, **kwargs):
     return tmpcontext
 
 
-def union_favourites_and_cards(favourites, cards):
+def mark_favourites(request, cards, *, only_favourites=False):
     """
-        Function to unite user's favourites cards with a queryset of cards
+        Function to mark the given cards as favourites of the user of the request or not.
+        The cards are evaluated, so it must be a bounded number of them(one page).
     """
-    # Using sets due to the fact that time complexity is O(1)
-    # to check that an element is in the set
-    favourites_set = set()
-    resulting_cards = cards.all()
+    resulting_cards = list(cards)
 
-    for favour in favourites:
-        favourites_set.add(favour.card.id)
+    if not request.user.is_authenticated:
+        # Anonymous user doesn't have favourites
+        return resulting_cards
+
+    # All cards can be known to be favourites, then no need to look them up.
+    # Otherwise, ids of user's favourite cards are taken from the cache
+    favourite_ids = None if only_favourites else get_request_favourite_ids(request)
 
     for card in resulting_cards:
         # Add new field to the card with the flag
         # to indicate is a card user's favourite or not
-        if card.id in favourites_set:
-            card.favourite = True
-        else:
-            card.favourite = False
+        card.favourite = only_favourites or card.id in favourite_ids
 
     return resulting_cards
 
 
-class FavouriteView(ListView):
+class FavouriteView(ListPageMixin, FavouritesMarkerMixin, CursorPaginationMixin, ListView):
     """
         List with all user's favourite cards
     """
@@ -288,55 +339,33 @@ class FavouriteView(ListView):
 
     template_name = 'core/favourite_list.html'
     context_object_name = 'cards'
+    only_favourites = True
 
     def get_queryset(self):
-        # GET parameter for the local search on the page
-        q = extract_and_trip_question(self.request.GET)
-        # Get all favourite cards which belongs to the user
-        favourites = Favourite.objects.select_related('card').filter(owner=self.request.user)
-        # Extract sorting GET parameter for the order of the cards
-        sort_param = self.request.GET.get('sort', 'DD')
-
-        # Generate temporary context to pass the following parameters to
-        # the function 'get_context_data'
-        self.request.tmpcontext = {
-            'q': q,
-            'sorted_by': None,
-        }
-
-        if not favourites:
-            # If user doesn't have any favourite cards, then just
-            # return an empty queryset
-            return favourites
-
-        # Default sorting of the cards
-        card_ids = favourites.values_list('card__id', flat=True)
-        result = Card.objects.filter(pk__in=card_ids). \
-            annotate(ordering=ArrayPosition(card_ids, F('pk'),
-                                            output_field=PositiveIntegerField())).order_by('ordering')
+        # Get all favourite cards which belongs to the user by the join with favourites.
+        # Default sorting of the cards(the last added go first) uses the index
+        # on (owner, -data_added), it is also the key of the cursor pagination
+        result = Card.objects.filter(favourite__owner=self.request.user). \
+            annotate(data_added=F('favourite__data_added')).order_by('-data_added', '-pk')
 
         # If the local search is needed, just do it among content of the cards
-        if q:
-            result = filter_cards_by_q(result, q)
-
-        # If we need to change the order of the cards, simply do it
-        result, sorted_by = sort_cards_by_param(result, sort_param)
-        self.request.tmpcontext['sorted_by'] = sorted_by
+        if self.q:
+            result = filter_cards_by_q(result, self.q)
 
-        # We need to mark all cards as favourites
-        result = union_favourites_and_cards(favourites, result)
+        # If we need to change the order of the cards, simply do it.
+        # Cards of the same type are still sorted by the date of adding
+        result, sorted_by = sort_cards_by_param(result, self.sorted_by[0], then_by=('-data_added', '-pk'))
 
+        # All cards of the page are marked as favourites during the pagination
         return result
 
     def get_context_data(self, *, object_list=None, **kwargs):
         # Generate the context for the template
         context = super().get_context_data()
-        context.update(self.request.tmpcontext)
         placeholder = 'Among favourites...'
 
-        context.update(generate_tmpcontext_for_search(self.request.tmpcontext['q'], placeholder))
-        context.update(generate_tmpcontext_sorting(self.request.tmpcontext['sorted_by'],
-                                                   SORTING_CARD_OPTIONS))
+        context.update(generate_tmpcontext_for_search(self.q, placeholder))
+        context.update(generate_tmpcontext_sorting(self.sorted_by, SORTING_CARD_OPTIONS))
 
         return context
 
@@ -345,11 +374,11 @@ class FavouriteView(ListView):
         return super().dispatch(*args, **kwargs)
 
 
-def search_among_queryset(queryset, q, *, filter_dict):
-    """ Function to perform filter on the given queryset """
+def search_among_queryset(queryset, q, *, search):
+    """ Function to perform search on the given queryset """
     if q:
         # If q is not None, filter by it
-        result = queryset.filter(**filter_dict)
+        result = search(queryset, q)
     else:
         # If q is None, no need to filter, simply return queryset
         result = queryset
@@ -375,23 +404,15 @@ class FavouritesControlView(View):
     def post(self, request, **kwargs):
         """ Method to add a card to user's favourite collection """
         response = {}
+        card_id = kwargs.get('card_id', None)
 
-        # Check that the card with the provided id exists
-        card = self._validate_card_id(request, **kwargs)
-        if not card:
-            # Otherwise, return error
-            return self._return_error(request, response)
-
-        # Check that card already is in user's collection
-        if Favourite.objects.filter(card=card,
-                                    owner=request.user).exists():
-            # The card was already added before, return error
+        # One statement: the card is added only if it exists
+        # and it is not in user's collection yet
+        if card_id > get_max_card_id() or not Favourite.objects.add_card(request.user, card_id):
+            # The card doesn't exist or was already added before, return error
             return self._return_error(request, response)
 
-        # Otherwise, add the card to user's collection
-        new_favourite_card = Favourite(card=card,
-                                       owner=request.user)
-        new_favourite_card.save()
+        invalidate_favourite_ids(request.user)
 
         # Return successful JSON response
         return JsonResponse(response, status=200)
@@ -399,42 +420,22 @@ class FavouritesControlView(View):
     def delete(self, request, **kwargs):
         """ Method to remove a card from user's favourite collection """
         response = {}
+        card_id = kwargs.get('card_id', None)
 
-        # Check that the card with the provided id exists
-        card = self._validate_card_id(request, **kwargs)
-        if not card:
-            # Otherwise, return error
-            return self._return_error(request, response)
-
-        # Find favourite card's object
-        favourite_card = Favourite.objects.filter(card=card,
-                                                  owner=request.user).first()
-
-        if not favourite_card:
+        if card_id > get_max_card_id() or not Favourite.objects.remove_card(request.user, card_id):
             # The card was already removed before or was not in user's favourites,
             # so, return error
             return self._return_error(request, response, status=410)
 
-        # Otherwise, remove the card successfully
-        favourite_card = favourite_card.delete()
+        invalidate_favourite_ids(request.user)
 
         # Return successful JSON response
         return JsonResponse(response, status=200)
 
-    def _validate_card_id(self, request, **kwargs):
-        """ Method to check that card with the provided id exists """
-        card_id = kwargs.get('card_id', None)
-
-        if not Card.objects.filter(pk=card_id).exists():
-            # If the card doesn't exists, return None
-            return None
-
-        # Otherwise, such card exists, simply return it
-        return Card.objects.filter(pk=card_id).first()
-
-    def _return_error(self, request, response, status=409):
+    def _return_error(self, request, response, status=409,
+                      message='Sorry, an unknown error occurred.'):
         """ Method which returns JSON response with the rror """
-        response['error'] = 'Sorry, an unknown error occurred.'
+        response['error'] = message
         return JsonResponse(response, status=status)
 
     @method_decorator(login_require_or_401)
@@ -442,6 +443,110 @@ class FavouritesControlView(View):
         return super().dispatch(*args, **kwargs)
 
 
+class FavouritesBatchView(FavouritesControlView):
+    """
+        View to add to / remove from user's favourite collection many cards at once,
+        e.g. the whole subcategory or the changes made offline.
+        The body of POST is JSON:
+        {"operations": [{"op": "add" | "remove", "card_id": 1, "ts": "2021-01-01T10:00:00Z"}, ...]}
+        `ts` is optional, it is the time of the operation on the client.
+        The operations are applied in the order of their time(or in the order
+        of the list), the last operation on a card wins.
+        Both methods return the version of the set of user's favourites,
+        GET also returns the ids, so the client can reconcile its copy.
+    """
+    max_operations = 200
+    operations = ('add', 'remove')
+
+    def get(self, request, **kwargs):
+        """ Method to get the ids of user's favourite cards and their version """
+        favourite_ids = get_favourite_ids(request.user)
+        return JsonResponse({'version': favourite_ids.version,
+                             'ids': list(favourite_ids)})
+
+    def post(self, request, **kwargs):
+        """ Method to apply the list of operations to user's favourite collection """
+        response = {}
+
+        try:
+            operations = self._parse_operations(request.body)
+        except ValueError as e:
+            return self._return_error(request, response, status=400, message=str(e))
+
+        additions, removals = self._collapse_operations(operations)
+        missing_ids = Favourite.objects.apply_batch(request.user, additions, removals)
+        invalidate_favourite_ids(request.user)
+        # The next request puts the ids into the cache
+        favourite_ids = load_favourite_ids(request.user)
+
+        response['version'] = favourite_ids.version
+        response['count'] = len(favourite_ids)
+        response['missing'] = sorted(missing_ids)
+        return JsonResponse(response, status=200)
+
+    def delete(self, request, **kwargs):
+        return self.http_method_not_allowed(request, **kwargs)
+
+    def _parse_operations(self, body):
+        """ Method to get the list of (op, card_id, ts) from the body of the request """
+        try:
+            operations = json.loads(body)['operations']
+        except (ValueError, TypeError, KeyError):
+            raise ValueError('The body must be JSON with the list of operations.')
+
+        if not isinstance(operations, list) or len(operations) > self.max_operations:
+            raise ValueError(f'The list of at most {self.max_operations} operations is expected.')
+
+        # The ids beyond the range of the column can't be the cards
+        max_card_id = get_max_card_id()
+
+        parsed = []
+        for operation in operations:
+            if not isinstance(operation, dict) or operation.get('op') not in self.operations:
+                raise ValueError('Each operation must be "add" or "remove".')
+
+            card_id = operation.get('card_id')
+            if not isinstance(card_id, int) or isinstance(card_id, bool) or not 0 < card_id <= max_card_id:
+                raise ValueError('Each operation must have the id of the card.')
+
+            ts = operation.get('ts')
+            if ts is not None:
+                ts = parse_datetime(ts) if isinstance(ts, str) else None
+                if ts is None:
+                    raise ValueError('The time of the operation must be in ISO 8601 format.')
+                if is_naive(ts):
+                    ts = make_aware(ts, utc)
+                # The time can't be in the future, the clock of the client may be wrong
+                ts = min(ts, now())
+
+            parsed.append((operation['op'], card_id, ts))
+
+        return parsed
+
+    @staticmethod
+    def _collapse_operations(operations):
+        """
+            Method to leave only the last operation for each card.
+            Returns the dicts of additions(card_id -> date of adding)
+            and removals(card_id -> date of removing or None).
+        """
+        request_time = now()
+        # sorted() is stable, so the operations without time keep their order
+        operations = sorted(operations, key=lambda operation: operation[2] or request_time)
+
+        additions, removals = {}, {}
+        for op, card_id, ts in operations:
+            additions.pop(card_id, None)
+            removals.pop(card_id, None)
+
+            if op == 'add':
+                additions[card_id] = ts or request_time
+            else:
+                removals[card_id] = ts
+
+        return additions, removals
+
+
 class TypesOfSearchSortingOptions(models.TextChoices):
     """
         Sorting options for the content of the global search view.
@@ -458,11 +563,156 @@ class TypesOfSearchSortingOptions(models.TextChoices):
     SUBCATEGORIES = 'SB', 'Subcategories'
 
 
+class SearchBlock:
+    """
+        One page of the results of the global search for one block.
+        The page is fetched with one more row to know that there is the next
+        page, and the number of results is estimated with a bounded count.
+    """
+    # Results beyond this number are not counted
+    count_limit = 100
+    # The offset of the page must fit into the integer of the database
+    max_offset = MAX_DB_INTEGER
+
+    def __init__(self, option, queryset, *, number, per_page, request):
+        self.code, self.name = option
+        self.number = number
+        self._queryset = queryset
+
+        offset = (number - 1) * per_page
+        object_list = list(queryset[offset:offset + per_page + 1])
+        self.has_next = len(object_list) > per_page
+        self.object_list = object_list[:per_page]
+
+        if self.has_next:
+            # Query string of the next page(the whole search page and only the block)
+            params = request.GET.copy()
+            params[self.page_param(self.code)] = number + 1
+            self.next_page_query = params.urlencode()
+            params['block'] = self.code
+            self.next_block_query = params.urlencode()
+
+    @staticmethod
+    def page_param(code):
+        """ Method to get the name of GET parameter with the number of the page of the block """
+        return 'page_' + code.lower()
+
+    @cached_property
+    def exists(self):
+        """ Whether the block has any results, the page after the last one has no rows """
+        if self.object_list or self.number == 1:
+            return bool(self.object_list)
+
+        return self._queryset.exists()
+
+    @cached_property
+    def count(self):
+        """ Number of results which is not greater than `count_limit` """
+        if self.number == 1 and not self.has_next:
+            # All results are on the page, no need to count them
+            return len(self.object_list)
+
+        return self._queryset[:self.count_limit + 1].count()
+
+    @property
+    def count_display(self):
+        """ Number of results to show to the user """
+        return f'{self.count_limit}+' if self.count > self.count_limit else str(self.count)
+
+
+class GlobalSearch:
+    """
+        Search-execution pipeline of the global search.
+        Each block is queried exactly once: the query fetches the requested page
+        of the block(plus one row), and the same rows tell whether the block
+        has any results, so there are no separate checks for emptiness.
+    """
+    # Order of the blocks for the default sorting
+    blocks_order = (TypesOfSearchSortingOptions.CATEGORIES,
+                    TypesOfSearchSortingOptions.SUBCATEGORIES,
+                    TypesOfSearchSortingOptions.CARDS)
+    # Number of the results on one page of the block
+    per_page = {
+        TypesOfSearchSortingOptions.CARDS: 10,
+        TypesOfSearchSortingOptions.CATEGORIES: 6,
+        TypesOfSearchSortingOptions.SUBCATEGORIES: 6,
+    }
+
+    def __init__(self, request, q):
+        self.request = request
+        self.q = q
+
+    def run(self, sorted_by):
+        """
+            Method to search among all blocks.
+            Returns the blocks with results(the first one is `sorted_by` if it is not
+            default) and the options of the blocks without results.
+        """
+        if sorted_by[0] == TypesOfSearchSortingOptions.DEFAULT:
+            # If the sorting is default, we will be adding blocks
+            # as we find content for a given q
+            found = OrderedSet()
+        else:
+            # If the sorting is not default, the first shown block must be
+            # as was request by the user
+            found = OrderedSet([sorted_by[0]])
+
+        blocks = {}
+        if self.q:
+            for code in self.blocks_order:
+                blocks[code] = self.block(code)
+                if blocks[code].exists:
+                    # If we find something, add the block(its page may be empty)
+                    found.add(code)
+
+        found_blocks = [blocks.get(code) or EmptySearchBlock(self._option(code)) for code in found]
+        notfound_options = [self._option(code) for code in self.blocks_order if code not in found]
+
+        return found_blocks, notfound_options
+
+    def block(self, code):
+        """ Method to get the requested page of the given block """
+        if code == TypesOfSearchSortingOptions.CATEGORIES:
+            queryset = search_by_name(Category.objects.all(), self.q)
+        elif code == TypesOfSearchSortingOptions.SUBCATEGORIES:
+            queryset = search_by_name(SubCategory.objects.all(), self.q)
+        else:
+            # The most relevant cards go first
+            queryset = search_cards(Card.objects.all(), self.q, ranked=True)
+
+        try:
+            number = max(int(self.request.GET.get(SearchBlock.page_param(code), 1)), 1)
+        except ValueError:
+            number = 1
+
+        if (number - 1) * self.per_page[code] > SearchBlock.max_offset:
+            raise Http404('Invalid page')
+
+        block = SearchBlock(self._option(code), queryset,
+                            number=number, per_page=self.per_page[code], request=self.request)
+
+        if code == TypesOfSearchSortingOptions.CARDS:
+            # Mark the found cards as user's favourites(for anonymous user nothing is marked)
+            block.object_list = mark_favourites(self.request, block.object_list)
+
+        return block
+
+    @staticmethod
+    def _option(code):
+        return code, TypesOfSearchSortingOptions(code).label
+
+
 class SearchResultView(View):
     """
-        Global search view
+        Global search view.
+        Each block of the results is paginated separately, `block` GET parameter
+        allows to get only the page of the given block(for "Show more" button).
     """
 
+    @method_decorator(condition_on_catalogue(with_favourites=True))
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
     def get(self, request):
         # GET parameter for the global search
         filter_by = extract_and_trip_question(self.request.GET, defaultVal='')
@@ -471,73 +721,66 @@ class SearchResultView(View):
         # Determine the required sorting method(should be sort_param)
         sorted_by = find_sorting_method(sort_param, options=TypesOfSearchSortingOptions.choices)
 
+        search = GlobalSearch(request, filter_by)
+
+        # Only one block can be requested
+        block_param = request.GET.get('block')
+        if block_param in GlobalSearch.per_page:
+            if not filter_by:
+                raise Http404('Nothing to search')
+
+            return render(request, 'core/_search_block.html',
+                          context={'block': search.block(block_param)})
+
+        found_blocks, notfound_options = search.run(sorted_by)
+
         # Set up the context for the template
         context = {
             'q': filter_by,
+            # Blocks for which we found some content(or requested by the sorting)
+            'found_blocks': found_blocks,
+            # Blocks for which we didn't find any content
+            'q_notfound': notfound_options,
+            'sorted_by': sorted_by,
         }
-
-        if sorted_by[0] == TypesOfSearchSortingOptions.DEFAULT:
-            # If the sorting is default, we will be adding blocks to the set
-            # as we find content for a given filter_by
-            q_found = OrderedSet()
-        else:
-            # If the sorting is not default, the first shown block must be
-            # as was request by the user, so, our first element in the set will
-            # be sorted_by
-            q_found = OrderedSet([sorted_by])
-
-        if filter_by:
-            # Start search among categories
-            categories = \
-                Category.objects.filter(name__icontains=filter_by)
-            if categories:
-                # If we find something, add category block to the set
-                # and add content to the context
-                q_found.add(TypesOfSearchSortingOptions.choices[2])
-                context['categories'] = categories
-
-            # Search among subcategories
-            subcategories = \
-                SubCategory.objects.filter(name__icontains=filter_by)
-            if subcategories:
-                # If we find something, add subcategory block to the set
-                # and add content to the context
-                context['subcategories'] = subcategories
-                q_found.add(TypesOfSearchSortingOptions.choices[3])
-
-            # Search among cards
-            cards = Card.objects.filter(Q(content__icontains=filter_by) |
-                                        Q(translit_of_pronunciation__icontains=filter_by))
-            if cards:
-                # If we find something, add card block to the set
-                # and add content to the context
-                q_found.add(TypesOfSearchSortingOptions.choices[1])
-
-            if request.user.is_authenticated:
-                # If the user is authenticated, we need to unite the cards
-                # which belong to the given subcategory with cards which are
-                # in the user's collection(their favourites)
-                favourites = Favourite.objects.filter(owner=request.user)
-                context['cards'] = union_favourites_and_cards(favourites, cards)
-            else:
-                # If the user is not authenticated, just add all pure cards
-                context['cards'] = cards
-
-        # Set with all sorting of order choices except the default one
-        q_all = set()
-        q_all.update(TypesOfSearchSortingOptions.choices)
-        q_all.remove(TypesOfSearchSortingOptions.choices[0])
-
-        # q_found contains blocks for which we found some content
-        context['q_found'] = q_found
-        # q_notfound contains blocks for which we didn't find any content
-        context['q_notfound'] = q_all.difference(q_found)
-        context['sorted_by'] = sorted_by
         context.update(generate_tmpcontext_sorting(sorted_by, TypesOfSearchSortingOptions.choices))
 
         return render(request, 'core/search_list.html', context=context)
 
 
+class EmptySearchBlock:
+    """ Block of the global search for which nothing was searched """
+    object_list = []
+    exists = False
+    has_next = False
+    count_display = '0'
+
+    def __init__(self, option):
+        self.code, self.name = option
+
+
+class SearchSuggestView(View):
+    """
+        Suggestions(autocomplete) for the search forms.
+        Returns JSON with at most `limit` categories, subcategories
+        and cards which have a word starting with q.
+    """
+    default_limit = 8
+    max_limit = 20
+
+    def get(self, request):
+        q = extract_and_trip_question(request.GET, defaultVal='')
+
+        try:
+            limit = min(int(request.GET.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+
+        suggestions = suggestion_index.suggest(q, max(limit, 0))
+
+        return JsonResponse({'q': q, 'suggestions': suggestions})
+
+
 def extract_and_trip_question(requestData, paramName='q', defaultVal=None):
     """ Function which simply takes the parameter and strip it(remove spaces around) """
     q = requestData.get(paramName, defaultVal)
@@ -30,11 +30,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # The first one, so that the time and the queries of all middlewares are measured
+    'core.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # After the authentication, the profiling by the header is allowed only to the staff
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,6 +58,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.project_name',
+                'core.context_processors.catalogue_generation',
             ],
         },
     },
@@ -68,6 +73,73 @@ DATABASES = {
     'default': dj_database_url.config(default="LINK TO YOUR DB")
 }
 
+# Cache
+# The default cache must be shared by all processes of the app(gunicorn workers):
+# the generations of the catalogue, the taxonomy and user's favourites are
+# kept there. The database cache is used by default(its table is created by
+# `python manage.py createcachetable`, see Procfile), a faster shared backend
+# (e.g. memcached) can be set by the environment variables.
+# The local cache is the memory of the process: the generations read from
+# the default cache and the pages and fragments of the catalogue(see core.cache).
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'core_cache'),
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'core_local',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+# Seconds while the process uses the generations without reading them again,
+# the changes made by other processes are seen after this delay at most
+CORE_GENERATION_CHECK_INTERVAL = 5
+
+# In-memory search index for the cards(see core.search_index)
+CORE_SEARCH_INDEX_ENABLED = False
+
+# Days for which the changes of the catalogue are kept for the delta bundles
+# (see core.bundle), the older clients get the full bundle
+CORE_CATALOGUE_CHANGES_RETENTION_DAYS = 90
+
+# Statistics of the queries of each request(see core.instrumentation).
+# They are written to the log `core.instrumentation`, the slow requests
+# are written with the level WARNING. In production they are turned on
+# by the environment variable
+CORE_QUERY_INSTRUMENTATION = DEBUG or os.environ.get('CORE_QUERY_INSTRUMENTATION') == '1'
+CORE_SLOW_REQUEST_MS = 500
+
+# Profiling of the requests(see core.profiling), the profiles are shown
+# in the admin panel at admin/profiles/
+CORE_PROFILING_ENABLED = os.environ.get('CORE_PROFILING_ENABLED') == '1'
+# Share of the requests which are profiled without the header, from 0 to 1
+CORE_PROFILING_SAMPLE_RATE = float(os.environ.get('CORE_PROFILING_SAMPLE_RATE', 0))
+CORE_PROFILING_INTERVAL_MS = 5
+CORE_PROFILING_DIR = os.environ.get('CORE_PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+CORE_PROFILING_MAX_FILES = 200
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('CORE_INSTRUMENTATION_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
@@ -3,7 +3,14 @@ from django.urls import include, path
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.admin import (ProfileListView,
+                        ProfileDetailView)
+
 urlpatterns = [
+    # Profiles of the requests(see core.profiling), they are before the admin's urls to be matched
+    path('admin/profiles/', admin.site.admin_view(ProfileListView.as_view()), name='profile-list'),
+    path('admin/profiles/<str:profile_id>/', admin.site.admin_view(ProfileDetailView.as_view()),
+         name='profile-detail'),
     path('admin/', admin.site.urls),
     path('users/', include('users.urls', namespace='user')),
     path('', include('core.urls', namespace='core')),
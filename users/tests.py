@@ -1,5 +1,13 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.urls import reverse
+
+from core.instrumentation import QueryBudgetTestMixin
+from .urls import (urlpatterns,
+                   QUERY_BUDGETS)
 
 class UsersManagersTests(TestCase):
     """
@@ -42,3 +50,40 @@ class UsersManagersTests(TestCase):
         with self.assertRaises(ValueError):
             User.objects.create_superuser(
                 email='super@user.com', password='foo', is_superuser=False)
+
+
+class UsersQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """
+        Tests for the number of queries of each url of the app(see QUERY_BUDGETS in users.urls).
+    """
+    query_budgets = QUERY_BUDGETS
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(email='normal@user.com', password='foo')
+
+    def _request(self, url_name, method='get', kwargs=None, data=None):
+        with self.assertQueryBudget(url_name):
+            response = getattr(self.client, method)(reverse(url_name, kwargs=kwargs), data)
+        self.assertLess(response.status_code, 400)
+        return response
+
+    def test_all_urls_have_budgets(self):
+        self.assertBudgetsCoverUrls(urlpatterns, 'user')
+
+    def test_sign_in_and_out(self):
+        self._request('user:sign-in')
+        self._request('user:sign-in', 'post', data={'email': 'normal@user.com', 'password': 'foo'})
+        self._request('user:logout')
+        self._request('user:sign-up')
+        self._request('user:sign-up', 'post', data={'email': 'new@user.com', 'password': 'Qwerty!2345'})
+
+    def test_password_reset(self):
+        self._request('user:password-reset')
+        self._request('user:password-reset', 'post', data={'email': 'normal@user.com'})
+
+        kwargs = {'uidb64': urlsafe_base64_encode(force_bytes(self.user.pk)),
+                  'token': default_token_generator.make_token(self.user)}
+        self._request('user:password-reset-confirm', kwargs=kwargs)
+        self._request('user:password-reset-confirm', 'post', kwargs=kwargs,
+                      data={'password': 'Qwerty!2345'})
@@ -14,4 +14,13 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(), name='logout'),
     path('password-reset/', PasswordResetView.as_view(), name='password-reset'),
     path('reset/<uidb64>/<token>/', PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
-]
\ No newline at end of file
+]
+
+# Max number of queries of each url, they are checked by the tests(see core.instrumentation.QueryBudgetTestMixin)
+QUERY_BUDGETS = {
+    'user:sign-in': 9,
+    'user:sign-up': 11,
+    'user:logout': 4,
+    'user:password-reset': 1,
+    'user:password-reset-confirm': 13,
+}